@@ -2,16 +2,29 @@
 Database connection and session management
 """
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from app.utils.statement_cache import track_statement_cache
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class Settings(BaseSettings):
     """Application settings from environment variables"""
     # Database
     database_url: str
+    database_replica_url: str = ""  # Optional read replica for read-only endpoints
+    read_your_writes_seconds: int = 5  # Reads stay on primary this long after a user's write
+    replica_lag_check_seconds: int = 5
+    database_query_cache_size: int = 1200  # Compiled statements kept per engine (SQLAlchemy default: 500)
+    database_prepare_threshold: int = 0  # Server-side prepare after N executions; psycopg 3 only, 0 disables
+    database_listen_url: str = ""  # Direct/session-mode connection for LISTEN (defaults to DATABASE_URL)
+    listener_reconnect_seconds: float = 1.0
     supabase_url: str = ""
     supabase_anon_key: str = ""
     supabase_service_key: str = ""
@@ -20,6 +33,11 @@ class Settings(BaseSettings):
     clerk_secret_key: str = ""
     clerk_publishable_key: str = ""
     clerk_webhook_secret: str = ""
+    clerk_api_url: str = "https://api.clerk.com/v1"  # Point at a local stand-in for tests
+    clerk_timeout_seconds: float = 5.0
+    clerk_circuit_failure_threshold: int = 5
+    clerk_circuit_reset_seconds: int = 30
+    known_user_ttl_seconds: int = 300  # Skip the users lookup for recently seen ids
 
     # Application
     environment: str = "development"
@@ -34,6 +52,44 @@ class Settings(BaseSettings):
     resend_api_key: str = ""
     resend_from_email: str = ""
 
+    # Email delivery (outbox worker)
+    email_transport: str = "resend"  # resend or local
+    email_worker_enabled: bool = True
+    email_worker_interval_seconds: int = 5
+    email_worker_concurrency: int = 2
+    email_batch_size: int = 100  # Resend batch API maximum
+    email_rate_limit_per_second: float = 2.0  # Resend default quota
+    email_max_attempts: int = 5
+
+    # Order change feed (GET /orders/changes)
+    order_tombstone_retention_days: int = 30  # Older cursors must resync from 0
+    order_tombstone_prune_seconds: int = 3600
+
+    # Cross-worker cache invalidation over LISTEN/NOTIFY (see app/services/invalidation.py)
+    invalidation_bus_enabled: bool = True
+    invalidation_cache_ttl_seconds: int = 3600  # Cache TTL while the bus is connected
+
+    # Order change push (GET /orders/events)
+    order_events_enabled: bool = True
+    sse_heartbeat_seconds: int = 15
+
+    # Webhook event worker (retries events not applied right after delivery)
+    webhook_worker_interval_seconds: int = 10
+
+    # Result cache (analytics)
+    cache_backend: str = "memory"  # memory or redis
+    cache_redis_url: str = ""
+    cache_ttl_seconds: int = 300
+    cache_max_entries: int = 10000
+
+    # Startup warmup (see app/services/warmup.py)
+    warmup_enabled: bool = True
+    warmup_pool_connections: int = 5
+    warmup_timeout_seconds: int = 30
+
+    # Admin statistics snapshot refresh interval
+    admin_stats_refresh_seconds: int = 300
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -46,20 +102,86 @@ def get_settings():
     return Settings()
 
 
-settings = get_settings()
+def _engine_options(url: str) -> dict:
+    """
+    Driver-dependent engine options. Server-side prepared statements are only
+    available with psycopg 3 (postgresql+psycopg://), and only safe on a direct
+    or session-mode connection: Supabase's transaction-mode pooler (port 6543)
+    hands each transaction to any backend, where the prepared statement may
+    not exist.
+    """
+    settings = get_settings()
+    options = {"query_cache_size": settings.database_query_cache_size}
+    if url.startswith("postgresql+psycopg://"):
+        # psycopg 3 prepares automatically after 5 executions; None turns it off
+        options["connect_args"] = {"prepare_threshold": settings.database_prepare_threshold or None}
+    elif settings.database_prepare_threshold:
+        logger.warning("DATABASE_PREPARE_THRESHOLD requires the psycopg 3 driver (postgresql+psycopg://); ignored")
+    return options
+
+
+def _create_engine(url: str, name: str) -> Engine:
+    settings = get_settings()
+    # Supabase-optimized connection pooling
+    engine = create_engine(
+        url,
+        pool_pre_ping=True,  # Verify connections before using
+        echo=settings.debug,  # Log SQL queries in debug mode
+        pool_size=10,  # Transaction mode supports higher connection limits
+        max_overflow=0,  # No additional connections beyond pool_size
+        pool_recycle=3600,  # Recycle connections after 1 hour
+        **_engine_options(url)
+    )
+    track_statement_cache(engine, name)
+    return engine
+
+
+@lru_cache()
+def get_engine() -> Engine:
+    """
+    Get the SQLAlchemy engine, created on first use so that importing the app
+    (or a CLI tool) does not load the database driver or read settings.
+    """
+    return _create_engine(get_settings().database_url, "primary")
+
+
+@lru_cache()
+def get_sessionmaker() -> sessionmaker:
+    """Get the session factory bound to the engine"""
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+@lru_cache()
+def get_replica_engine() -> Optional[Engine]:
+    """Get the read replica engine, or None when DATABASE_REPLICA_URL is not set"""
+    settings = get_settings()
+    if not settings.database_replica_url:
+        return None
+    return _create_engine(settings.database_replica_url, "replica")
+
+
+@lru_cache()
+def get_replica_sessionmaker() -> Optional[sessionmaker]:
+    """Get the session factory bound to the replica (None without a replica)"""
+    replica = get_replica_engine()
+    if replica is None:
+        return None
+    return sessionmaker(autocommit=False, autoflush=False, bind=replica)
+
+
+def SessionLocal() -> Session:
+    """Create a new database session (named like the session factory it replaces)"""
+    return get_sessionmaker()()
+
 
-# Create SQLAlchemy engine with Supabase-optimized connection pooling
-engine = create_engine(
-    settings.database_url,
-    pool_pre_ping=True,  # Verify connections before using
-    echo=settings.debug,  # Log SQL queries in debug mode
-    pool_size=10,  # Transaction mode supports higher connection limits
-    max_overflow=0,  # No additional connections beyond pool_size
-    pool_recycle=3600,  # Recycle connections after 1 hour
-)
+def __getattr__(name: str):
+    """Lazy module attributes kept for `from app.database import engine, settings`"""
+    if name == "engine":
+        return get_engine()
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Base class for models
 Base = declarative_base()
@@ -4,24 +4,60 @@ Main application entry point
 """
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Import routers
 from app.routes import orders, webhooks, analytics, notifications, admin
+from app.database import get_settings
+from app.utils.replica import marks_shared, measure_replica_lag
+from app.services.admin_stats import refresh_admin_statistics
+from app.services.grandfathering import resume_grandfather_job
+from app.services.email_outbox import get_outbox_worker
+from app.services.invalidation import attach_invalidation_bus
+from app.services.order_changes import prune_tombstones
+from app.services.order_events import get_order_event_hub
+from app.services.webhook_events import process_pending_events
+from app.services.warmup import mark_not_ready, run_warmup, warmup_state
+from app.utils.background import start_async_task, start_background_task, start_periodic_task, stop_background_tasks
+from app.utils.pg_listener import get_pg_listener
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     print("Starting up TCG Order Tracker API...")
+    settings = get_settings()
+    start_periodic_task("admin-stats-refresh", settings.admin_stats_refresh_seconds, refresh_admin_statistics)
+    start_background_task("grandfather-job-resume", resume_grandfather_job)
+    if settings.database_replica_url and not marks_shared():
+        print("DATABASE_REPLICA_URL is ignored: read-your-writes needs CACHE_BACKEND=redis")
+    elif settings.database_replica_url:
+        start_periodic_task("replica-lag", settings.replica_lag_check_seconds, measure_replica_lag)
+    start_periodic_task("order-tombstone-prune", settings.order_tombstone_prune_seconds, prune_tombstones)
+    if settings.invalidation_bus_enabled:
+        attach_invalidation_bus(get_pg_listener())
+    if settings.order_events_enabled:
+        get_order_event_hub()
+    if settings.invalidation_bus_enabled or settings.order_events_enabled:
+        start_async_task("pg-listener", get_pg_listener().run)
+    start_periodic_task("webhook-events", settings.webhook_worker_interval_seconds, process_pending_events)
+    if settings.email_worker_enabled:
+        start_periodic_task("email-outbox", settings.email_worker_interval_seconds, get_outbox_worker().run_once)
+    await run_warmup(app)
     yield
     # Shutdown
     print("Shutting down TCG Order Tracker API...")
+    mark_not_ready()
+    await stop_background_tasks()
+    if settings.email_worker_enabled:
+        await asyncio.to_thread(get_outbox_worker().close)
 
 app = FastAPI(
     title="TCG Order Tracker API",
@@ -41,6 +77,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -63,6 +100,17 @@ async def health_check():
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint - 503 until startup warmup has finished"""
+    if not warmup_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": warmup_state["steps"]})
+    return {
+        "status": "ready",
+        "warmup": warmup_state["steps"]
+    }
+
+
 # API versioned routes
 app.include_router(webhooks.router, prefix="/api/webhooks", tags=["webhooks"])
 app.include_router(orders.router, prefix="/api/v1/orders", tags=["orders"])
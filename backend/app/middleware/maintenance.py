@@ -18,6 +18,7 @@ logger = logging.getLogger(__name__)
 ALLOWED_PATHS = [
     "/",
     "/health",
+    "/ready",
     "/api/v1/admin/settings",  # Allow admins to disable maintenance mode
     "/docs",
     "/openapi.json",
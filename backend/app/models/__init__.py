@@ -3,7 +3,11 @@ Database models
 """
 from app.models.user import User
 from app.models.order import Order
+from app.models.order_tombstone import OrderTombstone
 from app.models.notification_preferences import NotificationPreferences
 from app.models.system_settings import SystemSettings
+from app.models.sent_reminder import SentReminder
+from app.models.email_outbox import EmailOutbox
+from app.models.webhook_event import WebhookEvent
 
-__all__ = ["User", "Order", "NotificationPreferences", "SystemSettings"]
+__all__ = ["User", "Order", "OrderTombstone", "NotificationPreferences", "SystemSettings", "SentReminder", "EmailOutbox", "WebhookEvent"]
@@ -0,0 +1,36 @@
+"""
+Email outbox model - emails queued by request paths and sent by the delivery worker
+"""
+from sqlalchemy import Column, String, Integer, Text, DateTime, Index, func
+from app.database import Base
+import uuid
+
+
+class EmailOutbox(Base):
+    """One queued email"""
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Worker claim query: due messages in order
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+
+    from_email = Column(String, nullable=False)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    html = Column(Text, nullable=False)
+
+    # Delivery state: pending, sending, sent, failed
+    status = Column(String, default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_error = Column(Text, nullable=True)
+    provider_id = Column(String, nullable=True)  # ID returned by the email provider
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<EmailOutbox {self.to_email} '{self.subject}' ({self.status})>"
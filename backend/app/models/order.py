@@ -1,14 +1,35 @@
 """
 Order model - core data model for TCG order tracking
 """
-from sqlalchemy import Column, String, Integer, Numeric, DateTime, Date, ForeignKey, func, text, Computed
+from sqlalchemy import (
+    Column, String, Integer, BigInteger, Numeric, DateTime, Date, ForeignKey, Index, CheckConstraint,
+    Sequence, FetchedValue, func, text, Computed
+)
 from sqlalchemy.orm import relationship
 from app.database import Base
 import uuid
 
+# Name of the CHECK constraint rejecting amount_paid > total cost (write paths map it to a 400)
+AMOUNT_PAID_CHECK = "ck_orders_amount_paid_within_total"
+
+# Change cursor shared by order writes and deletes (assigned by triggers, see init_db.py)
+ORDER_CHANGE_SEQ = Sequence("order_change_seq", metadata=Base.metadata)
+
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Range scans for per-user time series (see analytics /timeseries)
+        Index("ix_orders_user_order_date", "user_id", "order_date"),
+        Index("ix_orders_user_release_date", "user_id", "release_date"),
+        # Reminder scheduler: upcoming releases across all users
+        # (the partial index on amount_owing is created in init_db.py after the computed columns)
+        Index("ix_orders_release_date_pending", "release_date", postgresql_where=text("status = 'Pending'")),
+        # Enforced by the database so single-statement UPDATE ... RETURNING needs no read first
+        CheckConstraint("amount_paid <= cost_per_item * quantity", name=AMOUNT_PAID_CHECK),
+        # Delta sync: the user's orders changed after a cursor
+        Index("ix_orders_user_change_seq", "user_id", "change_seq"),
+    )
 
     # Primary key
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
@@ -48,6 +69,9 @@ class Order(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
+    # Position in the change feed; a trigger takes the next order_change_seq on every insert and update
+    change_seq = Column(BigInteger, server_default=FetchedValue(), server_onupdate=FetchedValue(), nullable=False)
+
     # Relationship to user
     # user = relationship("User", back_populates="orders")
 
@@ -0,0 +1,30 @@
+"""
+Order tombstones - deletions recorded for the order change feed
+"""
+from sqlalchemy import Column, String, BigInteger, DateTime, Index, func
+from app.database import Base
+
+
+class OrderTombstone(Base):
+    """
+    One deleted order, written by a trigger on every delete (single, bulk,
+    restore, and cascades from a deleted user). Pruned after
+    ORDER_TOMBSTONE_RETENTION_DAYS.
+    """
+    __tablename__ = "order_tombstones"
+    __table_args__ = (
+        # Delta sync: the user's deletions after a cursor
+        Index("ix_order_tombstones_user_change_seq", "user_id", "change_seq"),
+    )
+
+    # Taken from order_change_seq, so deletes and writes share one cursor
+    change_seq = Column(BigInteger, primary_key=True, autoincrement=False)
+
+    # No foreign keys: the order is gone, and so may be the user
+    order_id = Column(String, nullable=False)
+    user_id = Column(String, nullable=False)
+
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<OrderTombstone {self.order_id} ({self.change_seq})>"
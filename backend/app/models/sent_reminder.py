@@ -0,0 +1,25 @@
+"""
+Sent reminder log - deduplicates reminder and digest emails
+"""
+from sqlalchemy import Column, String, DateTime, UniqueConstraint, func
+from app.database import Base
+import uuid
+
+
+class SentReminder(Base):
+    """One row per reminder handed off for delivery"""
+    __tablename__ = "sent_reminders"
+    __table_args__ = (
+        UniqueConstraint("user_id", "kind", "dedupe_key", name="uq_sent_reminders_user_kind_key"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, nullable=False, index=True)
+    kind = Column(String, nullable=False)  # release, payment, weekly_digest, monthly_digest
+    # release: "<order_id>:<release_date>", payment/weekly_digest: ISO week (e.g. "2025-W07"),
+    # monthly_digest: reported month (e.g. "2025-01")
+    dedupe_key = Column(String, nullable=False)
+    sent_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<SentReminder {self.kind} {self.dedupe_key} for {self.user_id}>"
@@ -1,12 +1,18 @@
 """
 User model - synced from Clerk via webhooks
 """
-from sqlalchemy import Column, String, Boolean, DateTime, func
+from sqlalchemy import Column, String, Boolean, Integer, BigInteger, Numeric, DateTime, Index, func
 from app.database import Base
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset pagination for the admin user list
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # Substring email search (requires the pg_trgm extension, see init_db.py)
+        Index("ix_users_email_trgm", "email", postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+    )
 
     # Clerk user ID as primary key
     id = Column(String, primary_key=True, index=True)
@@ -22,6 +28,16 @@ class User(Base):
     # Stripe customer reference
     stripe_customer_id = Column(String, nullable=True)
 
+    # Incremented on every write to the user's orders (drives ETags)
+    data_version = Column(BigInteger, default=0, server_default="0", nullable=False)
+
+    # Denormalized order counters, maintained by a trigger on orders (see init_db.py)
+    orders_count = Column(Integer, default=0, server_default="0", nullable=False)
+    orders_total_value = Column(Numeric(14, 2), default=0, server_default="0", nullable=False)
+
+    # Last Clerk reconciliation run that saw this user (see app/services/clerk_reconcile.py)
+    clerk_synced_at = Column(DateTime(timezone=True), nullable=True)
+
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -0,0 +1,37 @@
+"""
+Webhook event log - raw deliveries persisted before they are applied
+"""
+from sqlalchemy import Column, String, Integer, BigInteger, Text, DateTime, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
+from app.database import Base
+
+
+class WebhookEvent(Base):
+    """One received webhook delivery, applied in id order by the webhook worker"""
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        # Worker query: pending events in arrival order
+        Index("ix_webhook_events_status_id", "status", "id"),
+    )
+
+    # Arrival order
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+
+    # Provider delivery id (svix-id for Clerk); retried deliveries reuse it
+    source = Column(String, nullable=False)  # clerk
+    delivery_id = Column(String, nullable=False, unique=True)
+
+    event_type = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+
+    # Processing state: pending, processed, failed
+    status = Column(String, default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+
+    # Timestamps
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<WebhookEvent {self.source} {self.event_type} ({self.status})>"
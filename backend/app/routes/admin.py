@@ -1,12 +1,13 @@
 """
 Admin Panel API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from datetime import datetime, timedelta
+from sqlalchemy import func, tuple_
+from datetime import datetime
+from typing import Optional
 from app.database import get_db
-from app.models import User, Order, SystemSettings
+from app.models import User, SystemSettings
 from app.schemas.admin import (
     AdminStatistics,
     SystemSettingsResponse,
@@ -15,6 +16,14 @@ from app.schemas.admin import (
     UserTierUpdate
 )
 from app.utils.admin import get_admin_user
+from app.utils.jobs import get_job_state, save_job_state
+from app.utils.metrics import collect_metrics
+from app.services import admin_stats
+from app.services import clerk_reconcile
+from app.services import grandfathering
+from app.services.invalidation import publish_invalidation
+from app.services.tier_limits import invalidate_tier_settings
+import base64
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,74 +32,18 @@ router = APIRouter()
 
 @router.get("/statistics", response_model=AdminStatistics)
 def get_admin_statistics(
+    refresh: bool = False,
     admin_user: User = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
     """
     Get system-wide statistics for admin dashboard
+
+    Served from a snapshot refreshed in the background; `as_of` tells when it
+    was computed. Pass refresh=true to recompute immediately.
     """
     try:
-        # Calculate date ranges
-        now = datetime.utcnow()
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-
-        # Get week/month start dates
-        week_start = now - timedelta(days=now.weekday())
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-        # Total users
-        total_users = db.query(func.count(User.id)).scalar() or 0
-
-        # Active users (users with activity in last X days)
-        # For now, we'll count users who created orders recently
-        active_7d = db.query(func.count(func.distinct(Order.user_id))).filter(
-            Order.created_at >= week_ago
-        ).scalar() or 0
-
-        active_30d = db.query(func.count(func.distinct(Order.user_id))).filter(
-            Order.created_at >= month_ago
-        ).scalar() or 0
-
-        # New users
-        new_users_week = db.query(func.count(User.id)).filter(
-            User.created_at >= week_start
-        ).scalar() or 0
-
-        new_users_month = db.query(func.count(User.id)).filter(
-            User.created_at >= month_start
-        ).scalar() or 0
-
-        # Total orders
-        total_orders = db.query(func.count(Order.id)).scalar() or 0
-
-        # Average orders per user (calculate manually)
-        if total_users > 0:
-            avg_orders_per_user = total_orders / total_users
-        else:
-            avg_orders_per_user = 0.0
-
-        # User tier distribution
-        free_tier = db.query(func.count(User.id)).filter(User.tier == "free").scalar() or 0
-        basic_tier = db.query(func.count(User.id)).filter(User.tier == "basic").scalar() or 0
-        pro_tier = db.query(func.count(User.id)).filter(User.tier == "pro").scalar() or 0
-
-        # Grandfathered users
-        grandfathered = db.query(func.count(User.id)).filter(User.is_grandfathered == True).scalar() or 0
-
-        return AdminStatistics(
-            total_users=total_users,
-            active_users_7d=active_7d,
-            active_users_30d=active_30d,
-            new_users_this_week=new_users_week,
-            new_users_this_month=new_users_month,
-            total_orders=total_orders,
-            avg_orders_per_user=avg_orders_per_user,
-            free_tier_users=free_tier,
-            basic_tier_users=basic_tier,
-            pro_tier_users=pro_tier,
-            grandfathered_users=grandfathered
-        )
+        return admin_stats.get_admin_statistics(db, force_refresh=refresh)
 
     except Exception as e:
         logger.error(f"Error getting admin statistics: {str(e)}")
@@ -123,6 +76,7 @@ def get_system_settings(
 @router.put("/settings", response_model=SystemSettingsResponse)
 def update_system_settings(
     settings_update: SystemSettingsUpdate,
+    background_tasks: BackgroundTasks,
     admin_user: User = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
@@ -131,7 +85,8 @@ def update_system_settings(
 
     Special handling:
     - When subscriptions_enabled is set to True for the first time,
-      sets grandfather_date to now() and marks all existing users as grandfathered
+      sets grandfather_date to now() and queues a background job that marks
+      all existing users as grandfathered (progress: GET /jobs/grandfather)
     """
     try:
         settings = db.query(SystemSettings).filter(SystemSettings.id == "global").first()
@@ -152,15 +107,20 @@ def update_system_settings(
 
         # Handle subscription enablement
         if enabling_subscriptions:
-            settings.grandfather_date = datetime.utcnow()
+            # Database time, the same clock as users.created_at, which the job compares it with
+            settings.grandfather_date = func.now()
 
-            # Mark all existing users as grandfathered
-            db.query(User).update({"is_grandfathered": True})
+            # Existing users are grandfathered in chunks after the response is sent.
+            # Only the job's key is replaced, so state saved concurrently by other jobs is kept.
+            save_job_state(db, grandfathering.JOB_KEY, grandfathering.initial_job_state())
+            background_tasks.add_task(grandfathering.run_grandfather_job)
 
-            logger.info(f"Subscriptions enabled by admin {admin_user.email}. Grandfather date set, {db.query(func.count(User.id)).scalar()} users grandfathered.")
+            logger.info(f"Subscriptions enabled by admin {admin_user.email}. Grandfather date set, grandfathering job queued.")
 
+        publish_invalidation(db, "settings")  # Other workers drop their cached settings at commit
         db.commit()
         db.refresh(settings)
+        invalidate_tier_settings()
 
         logger.info(f"System settings updated by admin {admin_user.email}")
         return settings
@@ -173,27 +133,101 @@ def update_system_settings(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _encode_user_cursor(user: User) -> str:
+    """Encode a keyset pagination cursor from the last user on a page"""
+    raw = f"{user.created_at.isoformat()}|{user.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_user_cursor(cursor: str) -> tuple[datetime, str]:
+    """Decode a cursor produced by _encode_user_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, user_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), user_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/jobs/grandfather")
+def get_grandfather_job_status(
+    admin_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get progress of the grandfathering job (status, processed, total)
+    """
+    settings = db.query(SystemSettings).filter(SystemSettings.id == "global").first()
+
+    if not settings:
+        raise HTTPException(status_code=404, detail="System settings not found")
+
+    state = get_job_state(settings.extra_settings, grandfathering.JOB_KEY)
+    if not state:
+        raise HTTPException(status_code=404, detail="Grandfathering job has not been started")
+
+    return state
+
+
+@router.get("/jobs/clerk-reconcile")
+def get_clerk_reconcile_job_status(
+    admin_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get progress of the Clerk user reconciliation job
+    """
+    settings = db.query(SystemSettings).filter(SystemSettings.id == "global").first()
+
+    if not settings:
+        raise HTTPException(status_code=404, detail="System settings not found")
+
+    state = get_job_state(settings.extra_settings, clerk_reconcile.JOB_KEY)
+    if not state:
+        raise HTTPException(status_code=404, detail="Clerk reconciliation has not been run")
+
+    return state
+
+
+@router.post("/jobs/clerk-reconcile", status_code=202)
+def start_clerk_reconcile_job(
+    background_tasks: BackgroundTasks,
+    restart: bool = False,
+    admin_user: User = Depends(get_admin_user)
+):
+    """
+    Start (or resume) reconciling the users table with Clerk in the background
+    """
+    background_tasks.add_task(clerk_reconcile.run_reconcile_job, restart=restart)
+    logger.info(f"Admin {admin_user.email} queued Clerk reconciliation (restart={restart})")
+    return {"status": "queued"}
+
+
 @router.get("/users", response_model=list[UserListItem])
 def list_users(
+    response: Response,
     admin_user: User = Depends(get_admin_user),
     db: Session = Depends(get_db),
     search: str = "",
     tier: str = None,
     grandfathered: bool = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None
 ):
     """
     List all users with filtering and pagination
+
+    Users are ordered by (created_at, id). Pass the X-Next-Cursor response
+    header back as `cursor` to fetch the next page; `offset` is still accepted
+    for older clients but gets slower the deeper it goes.
     """
     try:
-        query = db.query(
-            User,
-            func.count(Order.id).label("orders_count")
-        ).outerjoin(Order, User.id == Order.user_id).group_by(User.id)
+        query = db.query(User)
 
         # Apply filters
         if search:
+            # Served by the trigram index on users.email
             query = query.filter(User.email.ilike(f"%{search}%"))
 
         if tier:
@@ -202,15 +236,20 @@ def list_users(
         if grandfathered is not None:
             query = query.filter(User.is_grandfathered == grandfathered)
 
-        # Apply pagination
-        query = query.limit(limit).offset(offset)
+        # Apply keyset pagination
+        if cursor:
+            cursor_created_at, cursor_id = _decode_user_cursor(cursor)
+            query = query.filter(tuple_(User.created_at, User.id) > tuple_(cursor_created_at, cursor_id))
+        elif offset:
+            query = query.offset(offset)
+
+        users = query.order_by(User.created_at, User.id).limit(limit).all()
 
-        results = query.all()
+        if len(users) == limit:
+            response.headers["X-Next-Cursor"] = _encode_user_cursor(users[-1])
 
-        # Transform results
-        user_list = []
-        for user, orders_count in results:
-            user_list.append(UserListItem(
+        return [
+            UserListItem(
                 id=user.id,
                 email=user.email,
                 first_name=user.first_name,
@@ -219,11 +258,14 @@ def list_users(
                 is_grandfathered=user.is_grandfathered,
                 is_admin=user.is_admin,
                 created_at=user.created_at,
-                orders_count=orders_count or 0
-            ))
-
-        return user_list
+                orders_count=user.orders_count,
+                orders_total_value=user.orders_total_value
+            )
+            for user in users
+        ]
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing users: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -250,11 +292,9 @@ def update_user_tier(
             raise HTTPException(status_code=400, detail="Invalid tier. Must be 'free', 'basic', or 'pro'")
 
         user.tier = tier_update.tier
+        publish_invalidation(db, f"user:{user_id}")
         db.commit()
 
-        # Get orders count
-        orders_count = db.query(func.count(Order.id)).filter(Order.user_id == user_id).scalar() or 0
-
         logger.info(f"Admin {admin_user.email} changed user {user.email} tier to {tier_update.tier}")
 
         return UserListItem(
@@ -266,7 +306,8 @@ def update_user_tier(
             is_grandfathered=user.is_grandfathered,
             is_admin=user.is_admin,
             created_at=user.created_at,
-            orders_count=orders_count
+            orders_count=user.orders_count,
+            orders_total_value=user.orders_total_value
         )
 
     except HTTPException:
@@ -275,3 +316,11 @@ def update_user_tier(
         db.rollback()
         logger.error(f"Error updating user tier: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/metrics")
+def get_metrics(admin_user: User = Depends(get_admin_user)):
+    """
+    Get in-process performance metrics (cache hit rates etc.) for this worker
+    """
+    return collect_metrics()
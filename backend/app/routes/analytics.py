@@ -1,21 +1,30 @@
 """
 Analytics API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import func, extract, select, tuple_, literal, Date, Interval
 from typing import Optional, List
 from decimal import Decimal
-from app.database import get_db
+from datetime import date
 from app.models import Order
 from app.schemas.analytics import (
     Statistics,
     SpendingByStore,
     StatusOverview,
     ProfitByStore,
-    MonthlySpending
+    MonthlySpending,
+    AnalyticsDashboard,
+    AggregateRow,
+    AggregateResult,
+    TimeSeriesPoint,
+    TimeSeries
 )
 from app.utils.auth import get_current_user_id
+from app.utils.data_version import conditional_get
+from app.utils.order_queries import order_statistics_statement
+from app.utils.replica import get_read_db
+from app.services.cache import cached_result
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,6 +32,7 @@ router = APIRouter()
 
 
 @router.get("/statistics", response_model=Statistics)
+@cached_result("analytics.statistics")
 def get_statistics(
     status: Optional[str] = None,
     store: Optional[str] = None,
@@ -33,66 +43,35 @@ def get_statistics(
     release_date_to: Optional[str] = None,
     amount_owing_only: Optional[bool] = None,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
 ):
     """
     Get overall statistics with optional filters
     """
     try:
-        # Base query with filters (same as list endpoint)
-        query = db.query(Order).filter(Order.user_id == user_id)
-
-        # Apply same filters as list endpoint
-        if status:
-            query = query.filter(Order.status == status)
-        if store:
-            query = query.filter(Order.store_name == store)
-        if search:
-            search_pattern = f"%{search}%"
-            query = query.filter(
-                (Order.product_name.ilike(search_pattern)) |
-                (Order.store_name.ilike(search_pattern)) |
-                (Order.notes.ilike(search_pattern))
-            )
-        if order_date_from:
-            query = query.filter(Order.order_date >= order_date_from)
-        if order_date_to:
-            query = query.filter(Order.order_date <= order_date_to)
-        if release_date_from:
-            query = query.filter(Order.release_date >= release_date_from)
-        if release_date_to:
-            query = query.filter(Order.release_date <= release_date_to)
-        if amount_owing_only:
-            query = query.filter(Order.amount_owing > 0)
-
-        # Calculate statistics
-        all_orders = query.all()
-
-        total_orders = len(all_orders)
-        pending_count = sum(1 for p in all_orders if p.status == "Pending")
-        delivered_count = sum(1 for p in all_orders if p.status == "Delivered")
-        sold_count = sum(1 for p in all_orders if p.status == "Sold")
-
-        total_cost = sum(p.total_cost or Decimal(0) for p in all_orders)
-        amount_owing = sum(p.amount_owing or Decimal(0) for p in all_orders)
-
-        # Only calculate profit for sold items
-        sold_orders = [p for p in all_orders if p.status == "Sold" and p.profit is not None]
-        total_profit = sum(p.profit for p in sold_orders)
-
-        # Calculate average profit margin for sold items
-        profit_margins = [p.profit_margin for p in sold_orders if p.profit_margin is not None]
-        average_profit_margin = sum(profit_margins) / len(profit_margins) if profit_margins else None
+        # One aggregate row; same filters as the list endpoint except exact store match
+        row = db.execute(order_statistics_statement(
+            user_id,
+            status=status,
+            store=store,
+            search=search,
+            order_date_from=order_date_from,
+            order_date_to=order_date_to,
+            release_date_from=release_date_from,
+            release_date_to=release_date_to,
+            amount_owing_only=amount_owing_only
+        )).one()
 
         return Statistics(
-            total_orders=total_orders,
-            pending_count=pending_count,
-            delivered_count=delivered_count,
-            sold_count=sold_count,
-            total_cost=total_cost,
-            amount_owing=amount_owing,
-            total_profit=total_profit,
-            average_profit_margin=average_profit_margin
+            total_orders=row.total_orders,
+            pending_count=row.pending_count,
+            delivered_count=row.delivered_count,
+            sold_count=row.sold_count,
+            total_cost=row.total_cost or Decimal(0),
+            amount_owing=row.amount_owing or Decimal(0),
+            total_profit=row.total_profit or Decimal(0),
+            average_profit_margin=row.average_profit_margin
         )
 
     except Exception as e:
@@ -101,12 +80,14 @@ def get_statistics(
 
 
 @router.get("/spending-by-store", response_model=List[SpendingByStore])
+@cached_result("analytics.spending_by_store")
 def get_spending_by_store(
     status: Optional[str] = None,
     order_date_from: Optional[str] = None,
     order_date_to: Optional[str] = None,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
 ):
     """
     Get spending grouped by store
@@ -143,12 +124,14 @@ def get_spending_by_store(
 
 
 @router.get("/status-overview", response_model=List[StatusOverview])
+@cached_result("analytics.status_overview")
 def get_status_overview(
     store: Optional[str] = None,
     order_date_from: Optional[str] = None,
     order_date_to: Optional[str] = None,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
 ):
     """
     Get order count and value by status
@@ -185,11 +168,13 @@ def get_status_overview(
 
 
 @router.get("/profit-by-store", response_model=List[ProfitByStore])
+@cached_result("analytics.profit_by_store")
 def get_profit_by_store(
     order_date_from: Optional[str] = None,
     order_date_to: Optional[str] = None,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
 ):
     """
     Get profit grouped by store (only for sold items)
@@ -229,11 +214,13 @@ def get_profit_by_store(
 
 
 @router.get("/monthly-spending", response_model=List[MonthlySpending])
+@cached_result("analytics.monthly_spending")
 def get_monthly_spending(
     status: Optional[str] = None,
     store: Optional[str] = None,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
 ):
     """
     Get spending grouped by month
@@ -265,3 +252,418 @@ def get_monthly_spending(
     except Exception as e:
         logger.error(f"Error getting monthly spending: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get monthly spending: {str(e)}")
+
+
+def _order_filter_conditions(
+    user_id: str,
+    status: Optional[str] = None,
+    store: Optional[str] = None,
+    search: Optional[str] = None,
+    order_date_from: Optional[str] = None,
+    order_date_to: Optional[str] = None,
+    release_date_from: Optional[str] = None,
+    release_date_to: Optional[str] = None,
+    amount_owing_only: Optional[bool] = None
+) -> list:
+    """Build WHERE conditions matching the statistics endpoint's filters"""
+    conditions = [Order.user_id == user_id]
+
+    if status:
+        conditions.append(Order.status == status)
+    if store:
+        conditions.append(Order.store_name == store)
+    if search:
+        search_pattern = f"%{search}%"
+        conditions.append(
+            (Order.product_name.ilike(search_pattern)) |
+            (Order.store_name.ilike(search_pattern)) |
+            (Order.notes.ilike(search_pattern))
+        )
+    if order_date_from:
+        conditions.append(Order.order_date >= order_date_from)
+    if order_date_to:
+        conditions.append(Order.order_date <= order_date_to)
+    if release_date_from:
+        conditions.append(Order.release_date >= release_date_from)
+    if release_date_to:
+        conditions.append(Order.release_date <= release_date_to)
+    if amount_owing_only:
+        conditions.append(Order.amount_owing > 0)
+
+    return conditions
+
+
+# GROUPING(store_name, status, month) bitmask for each grouping set
+_GROUPED_BY_STORE = 0b011
+_GROUPED_BY_STATUS = 0b101
+_GROUPED_BY_MONTH = 0b110
+_GRAND_TOTAL = 0b111
+
+
+@router.get("/dashboard", response_model=AnalyticsDashboard)
+@cached_result("analytics.dashboard")
+def get_dashboard(
+    status: Optional[str] = None,
+    store: Optional[str] = None,
+    search: Optional[str] = None,
+    order_date_from: Optional[str] = None,
+    order_date_to: Optional[str] = None,
+    release_date_from: Optional[str] = None,
+    release_date_to: Optional[str] = None,
+    amount_owing_only: Optional[bool] = None,
+    user_id: str = Depends(get_current_user_id),
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
+):
+    """
+    Get statistics, spending by store, status overview, profit by store and
+    monthly spending in one request.
+
+    All five are computed from a single scan of the filtered orders using
+    GROUPING SETS ((store_name), (status), (month), ()). Every section uses
+    the same filters as /statistics.
+    """
+    try:
+        filtered = select(
+            Order.store_name,
+            Order.status,
+            func.to_char(Order.order_date, 'YYYY-MM').label('month'),
+            Order.total_cost,
+            Order.amount_owing,
+            Order.profit,
+            Order.profit_margin
+        ).where(*_order_filter_conditions(
+            user_id, status, store, search, order_date_from, order_date_to,
+            release_date_from, release_date_to, amount_owing_only
+        )).cte("filtered")
+
+        is_sold = filtered.c.status == "Sold"
+
+        query = select(
+            func.grouping(filtered.c.store_name, filtered.c.status, filtered.c.month).label('grouping'),
+            filtered.c.store_name,
+            filtered.c.status,
+            filtered.c.month,
+            func.count().label('order_count'),
+            func.sum(filtered.c.total_cost).label('total_cost'),
+            func.sum(filtered.c.amount_owing).label('amount_owing'),
+            func.count().filter(filtered.c.status == "Pending").label('pending_count'),
+            func.count().filter(filtered.c.status == "Delivered").label('delivered_count'),
+            func.count().filter(is_sold).label('sold_count'),
+            func.sum(filtered.c.profit).filter(is_sold).label('total_profit'),
+            func.avg(filtered.c.profit_margin).filter(is_sold).label('avg_profit_margin')
+        ).group_by(func.grouping_sets(
+            tuple_(filtered.c.store_name),
+            tuple_(filtered.c.status),
+            tuple_(filtered.c.month),
+            tuple_()
+        ))
+
+        rows = db.execute(query).all()
+
+        statistics = None
+        spending_by_store = []
+        status_overview = []
+        profit_by_store = []
+        monthly_spending = []
+
+        for row in rows:
+            if row.grouping == _GRAND_TOTAL:
+                statistics = Statistics(
+                    total_orders=row.order_count,
+                    pending_count=row.pending_count,
+                    delivered_count=row.delivered_count,
+                    sold_count=row.sold_count,
+                    total_cost=row.total_cost or Decimal(0),
+                    amount_owing=row.amount_owing or Decimal(0),
+                    total_profit=row.total_profit or Decimal(0),
+                    average_profit_margin=row.avg_profit_margin
+                )
+            elif row.grouping == _GROUPED_BY_STORE:
+                spending_by_store.append(SpendingByStore(
+                    store_name=row.store_name,
+                    total_spent=row.total_cost or Decimal(0),
+                    order_count=row.order_count
+                ))
+                if row.sold_count:
+                    profit_by_store.append(ProfitByStore(
+                        store_name=row.store_name,
+                        total_profit=row.total_profit or Decimal(0),
+                        sold_count=row.sold_count,
+                        average_profit_margin=row.avg_profit_margin
+                    ))
+            elif row.grouping == _GROUPED_BY_STATUS:
+                status_overview.append(StatusOverview(
+                    status=row.status,
+                    count=row.order_count,
+                    total_value=row.total_cost or Decimal(0)
+                ))
+            elif row.grouping == _GROUPED_BY_MONTH:
+                monthly_spending.append(MonthlySpending(
+                    month=row.month,
+                    total_spent=row.total_cost or Decimal(0),
+                    order_count=row.order_count
+                ))
+
+        # Match the ordering of the individual endpoints
+        spending_by_store.sort(key=lambda s: s.total_spent, reverse=True)
+        profit_by_store.sort(key=lambda p: p.total_profit, reverse=True)
+        monthly_spending.sort(key=lambda m: m.month)
+
+        return AnalyticsDashboard(
+            statistics=statistics,
+            spending_by_store=spending_by_store,
+            status_overview=status_overview,
+            profit_by_store=profit_by_store,
+            monthly_spending=monthly_spending
+        )
+
+    except Exception as e:
+        logger.error(f"Error getting analytics dashboard: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get analytics dashboard: {str(e)}")
+
+
+# Whitelisted dimensions and measures for the generic aggregate endpoint
+AGGREGATE_DIMENSIONS = {
+    "store_name": Order.store_name,
+    "status": Order.status,
+    "order_month": func.date_trunc('month', Order.order_date).cast(Date),
+    "order_week": func.date_trunc('week', Order.order_date).cast(Date),
+    "release_month": func.date_trunc('month', Order.release_date).cast(Date),
+    "release_week": func.date_trunc('week', Order.release_date).cast(Date),
+}
+
+AGGREGATE_MEASURES = {
+    "count": lambda f: func.count(),
+    "total_cost": lambda f: func.sum(f.c.total_cost),
+    "amount_owing": lambda f: func.sum(f.c.amount_owing),
+    "profit": lambda f: func.sum(f.c.profit).filter(f.c._status == "Sold"),
+    "avg_profit_margin": lambda f: func.avg(f.c.profit_margin).filter(f.c._status == "Sold"),
+}
+
+AGGREGATE_GROUPINGS = ("cube", "rollup", "sets")
+MAX_AGGREGATE_DIMENSIONS = 4
+
+
+@router.get("/aggregate", response_model=AggregateResult)
+@cached_result("analytics.aggregate")
+def get_aggregate(
+    dimensions: List[str] = Query(...),
+    measures: List[str] = Query(["count", "total_cost"]),
+    grouping: str = "cube",
+    status: Optional[str] = None,
+    store: Optional[str] = None,
+    search: Optional[str] = None,
+    order_date_from: Optional[str] = None,
+    order_date_to: Optional[str] = None,
+    release_date_from: Optional[str] = None,
+    release_date_to: Optional[str] = None,
+    amount_owing_only: Optional[bool] = None,
+    user_id: str = Depends(get_current_user_id),
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
+):
+    """
+    Generic aggregate over the user's orders for pivot tables and charts
+
+    Query Parameters:
+    - dimensions: Repeatable; store_name, status, order_month, order_week, release_month, release_week
+    - measures: Repeatable; count, total_cost, amount_owing, profit, avg_profit_margin
+    - grouping: cube (every combination), rollup (hierarchical in the given order)
+      or sets (each dimension on its own plus the grand total)
+    - Filters: same as /statistics
+
+    Every grouping combination is computed by one GROUPING SETS / CUBE / ROLLUP query.
+    """
+    try:
+        unknown_dimensions = [d for d in dimensions if d not in AGGREGATE_DIMENSIONS]
+        if unknown_dimensions:
+            raise HTTPException(status_code=400, detail=f"Unknown dimensions: {', '.join(unknown_dimensions)}")
+        if len(set(dimensions)) != len(dimensions):
+            raise HTTPException(status_code=400, detail="Dimensions must be unique")
+        if len(dimensions) > MAX_AGGREGATE_DIMENSIONS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_AGGREGATE_DIMENSIONS} dimensions are allowed")
+
+        unknown_measures = [m for m in measures if m not in AGGREGATE_MEASURES]
+        if unknown_measures:
+            raise HTTPException(status_code=400, detail=f"Unknown measures: {', '.join(unknown_measures)}")
+
+        if grouping not in AGGREGATE_GROUPINGS:
+            raise HTTPException(status_code=400, detail=f"Invalid grouping. Must be one of: {', '.join(AGGREGATE_GROUPINGS)}")
+
+        filtered = select(
+            *[AGGREGATE_DIMENSIONS[d].label(d) for d in dimensions],
+            Order.status.label("_status"),  # Used by measures even when status isn't a dimension
+            Order.total_cost,
+            Order.amount_owing,
+            Order.profit,
+            Order.profit_margin
+        ).where(*_order_filter_conditions(
+            user_id, status, store, search, order_date_from, order_date_to,
+            release_date_from, release_date_to, amount_owing_only
+        )).cte("filtered")
+
+        dim_columns = [filtered.c[d] for d in dimensions]
+        measure_columns = [AGGREGATE_MEASURES[m](filtered).label(m) for m in measures]
+
+        if grouping == "cube":
+            group_by = func.cube(*dim_columns)
+        elif grouping == "rollup":
+            group_by = func.rollup(*dim_columns)
+        else:
+            group_by = func.grouping_sets(*[tuple_(c) for c in dim_columns], tuple_())
+
+        query = select(
+            func.grouping(*dim_columns).label("_grouping"),
+            *dim_columns,
+            *measure_columns
+        ).group_by(group_by).order_by(func.grouping(*dim_columns), *dim_columns)
+
+        rows = []
+        for row in db.execute(query).mappings():
+            bitmask = row["_grouping"]
+            grouped_by = [
+                d for i, d in enumerate(dimensions)
+                if not bitmask & (1 << (len(dimensions) - 1 - i))
+            ]
+            rows.append(AggregateRow(
+                dimensions={
+                    d: (row[d].isoformat() if hasattr(row[d], "isoformat") else row[d])
+                    for d in dimensions
+                },
+                grouped_by=grouped_by,
+                measures={m: row[m] for m in measures}
+            ))
+
+        return AggregateResult(
+            dimensions=dimensions,
+            measures=measures,
+            grouping=grouping,
+            rows=rows
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting aggregate: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get aggregate: {str(e)}")
+
+
+# Bucket step for each supported granularity (date_trunc unit -> interval)
+TIMESERIES_GRANULARITIES = {
+    "day": "1 day",
+    "week": "1 week",
+    "month": "1 month",
+    "quarter": "3 months",
+}
+
+TIMESERIES_AXES = {
+    "order_date": Order.order_date,
+    "release_date": Order.release_date,
+}
+
+MAX_TIMESERIES_POINTS = 5000
+
+
+@router.get("/timeseries", response_model=TimeSeries)
+@cached_result("analytics.timeseries")
+def get_timeseries(
+    granularity: str = "month",
+    date_axis: str = "order_date",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[str] = None,
+    store: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id),
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
+):
+    """
+    Get spending bucketed by day, week, month or quarter, with empty buckets zero-filled
+
+    Query Parameters:
+    - granularity: day, week, month or quarter
+    - date_axis: order_date or release_date
+    - date_from/date_to: Inclusive range; defaults to the user's first/last date on the axis
+
+    The range predicate is on the raw date column so (user_id, <axis>) indexes
+    serve it with a range scan; buckets come from date_trunc and generate_series.
+    """
+    try:
+        if granularity not in TIMESERIES_GRANULARITIES:
+            raise HTTPException(status_code=400, detail=f"Invalid granularity. Must be one of: {', '.join(TIMESERIES_GRANULARITIES)}")
+        if date_axis not in TIMESERIES_AXES:
+            raise HTTPException(status_code=400, detail=f"Invalid date_axis. Must be one of: {', '.join(TIMESERIES_AXES)}")
+
+        axis = TIMESERIES_AXES[date_axis]
+
+        # Default the range to the user's data (min/max served by the index)
+        if date_from is None or date_to is None:
+            first, last = db.execute(
+                select(func.min(axis), func.max(axis)).where(Order.user_id == user_id)
+            ).one()
+            date_from = date_from or first
+            date_to = date_to or last
+
+        if date_from is None or date_to is None or date_from > date_to:
+            return TimeSeries(
+                granularity=granularity,
+                date_axis=date_axis,
+                date_from=date_from,
+                date_to=date_to,
+                points=[]
+            )
+
+        approx_days = {"day": 1, "week": 7, "month": 28, "quarter": 90}[granularity]
+        if (date_to - date_from).days // approx_days > MAX_TIMESERIES_POINTS:
+            raise HTTPException(status_code=400, detail="Date range too large for this granularity")
+
+        bucket = func.date_trunc(granularity, axis).cast(Date)
+        conditions = [Order.user_id == user_id, axis >= date_from, axis <= date_to]
+        if status:
+            conditions.append(Order.status == status)
+        if store:
+            conditions.append(Order.store_name == store)
+
+        totals = select(
+            bucket.label('period_start'),
+            func.sum(Order.total_cost).label('total_spent'),
+            func.count(Order.id).label('order_count')
+        ).where(*conditions).group_by(bucket).subquery("totals")
+
+        series = select(
+            func.generate_series(
+                func.date_trunc(granularity, date_from),
+                func.date_trunc(granularity, date_to),
+                literal(TIMESERIES_GRANULARITIES[granularity]).cast(Interval)
+            ).cast(Date).label('period_start')
+        ).subquery("series")
+
+        query = select(
+            series.c.period_start,
+            func.coalesce(totals.c.total_spent, 0).label('total_spent'),
+            func.coalesce(totals.c.order_count, 0).label('order_count')
+        ).outerjoin(
+            totals, totals.c.period_start == series.c.period_start
+        ).order_by(series.c.period_start)
+
+        return TimeSeries(
+            granularity=granularity,
+            date_axis=date_axis,
+            date_from=date_from,
+            date_to=date_to,
+            points=[
+                TimeSeriesPoint(
+                    period_start=row.period_start,
+                    total_spent=row.total_spent or Decimal(0),
+                    order_count=row.order_count
+                )
+                for row in db.execute(query)
+            ]
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting time series: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get time series: {str(e)}")
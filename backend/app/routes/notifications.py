@@ -96,17 +96,19 @@ def send_test_notification(
         if not user or not user.email:
             raise HTTPException(status_code=404, detail="User email not found")
 
-        # Send test email
-        result = send_test_email(user.email)
+        # Queue test email (delivered by the outbox worker)
+        result = send_test_email(user.email, db=db)
+        db.commit()
 
         return {
             "success": True,
-            "message": f"Test email sent to {user.email}",
+            "message": f"Test email queued for {user.email}",
             "email_id": result.get("email_id")
         }
 
     except HTTPException:
         raise
     except Exception as e:
+        db.rollback()
         logger.error(f"Error sending test email: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to send test email: {str(e)}")
@@ -1,23 +1,38 @@
 """
 Order CRUD API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File
 from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from pydantic import ValidationError
 from typing import Optional
-from app.database import get_db
+from app.database import get_db, get_settings
 from app.models import Order
+from app.models.order import AMOUNT_PAID_CHECK
 from app.schemas import (
     OrderCreate,
     OrderResponse,
     OrderList,
+    OrderChangesResponse,
     OrderUpdate,
+    BatchCreateRequest,
+    BatchCreateItemResult,
+    BatchCreateResponse,
     BulkUpdateRequest,
     BulkUpdateResponse,
     BulkDeleteRequest,
     BulkDeleteResponse
 )
-from app.utils.auth import get_current_user_id
+from app.utils.auth import get_current_user_id, get_synced_user_id
+from app.utils.data_version import bump_data_version, with_data_version_bump, conditional_get
+from app.utils.order_queries import order_count_statement, order_page_statement
+from app.utils.replica import get_read_db
+from app.utils.singleflight import coalesced
+from app.services.order_changes import DEFAULT_LIMIT as DEFAULT_CHANGES_LIMIT, changes_since
+from app.services.order_events import stream_order_events
+from app.services.tier_limits import enforce_order_quota
 import logging
 import csv
 import io
@@ -39,36 +54,134 @@ class DecimalEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
+AMOUNT_PAID_ERROR = "Amount paid cannot exceed total cost"
+
+
+def _violates_amount_paid_check(e: IntegrityError) -> bool:
+    return getattr(getattr(e.orig, "diag", None), "constraint_name", None) == AMOUNT_PAID_CHECK
+
+
+def _amount_paid_exceeds_total(cost_per_item, quantity, amount_paid) -> bool:
+    """Application-side mirror of the orders CHECK constraint, for per-item reporting"""
+    return (amount_paid or 0) > cost_per_item * quantity
+
+
 @router.post("", response_model=OrderResponse, status_code=201)
 def create_order(
     order: OrderCreate,
-    user_id: str = Depends(get_current_user_id),
+    user_id: str = Depends(get_synced_user_id),
     db: Session = Depends(get_db)
 ):
     """
     Create a new order for the authenticated user
     """
     try:
-        # Create new order
-        db_order = Order(
-            user_id=user_id,
-            **order.model_dump()
-        )
-
-        db.add(db_order)
+        enforce_order_quota(db, user_id, 1)
+
+        # INSERT ... RETURNING brings back the computed columns and timestamps;
+        # omitted fields (e.g. order_date) take their defaults
+        db_order = db.scalars(with_data_version_bump(
+            insert(Order).values(user_id=user_id, **order.model_dump(exclude_none=True)).returning(Order),
+            user_id
+        )).one()
+        # Serialize before commit, which would expire the returned row
+        response = OrderResponse.model_validate(db_order)
         db.commit()
-        db.refresh(db_order)
 
-        logger.info(f"Created order {db_order.id} for user {user_id}")
-        return db_order
+        logger.info(f"Created order {response.id} for user {user_id}")
+        return response
 
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Error creating order: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
 
 
+@router.post("/batch", response_model=BatchCreateResponse, status_code=201)
+def create_orders_batch(
+    request: BatchCreateRequest,
+    user_id: str = Depends(get_synced_user_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Create many orders in one request
+
+    Every item is validated as OrderCreate; invalid items are reported and
+    skipped. Valid items are inserted with one multi-row INSERT ... RETURNING,
+    so computed columns and timestamps come back without a refresh. The whole
+    batch is checked against the tier quota at once.
+
+    Results are returned per item in request order.
+    """
+    try:
+        results = []
+        rows = []
+        positions = []
+        today = None
+
+        for index, item in enumerate(request.orders):
+            try:
+                values = OrderCreate.model_validate(item).model_dump()
+            except ValidationError as e:
+                error = "; ".join(
+                    f"{'.'.join(str(part) for part in err['loc']) or 'order'}: {err['msg']}"
+                    for err in e.errors()
+                )
+                results.append(BatchCreateItemResult(index=index, created=False, error=error))
+                continue
+
+            if values["order_date"] is None:
+                # The database's date, as the column default gives single creates
+                if today is None:
+                    today = db.scalar(select(func.current_date()))
+                values["order_date"] = today
+            rows.append({"user_id": user_id, **values})
+            positions.append(len(results))
+            results.append(None)
+
+        if rows:
+            enforce_order_quota(db, user_id, len(rows))
+            # render_nulls keeps every row's key set identical, so the rows go out
+            # as one multi-row INSERT rather than one statement per key set
+            created = db.scalars(
+                insert(Order).returning(Order, sort_by_parameter_order=True),
+                rows,
+                execution_options={"render_nulls": True}
+            ).all()
+
+            # Serialize before commit, which would expire the returned rows
+            for position, order in zip(positions, created):
+                results[position] = BatchCreateItemResult(
+                    index=position,
+                    created=True,
+                    order=OrderResponse.model_validate(order)
+                )
+
+            bump_data_version(db, user_id)
+            db.commit()
+
+        logger.info(f"Batch created {len(rows)} orders for user {user_id} ({len(results) - len(rows)} failed)")
+
+        return BatchCreateResponse(
+            created_count=len(rows),
+            failed_count=len(results) - len(rows),
+            results=results
+        )
+
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error batch creating orders: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to create orders: {str(e)}")
+
+
 @router.get("", response_model=OrderList)
+@coalesced("orders.list")
 def list_orders(
     page: int = 1,
     page_size: int = 50,
@@ -83,7 +196,8 @@ def list_orders(
     sort_by: Optional[str] = "created_at",
     sort_order: Optional[str] = "desc",
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
 ):
     """
     List orders for the authenticated user with pagination, filtering, and sorting
@@ -99,65 +213,24 @@ def list_orders(
     - sort_order: Sort order (asc, desc)
     """
     try:
-        # Base query - CRITICAL: Filter by user_id for row-level security
-        query = db.query(Order).filter(Order.user_id == user_id)
-
-        # Apply filters
-        if status:
-            query = query.filter(Order.status == status)
-
-        if store:
-            query = query.filter(Order.store_name.ilike(f"%{store}%"))
-
-        if search:
-            search_pattern = f"%{search}%"
-            query = query.filter(
-                (Order.product_name.ilike(search_pattern)) |
-                (Order.store_name.ilike(search_pattern)) |
-                (Order.notes.ilike(search_pattern))
-            )
-
-        # Date range filters
-        if order_date_from:
-            query = query.filter(Order.order_date >= order_date_from)
-        if order_date_to:
-            query = query.filter(Order.order_date <= order_date_to)
-        if release_date_from:
-            query = query.filter(Order.release_date >= release_date_from)
-        if release_date_to:
-            query = query.filter(Order.release_date <= release_date_to)
-
-        # Amount owing filter (using computed column)
-        if amount_owing_only:
-            query = query.filter(Order.amount_owing > 0)
-
-        # Get total count before sorting
-        total = query.count()
-
-        # Apply sorting
-        valid_sort_fields = {
-            "created_at": Order.created_at,
-            "order_date": Order.order_date,
-            "release_date": Order.release_date,
-            "product_name": Order.product_name,
-            "store_name": Order.store_name,
-            "quantity": Order.quantity,
-            "cost_per_item": Order.cost_per_item,
-            "total_cost": Order.total_cost,
-            "amount_paid": Order.amount_paid,
-            "amount_owing": Order.amount_owing,
-            "status": Order.status,
-        }
+        # Lambda statements: compiled once per filter combination, values are bound
+        filters = dict(
+            status=status,
+            store=store,
+            search=search,
+            order_date_from=order_date_from,
+            order_date_to=order_date_to,
+            release_date_from=release_date_from,
+            release_date_to=release_date_to,
+            amount_owing_only=amount_owing_only
+        )
 
-        sort_field = valid_sort_fields.get(sort_by, Order.created_at)
-        if sort_order == "asc":
-            query = query.order_by(sort_field.asc())
-        else:
-            query = query.order_by(sort_field.desc())
+        total = db.execute(order_count_statement(user_id, **filters)).scalar()
 
-        # Apply pagination
         offset = (page - 1) * page_size
-        orders = query.offset(offset).limit(page_size).all()
+        orders = db.execute(
+            order_page_statement(user_id, sort_by, sort_order, offset, page_size, **filters)
+        ).scalars().all()
 
         logger.info(f"Retrieved {len(orders)} orders for user {user_id} (total: {total})")
 
@@ -173,6 +246,62 @@ def list_orders(
         raise HTTPException(status_code=500, detail=f"Failed to list orders: {str(e)}")
 
 
+@router.get("/changes", response_model=OrderChangesResponse)
+def get_order_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_CHANGES_LIMIT, ge=1, le=1000),
+    user_id: str = Depends(get_current_user_id),
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
+):
+    """
+    Orders created or updated, and orders deleted, after a change cursor
+
+    Start with since=0 (a full sync), apply the returned orders and deletions,
+    keep `cursor` and pass it as `since` next time; repeat while `has_more`.
+    Deletions cover single, bulk, restore and account deletes. If
+    `reset_required` is set the cursor is too old and the client must resync
+    from 0. Unchanged data answers 304 via If-None-Match.
+    """
+    try:
+        changes = changes_since(db, user_id, since, limit)
+
+        return OrderChangesResponse(
+            orders=changes.orders,
+            deleted=changes.deleted,
+            cursor=changes.cursor,
+            has_more=changes.has_more,
+            reset_required=changes.reset_required
+        )
+
+    except Exception as e:
+        logger.error(f"Error getting order changes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get order changes: {str(e)}")
+
+
+@router.get("/events")
+async def order_events(
+    request: Request,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Server-sent events stream of the user's order changes
+
+    Pushes orders.changed (then analytics.invalidated) whenever a write to the
+    user's orders commits on any worker, and resync when events may have been
+    missed. Clients apply changes through /changes from their cursor instead
+    of polling the list and analytics endpoints.
+    """
+    if not get_settings().order_events_enabled:
+        raise HTTPException(status_code=503, detail="Order events are disabled")
+
+    return StreamingResponse(
+        stream_order_events(request, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/{order_id}", response_model=OrderResponse)
 def get_order(
     order_id: str,
@@ -204,41 +333,40 @@ def update_order(
     Update a order by ID
     """
     try:
-        # Find order with row-level security check
-        order = db.query(Order).filter(
-            Order.id == order_id,
-            Order.user_id == user_id
-        ).first()
+        # Update only provided fields, in one UPDATE ... RETURNING with row-level security;
+        # the amount_paid <= total cost rule is the orders CHECK constraint
+        update_data = order_update.model_dump(exclude_unset=True) or {"updated_at": func.now()}
+
+        order = db.scalars(
+            with_data_version_bump(
+                update(Order)
+                .where(Order.id == order_id, Order.user_id == user_id)
+                .values(**update_data)
+                .returning(Order),
+                user_id
+            ),
+            execution_options={"synchronize_session": False}
+        ).one_or_none()
 
         if not order:
+            db.rollback()  # Also undoes the data version bump
             raise HTTPException(status_code=404, detail="Order not found")
 
-        # Update only provided fields
-        update_data = order_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(order, field, value)
-
-        # Validate amount_paid doesn't exceed total_cost after update
-        # Total cost is computed by database, so we need to calculate it here
-        quantity = order.quantity
-        cost_per_item = order.cost_per_item
-        amount_paid = order.amount_paid
-        total_cost = quantity * cost_per_item
-
-        if amount_paid > total_cost:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Amount paid (${amount_paid}) cannot exceed total cost (${total_cost})"
-            )
-
+        # Serialize before commit, which would expire the returned row
+        response = OrderResponse.model_validate(order)
         db.commit()
-        db.refresh(order)
 
         logger.info(f"Updated order {order_id} for user {user_id}")
-        return order
+        return response
 
     except HTTPException:
         raise
+    except IntegrityError as e:
+        db.rollback()
+        if _violates_amount_paid_check(e):
+            raise HTTPException(status_code=400, detail=AMOUNT_PAID_ERROR)
+        logger.error(f"Error updating order: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to update order: {str(e)}")
     except Exception as e:
         db.rollback()
         logger.error(f"Error updating order: {str(e)}")
@@ -265,6 +393,7 @@ def delete_order(
             raise HTTPException(status_code=404, detail="Order not found")
 
         db.delete(order)
+        bump_data_version(db, user_id)
         db.commit()
 
         logger.info(f"Deleted order {order_id} for user {user_id}")
@@ -279,9 +408,11 @@ def delete_order(
 
 
 @router.get("/stores", response_model=list[str])
+@coalesced("orders.stores")
 def get_store_names(
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    data_version: int = Depends(conditional_get)
 ):
     """
     Get unique store names from user's orders
@@ -334,18 +465,26 @@ def bulk_update_orders(
                     Order.user_id == user_id
                 ).first()
 
-                if order:
+                if not order:
+                    failed_ids.append(order_id)
+                elif _amount_paid_exceeds_total(
+                    update_data.get("cost_per_item", order.cost_per_item),
+                    update_data.get("quantity", order.quantity),
+                    update_data.get("amount_paid", order.amount_paid)
+                ):
+                    # Would violate the CHECK constraint and fail the whole commit
+                    failed_ids.append(order_id)
+                else:
                     # Update fields
                     for field, value in update_data.items():
                         setattr(order, field, value)
                     updated_count += 1
-                else:
-                    failed_ids.append(order_id)
 
             except Exception as e:
                 logger.error(f"Error updating order {order_id}: {str(e)}")
                 failed_ids.append(order_id)
 
+        bump_data_version(db, user_id)
         db.commit()
 
         logger.info(f"Bulk updated {updated_count} orders for user {user_id}")
@@ -358,6 +497,12 @@ def bulk_update_orders(
 
     except HTTPException:
         raise
+    except IntegrityError as e:
+        db.rollback()
+        if _violates_amount_paid_check(e):
+            raise HTTPException(status_code=400, detail=AMOUNT_PAID_ERROR)
+        logger.error(f"Error in bulk update: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to bulk update: {str(e)}")
     except Exception as e:
         db.rollback()
         logger.error(f"Error in bulk update: {str(e)}")
@@ -398,6 +543,7 @@ def bulk_delete_orders(
                 logger.error(f"Error deleting order {order_id}: {str(e)}")
                 failed_ids.append(order_id)
 
+        bump_data_version(db, user_id)
         db.commit()
 
         logger.info(f"Bulk deleted {deleted_count} orders for user {user_id}")
@@ -419,7 +565,7 @@ def bulk_delete_orders(
 @router.get("/export")
 def export_orders(
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Export all orders to CSV format
@@ -485,7 +631,7 @@ def export_orders(
 async def import_orders(
     file: UploadFile = File(...),
     duplicate_handling: str = "skip",  # skip, update, or add
-    user_id: str = Depends(get_current_user_id),
+    user_id: str = Depends(get_synced_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -508,6 +654,7 @@ async def import_orders(
         skipped_count = 0
         failed_count = 0
         errors = []
+        new_orders = []
 
         for row_num, row in enumerate(reader, start=2):  # Start at 2 (1 is header)
             try:
@@ -526,9 +673,14 @@ async def import_orders(
                             continue
                         elif duplicate_handling == "update":
                             # Update existing order
-                            existing.quantity = int(row["quantity"])
-                            existing.cost_per_item = Decimal(row["cost_per_item"])
-                            existing.amount_paid = Decimal(row["amount_paid"]) if row["amount_paid"] else Decimal(0)
+                            quantity = int(row["quantity"])
+                            cost_per_item = Decimal(row["cost_per_item"])
+                            amount_paid = Decimal(row["amount_paid"]) if row["amount_paid"] else Decimal(0)
+                            if _amount_paid_exceeds_total(cost_per_item, quantity, amount_paid):
+                                raise ValueError(AMOUNT_PAID_ERROR)
+                            existing.quantity = quantity
+                            existing.cost_per_item = cost_per_item
+                            existing.amount_paid = amount_paid
                             existing.sold_price = Decimal(row["sold_price"]) if row.get("sold_price") else None
                             existing.status = row["status"]
                             existing.product_url = row.get("product_url") or None
@@ -553,7 +705,10 @@ async def import_orders(
                     notes=row.get("notes") or None
                 )
 
-                db.add(order)
+                if _amount_paid_exceeds_total(order.cost_per_item, order.quantity, order.amount_paid):
+                    raise ValueError(AMOUNT_PAID_ERROR)
+
+                new_orders.append(order)
                 imported_count += 1
 
             except Exception as e:
@@ -561,6 +716,11 @@ async def import_orders(
                 errors.append(f"Row {row_num}: {str(e)}")
                 logger.error(f"Error importing row {row_num}: {str(e)}")
 
+        # Check the whole batch against the remaining quota at once
+        enforce_order_quota(db, user_id, len(new_orders))
+        db.add_all(new_orders)
+
+        bump_data_version(db, user_id)
         db.commit()
 
         logger.info(f"Imported {imported_count} orders for user {user_id}")
@@ -572,6 +732,15 @@ async def import_orders(
             "errors": errors[:10]  # Return first 10 errors only
         }
 
+    except HTTPException:
+        db.rollback()
+        raise
+    except IntegrityError as e:
+        db.rollback()
+        if _violates_amount_paid_check(e):
+            raise HTTPException(status_code=400, detail=AMOUNT_PAID_ERROR)
+        logger.error(f"Error importing CSV: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to import CSV: {str(e)}")
     except Exception as e:
         db.rollback()
         logger.error(f"Error importing CSV: {str(e)}")
@@ -581,7 +750,7 @@ async def import_orders(
 @router.get("/backup")
 def backup_orders(
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Create a JSON backup of all orders
@@ -638,7 +807,7 @@ def backup_orders(
 @router.post("/restore")
 async def restore_orders(
     file: UploadFile = File(...),
-    user_id: str = Depends(get_current_user_id),
+    user_id: str = Depends(get_synced_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -662,6 +831,7 @@ async def restore_orders(
         restored_count = 0
         failed_count = 0
         errors = []
+        new_orders = []
 
         for item in backup_data["orders"]:
             try:
@@ -680,7 +850,10 @@ async def restore_orders(
                     notes=item.get("notes")
                 )
 
-                db.add(order)
+                if _amount_paid_exceeds_total(order.cost_per_item, order.quantity, order.amount_paid):
+                    raise ValueError(AMOUNT_PAID_ERROR)
+
+                new_orders.append(order)
                 restored_count += 1
 
             except Exception as e:
@@ -688,6 +861,11 @@ async def restore_orders(
                 errors.append(f"Failed to restore item '{item.get('product_name', 'unknown')}': {str(e)}")
                 logger.error(f"Error restoring order: {str(e)}")
 
+        # Existing orders were deleted above, so the counter is already reset
+        enforce_order_quota(db, user_id, len(new_orders))
+        db.add_all(new_orders)
+
+        bump_data_version(db, user_id)
         db.commit()
 
         logger.info(f"Restored {restored_count} orders for user {user_id}")
@@ -702,7 +880,14 @@ async def restore_orders(
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON file")
     except HTTPException:
+        db.rollback()
         raise
+    except IntegrityError as e:
+        db.rollback()
+        if _violates_amount_paid_check(e):
+            raise HTTPException(status_code=400, detail=AMOUNT_PAID_ERROR)
+        logger.error(f"Error restoring backup: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to restore backup: {str(e)}")
     except Exception as e:
         db.rollback()
         logger.error(f"Error restoring backup: {str(e)}")
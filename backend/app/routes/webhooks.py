@@ -1,10 +1,12 @@
 """
 Webhook handlers for external services (Clerk, Stripe)
 """
-from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, Request, HTTPException, Depends
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User
+from app.services.webhook_events import record_event, process_pending_events
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,54 +14,34 @@ router = APIRouter()
 
 
 @router.post("/clerk")
-async def clerk_webhook(request: Request, db: Session = Depends(get_db)):
+async def clerk_webhook(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
     Handle Clerk webhook events for user management
     Events: user.created, user.updated, user.deleted
+
+    The event is stored and acknowledged; the webhook worker applies it.
+    Retried deliveries (same svix-id) are acknowledged without being stored again.
     """
     try:
         # Get the webhook payload
-        payload = await request.json()
-        event_type = payload.get("type")
-        data = payload.get("data", {})
-
-        logger.info(f"Received Clerk webhook: {event_type}")
+        body = await request.body()
+        payload = json.loads(body)
+        event_type = payload.get("type") or "unknown"
+        delivery_id = request.headers.get("svix-id") or hashlib.sha256(body).hexdigest()
 
-        if event_type == "user.created":
-            # Create new user in database
-            user = User(
-                id=data.get("id"),
-                email=data.get("email_addresses", [{}])[0].get("email_address"),
-                first_name=data.get("first_name"),
-                last_name=data.get("last_name"),
-                tier="free",
-                is_grandfathered=False,
-                is_admin=False
-            )
-            db.add(user)
-            db.commit()
-            logger.info(f"Created user: {user.email}")
+        logger.info(f"Received Clerk webhook: {event_type} ({delivery_id})")
 
-        elif event_type == "user.updated":
-            # Update existing user
-            user = db.query(User).filter(User.id == data.get("id")).first()
-            if user:
-                user.email = data.get("email_addresses", [{}])[0].get("email_address")
-                user.first_name = data.get("first_name")
-                user.last_name = data.get("last_name")
-                db.commit()
-                logger.info(f"Updated user: {user.email}")
+        is_new = record_event(db, "clerk", delivery_id, event_type, payload)
+        db.commit()
 
-        elif event_type == "user.deleted":
-            # Delete user (cascade will delete orders)
-            user = db.query(User).filter(User.id == data.get("id")).first()
-            if user:
-                db.delete(user)
-                db.commit()
-                logger.info(f"Deleted user: {user.email}")
+        if not is_new:
+            return {"status": "duplicate"}
 
-        return {"status": "success"}
+        # Apply right after the response; the periodic worker retries failures
+        background_tasks.add_task(process_pending_events)
+        return {"status": "accepted"}
 
     except Exception as e:
+        db.rollback()
         logger.error(f"Clerk webhook error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -6,6 +6,11 @@ from app.schemas.order import (
     OrderResponse,
     OrderUpdate,
     OrderList,
+    OrderTombstoneResponse,
+    OrderChangesResponse,
+    BatchCreateRequest,
+    BatchCreateItemResult,
+    BatchCreateResponse,
     BulkUpdateRequest,
     BulkUpdateResponse,
     BulkDeleteRequest,
@@ -17,6 +22,11 @@ __all__ = [
     "OrderResponse",
     "OrderUpdate",
     "OrderList",
+    "OrderTombstoneResponse",
+    "OrderChangesResponse",
+    "BatchCreateRequest",
+    "BatchCreateItemResult",
+    "BatchCreateResponse",
     "BulkUpdateRequest",
     "BulkUpdateResponse",
     "BulkDeleteRequest",
@@ -4,6 +4,7 @@ Pydantic schemas for admin API endpoints
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
+from decimal import Decimal
 
 
 # System Settings Schemas
@@ -44,6 +45,7 @@ class AdminStatistics(BaseModel):
     basic_tier_users: int
     pro_tier_users: int
     grandfathered_users: int
+    as_of: Optional[datetime] = None  # When the snapshot was computed
 
 
 # User Management Schemas
@@ -57,6 +59,7 @@ class UserListItem(BaseModel):
     is_admin: bool
     created_at: datetime
     orders_count: int
+    orders_total_value: Decimal = Decimal(0)
 
     class Config:
         from_attributes = True
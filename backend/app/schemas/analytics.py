@@ -3,7 +3,8 @@ Pydantic schemas for Analytics API responses
 """
 from pydantic import BaseModel
 from decimal import Decimal
-from typing import Optional
+from datetime import date
+from typing import Optional, List, Dict
 
 
 class Statistics(BaseModel):
@@ -45,3 +46,43 @@ class MonthlySpending(BaseModel):
     month: str  # Format: "2025-01"
     total_spent: Decimal
     order_count: int
+
+
+class AnalyticsDashboard(BaseModel):
+    """All analytics page data, computed from one filtered scan"""
+    statistics: Statistics
+    spending_by_store: List[SpendingByStore]
+    status_overview: List[StatusOverview]
+    profit_by_store: List[ProfitByStore]
+    monthly_spending: List[MonthlySpending]
+
+
+class AggregateRow(BaseModel):
+    """One row of a generic aggregate (one grouping set combination)"""
+    dimensions: Dict[str, Optional[str]]  # None when the dimension is rolled up
+    grouped_by: List[str]  # Dimensions this row is grouped by
+    measures: Dict[str, Optional[Decimal]]
+
+
+class AggregateResult(BaseModel):
+    """Result of a generic aggregate query, suitable for pivot tables"""
+    dimensions: List[str]
+    measures: List[str]
+    grouping: str
+    rows: List[AggregateRow]
+
+
+class TimeSeriesPoint(BaseModel):
+    """Spending for one time bucket"""
+    period_start: date
+    total_spent: Decimal
+    order_count: int
+
+
+class TimeSeries(BaseModel):
+    """Zero-filled spending series at a given granularity"""
+    granularity: str  # day, week, month, quarter
+    date_axis: str  # order_date or release_date
+    date_from: Optional[date]
+    date_to: Optional[date]
+    points: List[TimeSeriesPoint]
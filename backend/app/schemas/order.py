@@ -2,7 +2,7 @@
 Pydantic schemas for Order API requests/responses
 """
 from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import Optional
+from typing import Any, Optional
 from datetime import date, datetime
 from decimal import Decimal
 
@@ -14,7 +14,7 @@ class OrderCreate(BaseModel):
     quantity: int = Field(1, gt=0)
     store_name: str = Field(..., min_length=1, max_length=200)
     cost_per_item: Decimal = Field(..., gt=0, decimal_places=2)
-    amount_paid: Decimal = Field(0, ge=0, decimal_places=2)
+    amount_paid: Decimal = Field(Decimal(0), ge=0, decimal_places=2)
     sold_price: Optional[Decimal] = Field(None, ge=0, decimal_places=2)
     status: str = Field("Pending", pattern="^(Pending|Delivered|Sold)$")
     release_date: Optional[date] = None
@@ -55,6 +55,9 @@ class OrderResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+    # Change feed position (see GET /orders/changes)
+    change_seq: Optional[int] = None
+
     class Config:
         from_attributes = True  # Allows conversion from SQLAlchemy models
 
@@ -74,6 +77,45 @@ class OrderUpdate(BaseModel):
     notes: Optional[str] = None
 
 
+class OrderTombstoneResponse(BaseModel):
+    """Schema for a deleted order in the change feed"""
+    order_id: str
+    change_seq: int
+    deleted_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class OrderChangesResponse(BaseModel):
+    """Schema for the order change feed: apply orders and deletions, then keep cursor"""
+    orders: list[OrderResponse]
+    deleted: list[OrderTombstoneResponse]
+    cursor: int
+    has_more: bool
+    reset_required: bool = False  # Cursor is older than tombstone retention: resync from 0
+
+
+class BatchCreateRequest(BaseModel):
+    """Schema for batch create request (items are validated one by one as OrderCreate)"""
+    orders: list[dict[str, Any]] = Field(..., min_length=1, max_length=500)
+
+
+class BatchCreateItemResult(BaseModel):
+    """Result for one item of a batch create, in request order"""
+    index: int
+    created: bool
+    order: Optional[OrderResponse] = None
+    error: Optional[str] = None
+
+
+class BatchCreateResponse(BaseModel):
+    """Schema for batch create response"""
+    created_count: int
+    failed_count: int
+    results: list[BatchCreateItemResult]
+
+
 class OrderList(BaseModel):
     """Schema for list of orders with pagination"""
     orders: list[OrderResponse]
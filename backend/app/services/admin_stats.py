@@ -0,0 +1,108 @@
+"""
+Admin dashboard statistics
+
+All counters are computed in one statement (one pass over users, one over
+orders, using FILTER clauses) and kept in an in-process snapshot that a
+background task refreshes on a schedule.
+"""
+from sqlalchemy import select, func, true
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+from app.database import SessionLocal, get_settings
+from app.models import User, Order
+from app.schemas.admin import AdminStatistics
+from typing import Optional
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_snapshot: Optional[AdminStatistics] = None
+
+
+def compute_admin_statistics(db: Session) -> AdminStatistics:
+    """Compute every admin statistic with a single SQL statement"""
+    now = datetime.utcnow()
+    week_ago = now - timedelta(days=7)
+    month_ago = now - timedelta(days=30)
+    week_start = now - timedelta(days=now.weekday())
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    user_stats = select(
+        func.count().label("total_users"),
+        func.count().filter(User.created_at >= week_start).label("new_users_this_week"),
+        func.count().filter(User.created_at >= month_start).label("new_users_this_month"),
+        func.count().filter(User.tier == "free").label("free_tier_users"),
+        func.count().filter(User.tier == "basic").label("basic_tier_users"),
+        func.count().filter(User.tier == "pro").label("pro_tier_users"),
+        func.count().filter(User.is_grandfathered == True).label("grandfathered_users")
+    ).subquery("user_stats")
+
+    # Active users = users who created orders recently
+    order_stats = select(
+        func.count().label("total_orders"),
+        func.count(func.distinct(Order.user_id)).filter(Order.created_at >= week_ago).label("active_users_7d"),
+        func.count(func.distinct(Order.user_id)).filter(Order.created_at >= month_ago).label("active_users_30d")
+    ).subquery("order_stats")
+
+    # Both subqueries return exactly one row
+    row = db.execute(
+        select(user_stats, order_stats).select_from(user_stats.join(order_stats, true()))
+    ).one()
+
+    total_users = row.total_users or 0
+    total_orders = row.total_orders or 0
+
+    return AdminStatistics(
+        total_users=total_users,
+        active_users_7d=row.active_users_7d or 0,
+        active_users_30d=row.active_users_30d or 0,
+        new_users_this_week=row.new_users_this_week or 0,
+        new_users_this_month=row.new_users_this_month or 0,
+        total_orders=total_orders,
+        avg_orders_per_user=total_orders / total_users if total_users > 0 else 0.0,
+        free_tier_users=row.free_tier_users or 0,
+        basic_tier_users=row.basic_tier_users or 0,
+        pro_tier_users=row.pro_tier_users or 0,
+        grandfathered_users=row.grandfathered_users or 0,
+        as_of=datetime.now(timezone.utc)
+    )
+
+
+def refresh_admin_statistics(db: Optional[Session] = None) -> AdminStatistics:
+    """Recompute the snapshot (opens its own session when called from a background task)"""
+    global _snapshot
+
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        stats = compute_admin_statistics(db)
+    finally:
+        if own_session:
+            db.close()
+
+    with _lock:
+        _snapshot = stats
+
+    logger.info(f"Admin statistics snapshot refreshed at {stats.as_of.isoformat()}")
+    return stats
+
+
+def get_admin_statistics(db: Session, force_refresh: bool = False) -> AdminStatistics:
+    """
+    Return the cached snapshot, recomputing it when forced, missing, or older
+    than twice the refresh interval (e.g. the background task is not running)
+    """
+    max_age = timedelta(seconds=2 * get_settings().admin_stats_refresh_seconds)
+    snapshot = _snapshot
+
+    if (
+        force_refresh
+        or snapshot is None
+        or datetime.now(timezone.utc) - snapshot.as_of > max_age
+    ):
+        return refresh_admin_statistics(db)
+
+    return snapshot
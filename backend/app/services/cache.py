@@ -0,0 +1,256 @@
+"""
+Result cache for deterministic read endpoints
+
+Entries are keyed by (namespace, user_id, data_version, params). Because every
+order write bumps the user's data_version, a write makes exactly that user's
+cached entries unreachable; they then age out through TTL and LRU eviction.
+
+Backends:
+- memory: in-process LRU with TTL and a maximum entry count (default)
+- redis: any Redis-protocol server (requires the optional `redis` package,
+  or an injected client such as a local stand-in)
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from fastapi.encoders import jsonable_encoder
+from app.database import get_settings
+from app.utils.metrics import register_collector
+from app.utils.singleflight import request_flights
+from typing import Any, Callable
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class CacheBackend(ABC):
+    """Interface for cache backends. Values must be JSON-serializable."""
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """Return the cached value or _MISSING"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        """Store value under key for ttl seconds"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Drop one key (no-op if absent)"""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> None:
+        """Drop every key starting with prefix"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every entry"""
+
+    @abstractmethod
+    def size(self) -> int:
+        """Number of stored entries"""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Thread-safe in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Redis-protocol backend. TTL is enforced by the server (SETEX); size-bounded
+    eviction is delegated to the server's maxmemory-policy (e.g. allkeys-lru).
+    Keys are stored under `prefix`, so clear() and size() only touch this
+    backend's entries and never other data in the same database.
+    """
+
+    def __init__(self, url: str = "", client: Any = None, prefix: str = "cache:"):
+        if not prefix:
+            raise ValueError("RedisCacheBackend needs a non-empty key prefix")
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package to be installed")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return _MISSING
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        self.client.setex(self.prefix + key, ttl, json.dumps(value))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def delete_prefix(self, prefix: str) -> None:
+        keys = list(self.client.scan_iter(match=f"{self.prefix}{prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self) -> None:
+        self.delete_prefix("")
+
+    def size(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.prefix}*"))
+
+
+class ResultCache:
+    """Cache front-end with hit/miss accounting"""
+
+    def __init__(self, backend: CacheBackend, ttl: int = 300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()  # Counters are updated from request threads
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, computing and storing it on a miss"""
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            # Cache outages must never fail the request
+            with self._lock:
+                self.errors += 1
+            logger.error(f"Cache get failed for {key}: {str(e)}")
+            value = _MISSING
+
+        if value is not _MISSING:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+        value = jsonable_encoder(compute())
+
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.error(f"Cache set failed for {key}: {str(e)}")
+
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "ttl_seconds": self.ttl,
+        }
+        try:
+            stats["entries"] = self.backend.size()
+        except Exception:
+            stats["entries"] = None
+        if isinstance(self.backend, MemoryCacheBackend):
+            stats["evictions"] = self.backend.evictions
+            stats["max_entries"] = self.backend.max_entries
+        return stats
+
+
+@lru_cache()
+def get_result_cache() -> ResultCache:
+    """Get the process-wide result cache, configured from settings"""
+    settings = get_settings()
+
+    if settings.cache_backend == "redis":
+        backend = RedisCacheBackend(settings.cache_redis_url, prefix="result_cache:")
+    else:
+        backend = MemoryCacheBackend(max_entries=settings.cache_max_entries)
+
+    cache = ResultCache(backend, ttl=settings.cache_ttl_seconds)
+    register_collector("result_cache", cache.stats)
+    return cache
+
+
+def make_cache_key(namespace: str, user_id: str, data_version: int, params: dict) -> str:
+    """Build a cache key; the user id prefix allows per-user invalidation"""
+    normalized = json.dumps(params, sort_keys=True, default=str)
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+    return f"{user_id}:v{data_version}:{namespace}:{digest}"
+
+
+def cached_result(namespace: str):
+    """
+    Decorator for read endpoints whose result depends only on the user, the
+    user's data version and the query parameters.
+
+    The decorated route must take `user_id` and `data_version` (from
+    conditional_get) keyword arguments; `db` is excluded from the key.
+    Concurrent misses for the same key are coalesced into one computation.
+
+    Usage:
+        @router.get("/statistics", response_model=Statistics)
+        @cached_result("analytics.statistics")
+        def get_statistics(..., user_id=..., db=..., data_version=...):
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            user_id = kwargs["user_id"]
+            data_version = kwargs["data_version"]
+            params = {k: v for k, v in kwargs.items() if k not in ("user_id", "data_version", "db")}
+            key = make_cache_key(namespace, user_id, data_version, params)
+            cache = get_result_cache()
+            return request_flights.do(key, lambda: cache.get_or_compute(key, lambda: func(*args, **kwargs)))
+        return wrapper
+    return decorator
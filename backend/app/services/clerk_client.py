@@ -0,0 +1,139 @@
+"""
+Clerk Backend API client
+
+One process-wide httpx client with connection pooling, keep-alive and
+explicit timeouts. Transport errors, 429s and 5xx responses count towards a
+circuit breaker, so an unreachable Clerk fails fast instead of tying up
+request threads. The base URL comes from CLERK_API_URL, so tests and local
+development can point it at a stand-in (or pass an httpx transport).
+"""
+from functools import lru_cache
+from app.database import get_settings
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.metrics import register_collector
+from typing import TYPE_CHECKING, List, Optional
+import logging
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class ClerkError(Exception):
+    """Clerk returned an error response"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ClerkUnavailableError(ClerkError):
+    """Clerk could not be reached (network error, 429/5xx, or open circuit)"""
+
+
+class _RetryableResponse(Exception):
+    def __init__(self, response: "httpx.Response"):
+        super().__init__(f"Clerk API returned {response.status_code}")
+        self.response = response
+
+
+def primary_email(clerk_user: dict) -> Optional[str]:
+    """The user's primary email address (falls back to the first one)"""
+    email_addresses = clerk_user.get("email_addresses") or []
+    return next(
+        (e["email_address"] for e in email_addresses if e.get("id") == clerk_user.get("primary_email_address_id")),
+        email_addresses[0]["email_address"] if email_addresses else None
+    )
+
+
+class ClerkClient:
+    """Thread-safe Clerk API client (httpx.Client is safe to share across threads)"""
+
+    def __init__(
+        self,
+        secret_key: str,
+        base_url: str = "https://api.clerk.com/v1",
+        timeout: float = 5.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        transport: Optional["httpx.BaseTransport"] = None
+    ):
+        import httpx  # Deferred until the client is first needed
+
+        self.client = httpx.Client(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {secret_key}", "Content-Type": "application/json"},
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 2.0)),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            # Retries connection failures only; requests are never resent after being sent
+            transport=transport or httpx.HTTPTransport(retries=1)
+        )
+        self.breaker = CircuitBreaker(
+            "clerk",
+            failure_threshold=failure_threshold,
+            reset_timeout=reset_timeout,
+            failure_exceptions=(httpx.TransportError, _RetryableResponse)
+        )
+        self.requests = 0
+
+    def _send(self, method: str, path: str, **kwargs) -> "httpx.Response":
+        response = self.client.request(method, path, **kwargs)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise _RetryableResponse(response)
+        return response
+
+    def request(self, method: str, path: str, **kwargs) -> "httpx.Response":
+        """Send a request through the circuit breaker; raises ClerkError on non-2xx"""
+        import httpx
+
+        self.requests += 1
+        try:
+            response = self.breaker.call(lambda: self._send(method, path, **kwargs))
+        except CircuitOpenError as e:
+            raise ClerkUnavailableError(str(e))
+        except httpx.TransportError as e:
+            raise ClerkUnavailableError(f"Clerk API unreachable: {str(e)}")
+        except _RetryableResponse as e:
+            raise ClerkUnavailableError(str(e), e.response.status_code)
+
+        if response.is_error:
+            raise ClerkError(f"Clerk API returned {response.status_code}", response.status_code)
+        return response
+
+    def get_user(self, user_id: str) -> dict:
+        return self.request("GET", f"/users/{user_id}").json()
+
+    def list_users(
+        self,
+        limit: int = 500,
+        offset: int = 0,
+        user_ids: Optional[List[str]] = None,
+        order_by: str = "created_at"
+    ) -> List[dict]:
+        """One page of users in a stable order, optionally restricted to the given ids"""
+        params = {"limit": limit, "offset": offset, "order_by": order_by}
+        if user_ids:
+            params["user_id"] = list(user_ids)
+        return self.request("GET", "/users", params=params).json()
+
+    def close(self) -> None:
+        self.client.close()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "circuit": self.breaker.stats()}
+
+
+@lru_cache()
+def get_clerk_client() -> ClerkClient:
+    """Get the process-wide Clerk client, configured from settings"""
+    settings = get_settings()
+    client = ClerkClient(
+        settings.clerk_secret_key,
+        base_url=settings.clerk_api_url,
+        timeout=settings.clerk_timeout_seconds,
+        failure_threshold=settings.clerk_circuit_failure_threshold,
+        reset_timeout=settings.clerk_circuit_reset_seconds
+    )
+    register_collector("clerk_api", client.stats)
+    return client
@@ -0,0 +1,294 @@
+"""
+Clerk user reconciliation job
+
+Repairs drift between Clerk and the users table (missed webhooks). Pages
+through Clerk's user list in large batches; for each page the matching rows
+are loaded in one query and diffed in memory, then applied as multi-row
+statements: one INSERT ... ON CONFLICT DO NOTHING for new users, one
+UPDATE ... FROM (VALUES ...) for changed profiles, and one UPDATE marking the
+rest as seen (clerk_synced_at). Once the listing is complete, users not seen
+in this run are re-checked against Clerk by id (offset paging can skip users
+when Clerk's list changes mid-run) and those still missing are deleted in
+chunks.
+
+Progress is stored in system_settings.extra_settings["clerk_reconcile_job"]
+after every page, so an interrupted run resumes where it stopped. Each page
+is applied in its own transaction under the job's transaction-level advisory
+lock (see app/utils/jobs.py), and only if the stored progress is still what
+this runner last saved; otherwise another worker has taken the run over and
+this one stops. Clerk is called between transactions, never inside one.
+
+Run with:
+    python -m app.services.clerk_reconcile            # resume or start a run
+    python -m app.services.clerk_reconcile --restart  # discard progress and start over
+"""
+from sqlalchemy import select, update, delete, func, values, column, String, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
+from datetime import datetime, timezone
+from app.database import get_engine
+from app.models import User
+from app.services.clerk_client import ClerkClient, get_clerk_client, primary_email
+from app.services.invalidation import publish_invalidation
+from app.utils.jobs import load_job_state, record_job_failure, save_job_state, try_job_lock
+from typing import Any, Dict, List, NamedTuple, Optional
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = "clerk_reconcile_job"
+PAGE_SIZE = 500  # Clerk's maximum page size
+VERIFY_CHUNK_SIZE = 100  # Users re-checked by id per Clerk request before deletion
+MAX_DELETE_FRACTION = 0.1  # Refuse to delete more than this share of users in one run
+
+users = User.__table__
+
+
+def initial_job_state() -> dict:
+    """State stored when a new run starts"""
+    return {
+        "status": "running",
+        "phase": "listing",  # listing, deleting
+        "run_started_at": datetime.now(timezone.utc).isoformat(),
+        "offset": 0,
+        "seen": 0,
+        "inserted": 0,
+        "updated": 0,
+        "deleted": 0,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "finished_at": None,
+        "error": None,
+    }
+
+
+def _resume(conn: Connection, expected: dict) -> bool:
+    """
+    Begin a page transaction: take the job lock and check that the stored
+    state is still `expected`. False (transaction rolled back) if another
+    worker holds the lock or has moved the run on.
+    """
+    if try_job_lock(conn, JOB_KEY) and load_job_state(conn, JOB_KEY) == expected:
+        return True
+    conn.rollback()
+    return False
+
+
+def _profile(clerk_user: dict) -> dict:
+    return {
+        "id": clerk_user["id"],
+        "email": primary_email(clerk_user),
+        "first_name": clerk_user.get("first_name"),
+        "last_name": clerk_user.get("last_name"),
+    }
+
+
+class PageDiff(NamedTuple):
+    new: List[dict]
+    changed: List[dict]
+    unchanged_ids: List[str]
+
+
+def diff_page(clerk_users: List[dict], existing: Dict[str, Any]) -> PageDiff:
+    """
+    Split a page of Clerk users into new, changed and unchanged profiles.
+    `existing` maps user id to its row (with email, first_name, last_name).
+    """
+    new, changed, unchanged_ids = [], [], []
+    for p in {p["id"]: p for p in (_profile(u) for u in clerk_users)}.values():
+        row = existing.get(p["id"])
+        if row is None:
+            if p["email"]:  # email is required; users without one are left to the webhook
+                new.append(p)
+            continue
+        p["email"] = p["email"] or row.email
+        if (row.email, row.first_name, row.last_name) != (p["email"], p["first_name"], p["last_name"]):
+            changed.append(p)
+        else:
+            unchanged_ids.append(p["id"])
+    return PageDiff(new, changed, unchanged_ids)
+
+
+def apply_page(conn: Connection, clerk_users: List[dict], run_started_at: datetime) -> dict:
+    """Diff one page of Clerk users against the database and apply the changes"""
+    if not clerk_users:
+        return {"inserted": 0, "updated": 0}
+
+    existing = {
+        row.id: row
+        for row in conn.execute(
+            select(users.c.id, users.c.email, users.c.first_name, users.c.last_name)
+            .where(users.c.id.in_([u["id"] for u in clerk_users]))
+        )
+    }
+    new, changed, unchanged_ids = diff_page(clerk_users, existing)
+
+    inserted = 0
+    if new:
+        inserted = conn.execute(
+            pg_insert(users)
+            .values([
+                {**p, "tier": "free", "is_grandfathered": False, "is_admin": False, "clerk_synced_at": run_started_at}
+                for p in new
+            ])
+            .on_conflict_do_nothing()
+        ).rowcount
+
+    if changed:
+        incoming = values(
+            column("id", String), column("email", String), column("first_name", String), column("last_name", String),
+            name="incoming"
+        ).data([(p["id"], p["email"], p["first_name"], p["last_name"]) for p in changed])
+        conn.execute(
+            update(users)
+            .where(users.c.id == incoming.c.id)
+            .values(
+                email=incoming.c.email,
+                first_name=incoming.c.first_name,
+                last_name=incoming.c.last_name,
+                clerk_synced_at=run_started_at
+            )
+        )
+
+    if unchanged_ids:
+        conn.execute(
+            update(users)
+            .where(users.c.id.in_(unchanged_ids))
+            # Keep updated_at: marking a row as seen is not a profile change
+            .values(clerk_synced_at=run_started_at, updated_at=users.c.updated_at)
+        )
+
+    return {"inserted": inserted, "updated": len(changed)}
+
+
+def _stale_users(run_started_at: datetime) -> tuple:
+    """Conditions for users that existed when the run started but were not seen"""
+    return (
+        users.c.created_at < run_started_at,
+        or_(users.c.clerk_synced_at.is_(None), users.c.clerk_synced_at < run_started_at)
+    )
+
+
+def check_deletion_guard(stale: int, total: int) -> None:
+    """Raise if deleting `stale` of `total` users looks like a broken listing rather than real deletions"""
+    if stale > max(10, total * MAX_DELETE_FRACTION):
+        raise RuntimeError(
+            f"Refusing to delete {stale} of {total} users; check the Clerk listing before deleting manually"
+        )
+
+
+def delete_stale_users(conn: Connection, client: ClerkClient, state: dict, run_started_at: datetime) -> bool:
+    """
+    Re-check unseen users against Clerk by id and delete those still missing
+    (orders cascade). Returns False if another worker took the run over.
+    """
+    while True:
+        if not _resume(conn, state):
+            return False
+
+        total = conn.execute(select(func.count(users.c.id))).scalar() or 0
+        stale = conn.execute(select(func.count(users.c.id)).where(*_stale_users(run_started_at))).scalar() or 0
+        try:
+            check_deletion_guard(stale, total)
+        except RuntimeError:
+            conn.rollback()
+            raise
+
+        user_ids = conn.execute(
+            select(users.c.id).where(*_stale_users(run_started_at)).order_by(users.c.id).limit(VERIFY_CHUNK_SIZE)
+        ).scalars().all()
+        conn.rollback()  # Read-only; don't hold the transaction during the Clerk call
+        if not user_ids:
+            return True
+
+        found = client.list_users(limit=len(user_ids), user_ids=user_ids)
+        if not _resume(conn, state):
+            return False
+
+        counts = apply_page(conn, found, run_started_at)  # Marks the ones still in Clerk as seen
+        state["updated"] += counts["updated"]
+
+        missing = set(user_ids) - {u["id"] for u in found}
+        if missing:
+            state["deleted"] += conn.execute(delete(users).where(users.c.id.in_(list(missing)))).rowcount
+            publish_invalidation(conn, *(f"user:{user_id}" for user_id in missing))
+        save_job_state(conn, JOB_KEY, state)
+        conn.commit()
+
+
+def run_reconcile_job(client: Optional[ClerkClient] = None, restart: bool = False) -> Optional[dict]:
+    """
+    Run (or resume) a reconciliation run until completion.
+
+    Returns the last state this worker saved, or None if another worker holds
+    the job lock.
+    """
+    client = client or get_clerk_client()
+
+    with get_engine().connect() as conn:
+        if not try_job_lock(conn, JOB_KEY):
+            conn.rollback()
+            logger.info("Clerk reconciliation already running on another worker")
+            return None
+
+        try:
+            state = load_job_state(conn, JOB_KEY)
+            if restart or not state or state["status"] == "completed":
+                state = initial_job_state()
+            state["status"] = "running"
+            state["error"] = None
+            save_job_state(conn, JOB_KEY, state)
+            conn.commit()
+
+            run_started_at = datetime.fromisoformat(state["run_started_at"])
+            logger.info(f"Clerk reconciliation running from offset {state['offset']}")
+
+            while state["phase"] == "listing":
+                page = client.list_users(limit=PAGE_SIZE, offset=state["offset"])
+                if not _resume(conn, state):
+                    logger.info("Clerk reconciliation taken over by another worker")
+                    return state
+
+                if page:
+                    counts = apply_page(conn, page, run_started_at)
+                    state["inserted"] += counts["inserted"]
+                    state["updated"] += counts["updated"]
+                    state["seen"] += len(page)
+                    state["offset"] += len(page)
+                if len(page) < PAGE_SIZE:
+                    state["phase"] = "deleting"
+                save_job_state(conn, JOB_KEY, state)
+                conn.commit()
+
+            if not delete_stale_users(conn, client, state, run_started_at) or not _resume(conn, state):
+                logger.info("Clerk reconciliation taken over by another worker")
+                return state
+
+            state["status"] = "completed"
+            state["finished_at"] = datetime.now(timezone.utc).isoformat()
+            save_job_state(conn, JOB_KEY, state)
+            conn.commit()
+
+            logger.info(
+                f"Clerk reconciliation completed: {state['seen']} seen, {state['inserted']} inserted, "
+                f"{state['updated']} updated, {state['deleted']} deleted"
+            )
+            return state
+
+        except Exception as e:
+            logger.error(f"Clerk reconciliation failed: {str(e)}")
+            record_job_failure(conn, JOB_KEY, e)
+            raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile the users table with Clerk")
+    parser.add_argument("--restart", action="store_true", help="Discard saved progress and start a new run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run_reconcile_job(restart=args.restart)
+
+
+if __name__ == "__main__":
+    main()
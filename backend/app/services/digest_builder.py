@@ -0,0 +1,230 @@
+"""
+Weekly and monthly digest builder
+
+Every opted-in user's digest numbers come from one grouped aggregate over
+orders (FILTER clauses per figure, LEFT JOIN to notification preferences for
+the defaults). The result is streamed from a server-side cursor in chunks;
+each chunk is claimed in sent_reminders, rendered from the precompiled
+templates in email_service and queued in the email outbox with one INSERT,
+all in one short transaction.
+
+Weekly digests cover the 7 days before the run and are sent once per ISO
+week; monthly digests cover the previous calendar month and are sent once
+per month, so running the builder more often than that is harmless.
+
+Run as a separate process:
+    python -m app.services.digest_builder            # loop forever
+    python -m app.services.digest_builder --once     # single pass (cron)
+"""
+from sqlalchemy import select, func, literal, true, false
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+from app.database import SessionLocal, get_engine
+from app.models import User, Order, NotificationPreferences, SentReminder
+from app.services.email_outbox import enqueue_emails
+from app.services.email_service import build_weekly_digest, build_monthly_digest
+from app.services.reminder_scheduler import claim_reminders
+from typing import Iterator, List, NamedTuple, Optional
+import argparse
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+class WeeklyDigest(NamedTuple):
+    user_id: str
+    email: str
+    total_orders: int
+    pending_count: int
+    delivered_count: int
+    total_owing: float
+    dedupe_key: str
+
+
+class MonthlyDigest(NamedTuple):
+    user_id: str
+    email: str
+    total_orders: int
+    total_spent: float
+    total_profit: float
+    sold_count: int
+    dedupe_key: str
+
+
+def _week_key(today: date) -> str:
+    iso_year, iso_week, _ = today.isocalendar()
+    return f"{iso_year}-W{iso_week:02d}"
+
+
+def _previous_month(today: date) -> tuple:
+    """(first day, first day of next month) of the month before today"""
+    month_end = today.replace(day=1)
+    month_start = (month_end - timedelta(days=1)).replace(day=1)
+    return month_start, month_end
+
+
+def _not_sent(kind: str, dedupe_key: str):
+    return ~select(SentReminder.id).where(
+        SentReminder.user_id == Order.user_id,
+        SentReminder.kind == kind,
+        SentReminder.dedupe_key == dedupe_key
+    ).exists()
+
+
+def weekly_digest_query(today: date):
+    """
+    One row per opted-in user with orders: orders placed in the last 7 days,
+    plus current pending/delivered counts and total owing
+    """
+    week_start = today - timedelta(days=7)
+    return (
+        select(
+            Order.user_id,
+            User.email,
+            func.count(Order.id).filter(Order.order_date >= week_start).label("total_orders"),
+            func.count(Order.id).filter(Order.status == "Pending").label("pending_count"),
+            func.count(Order.id).filter(Order.status == "Delivered").label("delivered_count"),
+            func.coalesce(func.sum(Order.amount_owing), 0).label("total_owing"),
+            literal(_week_key(today)).label("dedupe_key")
+        )
+        .join(User, User.id == Order.user_id)
+        .outerjoin(NotificationPreferences, NotificationPreferences.user_id == Order.user_id)
+        .where(
+            func.coalesce(NotificationPreferences.weekly_digest_enabled, false()),
+            _not_sent("weekly_digest", _week_key(today))
+        )
+        .group_by(Order.user_id, User.email)
+        .order_by(Order.user_id)
+    )
+
+
+def monthly_digest_query(today: date):
+    """
+    One row per opted-in user with orders placed in the previous month: count,
+    total spent, and sold count/profit among those orders
+    """
+    month_start, month_end = _previous_month(today)
+    is_sold = Order.status == "Sold"
+    return (
+        select(
+            Order.user_id,
+            User.email,
+            func.count(Order.id).label("total_orders"),
+            func.coalesce(func.sum(Order.total_cost), 0).label("total_spent"),
+            func.coalesce(func.sum(Order.profit).filter(is_sold), 0).label("total_profit"),
+            func.count(Order.id).filter(is_sold).label("sold_count"),
+            literal(month_start.strftime("%Y-%m")).label("dedupe_key")
+        )
+        .join(User, User.id == Order.user_id)
+        .outerjoin(NotificationPreferences, NotificationPreferences.user_id == Order.user_id)
+        .where(
+            Order.order_date >= month_start,
+            Order.order_date < month_end,
+            func.coalesce(NotificationPreferences.monthly_digest_enabled, true()),
+            _not_sent("monthly_digest", month_start.strftime("%Y-%m"))
+        )
+        .group_by(Order.user_id, User.email)
+        .order_by(Order.user_id)
+    )
+
+
+def iter_weekly_digests(today: date, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[WeeklyDigest]]:
+    """Stream weekly digests in chunks from a server-side cursor"""
+    with get_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(
+            weekly_digest_query(today)
+        )
+        for rows in result.partitions(chunk_size):
+            yield [
+                WeeklyDigest(r.user_id, r.email, r.total_orders, r.pending_count,
+                             r.delivered_count, float(r.total_owing), r.dedupe_key)
+                for r in rows
+            ]
+
+
+def iter_monthly_digests(today: date, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[MonthlyDigest]]:
+    """Stream monthly digests in chunks from a server-side cursor"""
+    with get_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(
+            monthly_digest_query(today)
+        )
+        for rows in result.partitions(chunk_size):
+            yield [
+                MonthlyDigest(r.user_id, r.email, r.total_orders, float(r.total_spent),
+                              float(r.total_profit), r.sold_count, r.dedupe_key)
+                for r in rows
+            ]
+
+
+def queue_weekly_digests(db: Session, digests: List[WeeklyDigest]) -> int:
+    """Claim a chunk and queue the rendered emails (caller commits)"""
+    claimed = claim_reminders(db, "weekly_digest", digests)
+    return enqueue_emails(db, [
+        build_weekly_digest(d.email, d.total_orders, d.pending_count, d.delivered_count, d.total_owing)
+        for d in claimed
+    ])
+
+
+def queue_monthly_digests(db: Session, digests: List[MonthlyDigest]) -> int:
+    """Claim a chunk and queue the rendered emails (caller commits)"""
+    claimed = claim_reminders(db, "monthly_digest", digests)
+    return enqueue_emails(db, [
+        build_monthly_digest(d.email, d.total_orders, d.total_spent, d.total_profit, d.sold_count)
+        for d in claimed
+    ])
+
+
+def run_digests(today: Optional[date] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Queue all due weekly and monthly digests. Each chunk commits on its own,
+    so a failure only retries the remaining chunks on the next pass.
+    """
+    today = today or date.today()
+    counts = {"weekly_digest": 0, "monthly_digest": 0}
+
+    db = SessionLocal()
+    try:
+        for chunk in iter_weekly_digests(today, chunk_size):
+            counts["weekly_digest"] += queue_weekly_digests(db, chunk)
+            db.commit()
+
+        for chunk in iter_monthly_digests(today, chunk_size):
+            counts["monthly_digest"] += queue_monthly_digests(db, chunk)
+            db.commit()
+
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    logger.info(
+        f"Digest pass for {today.isoformat()}: {counts['weekly_digest']} weekly, {counts['monthly_digest']} monthly"
+    )
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue due weekly and monthly digests")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--interval", type=int, default=3600, help="Seconds between passes")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    while True:
+        try:
+            run_digests(chunk_size=args.chunk_size)
+        except Exception as e:
+            logger.error(f"Digest pass failed: {str(e)}")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Email outbox and delivery worker
+
+Request paths only enqueue (insert an EmailOutbox row in their own
+transaction). The worker claims due rows with FOR UPDATE SKIP LOCKED, sends
+them through a pluggable transport in batches on a bounded thread pool, and
+records the outcome: sent, retried with exponential backoff, or failed after
+email_max_attempts.
+
+Claimed rows are leased (status=sending, next_attempt_at=now+lease), so rows
+held by a crashed worker become due again when the lease expires, unless
+that was their last attempt: then they are marked failed.
+
+Run the worker standalone with:
+    python -m app.services.email_outbox
+(it also runs inside the API process unless EMAIL_WORKER_ENABLED=false)
+"""
+from abc import ABC, abstractmethod
+from sqlalchemy import select, insert, update, bindparam, or_
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from app.database import SessionLocal, get_settings
+from app.models import EmailOutbox
+from app.utils.metrics import register_collector
+from typing import List, NamedTuple, Optional
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 300
+BASE_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+
+
+class OutgoingEmail(NamedTuple):
+    id: str
+    from_email: str
+    to_email: str
+    subject: str
+    html: str
+
+
+def enqueue_email(db: Session, from_email: str, to_email: str, subject: str, html: str) -> EmailOutbox:
+    """Queue an email in the caller's transaction (the caller commits)"""
+    message = EmailOutbox(
+        from_email=from_email,
+        to_email=to_email,
+        subject=subject,
+        html=html
+    )
+    db.add(message)
+    db.flush()
+    return message
+
+
+def enqueue_emails(db: Session, messages: List[dict]) -> int:
+    """
+    Queue many Resend-style params dicts with one multi-row INSERT in the
+    caller's transaction (the caller commits); returns the number queued
+    """
+    if not messages:
+        return 0
+    db.execute(
+        insert(EmailOutbox),
+        [
+            {"from_email": m["from"], "to_email": m["to"][0], "subject": m["subject"], "html": m["html"]}
+            for m in messages
+        ]
+    )
+    return len(messages)
+
+
+# Transports
+
+class EmailTransport(ABC):
+    """Sends a batch of emails; returns provider ids in order or raises for the whole batch"""
+
+    max_batch_size = 1
+
+    @abstractmethod
+    def send_batch(self, messages: List[OutgoingEmail]) -> List[Optional[str]]:
+        """Send messages in one request"""
+
+    def close(self) -> None:
+        """Release connections (called on shutdown)"""
+
+
+class ResendTransport(EmailTransport):
+    """Resend HTTP API over a pooled, keep-alive httpx client, using the batch endpoint"""
+
+    max_batch_size = 100
+
+    def __init__(self, api_key: str, base_url: str = "https://api.resend.com", timeout: float = 10.0):
+        import httpx  # Deferred until the worker starts
+
+        self.client = httpx.Client(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+        )
+
+    def send_batch(self, messages: List[OutgoingEmail]) -> List[Optional[str]]:
+        payload = [
+            {"from": m.from_email, "to": [m.to_email], "subject": m.subject, "html": m.html}
+            for m in messages
+        ]
+        if len(payload) == 1:
+            response = self.client.post("/emails", json=payload[0])
+            response.raise_for_status()
+            return [response.json().get("id")]
+
+        response = self.client.post("/emails/batch", json=payload)
+        response.raise_for_status()
+        return [item.get("id") for item in response.json().get("data", [])]
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class LocalTransport(EmailTransport):
+    """In-memory stand-in for development and tests; keeps every sent message"""
+
+    max_batch_size = 100
+
+    def __init__(self):
+        self.sent: List[OutgoingEmail] = []
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages: List[OutgoingEmail]) -> List[Optional[str]]:
+        with self._lock:
+            self.sent.extend(messages)
+        return [f"local-{m.id}" for m in messages]
+
+
+class RateLimiter:
+    """Token bucket shared by all delivery threads (one token per API request)"""
+
+    def __init__(self, rate_per_second: float):
+        self.rate = rate_per_second
+        self.tokens = 1.0
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BASE_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+class OutboxWorker:
+    """Claims due outbox rows and delivers them with bounded concurrency"""
+
+    def __init__(
+        self,
+        transport: EmailTransport,
+        concurrency: int = 2,
+        batch_size: int = 100,
+        rate_per_second: float = 2.0,
+        max_attempts: int = 5
+    ):
+        self.transport = transport
+        self.batch_size = max(1, min(batch_size, transport.max_batch_size))
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.rate_limiter = RateLimiter(rate_per_second)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="email-outbox")
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _fail_expired_leases(self, db: Session, now: datetime) -> None:
+        """
+        Fail leased messages whose worker died on the last allowed attempt;
+        re-claiming them would retry forever
+        """
+        result = db.execute(
+            update(EmailOutbox)
+            .where(
+                EmailOutbox.status == "sending",
+                EmailOutbox.next_attempt_at <= now,
+                EmailOutbox.attempts >= self.max_attempts
+            )
+            .values(status="failed", last_error="Lease expired on the last attempt")
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            logger.error(f"Failed {result.rowcount} emails whose lease expired on the last attempt")
+            self.failed += result.rowcount
+
+    def _claim(self, db: Session, limit: int) -> List[OutgoingEmail]:
+        """Lease up to `limit` due messages"""
+        now = datetime.now(timezone.utc)
+        self._fail_expired_leases(db, now)
+        due = (
+            select(EmailOutbox.id)
+            .where(
+                or_(EmailOutbox.status == "pending", EmailOutbox.status == "sending"),
+                EmailOutbox.next_attempt_at <= now,
+                EmailOutbox.attempts < self.max_attempts
+            )
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        rows = db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(due.scalar_subquery()))
+            .values(
+                status="sending",
+                attempts=EmailOutbox.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+            )
+            .returning(
+                EmailOutbox.id,
+                EmailOutbox.from_email,
+                EmailOutbox.to_email,
+                EmailOutbox.subject,
+                EmailOutbox.html
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+        return [OutgoingEmail(*row) for row in rows]
+
+    def _send(self, batch: List[OutgoingEmail]) -> List[Optional[str]]:
+        self.rate_limiter.acquire()
+        provider_ids = self.transport.send_batch(batch)
+        return provider_ids + [None] * (len(batch) - len(provider_ids))
+
+    def _deliver(self, batch: List[OutgoingEmail]):
+        """
+        Send one batch; returns (message, provider_id, error) per message.
+
+        If the batch request fails, its messages are sent one by one, so a
+        single bad message only costs an attempt for itself.
+        """
+        try:
+            return [(m, pid, None) for m, pid in zip(batch, self._send(batch))]
+        except Exception as e:
+            if len(batch) == 1:
+                return [(batch[0], None, e)]
+            logger.warning(f"Email batch of {len(batch)} failed, sending individually: {str(e)}")
+
+        results = []
+        for message in batch:
+            try:
+                results.append((message, self._send([message])[0], None))
+            except Exception as e:
+                results.append((message, None, e))
+        return results
+
+    def _record(self, db: Session, results) -> None:
+        now = datetime.now(timezone.utc)
+        sent, failed = [], []
+
+        for message, provider_id, error in results:
+            if error is None:
+                sent.append({"message_id": message.id, "provider_id": provider_id})
+            else:
+                logger.error(f"Email {message.id} failed: {str(error)}")
+                failed.append({"message_id": message.id, "error": str(error)[:1000]})
+
+        if sent:
+            db.execute(
+                update(EmailOutbox.__table__)
+                .where(EmailOutbox.id == bindparam("message_id"))
+                .values(status="sent", sent_at=now, provider_id=bindparam("provider_id"), last_error=None),
+                sent
+            )
+            self.sent += len(sent)
+
+        if failed:
+            attempts = dict(db.execute(
+                select(EmailOutbox.id, EmailOutbox.attempts)
+                .where(EmailOutbox.id.in_([f["message_id"] for f in failed]))
+            ).all())
+            for f in failed:
+                count = attempts.get(f["message_id"], self.max_attempts)
+                f["status"] = "failed" if count >= self.max_attempts else "pending"
+                f["next_attempt_at"] = now + _backoff(count)
+                if f["status"] == "failed":
+                    self.failed += 1
+                else:
+                    self.retried += 1
+            db.execute(
+                update(EmailOutbox.__table__)
+                .where(EmailOutbox.id == bindparam("message_id"))
+                .values(
+                    status=bindparam("status"),
+                    next_attempt_at=bindparam("next_attempt_at"),
+                    last_error=bindparam("error")
+                ),
+                failed
+            )
+
+        db.commit()
+
+    def run_once(self) -> int:
+        """Deliver due messages until the outbox is drained; returns messages processed"""
+        processed = 0
+        capacity = self.batch_size * self.concurrency
+
+        while True:
+            db = SessionLocal()
+            try:
+                claimed = self._claim(db, capacity)
+                if not claimed:
+                    break
+
+                batches = [claimed[i:i + self.batch_size] for i in range(0, len(claimed), self.batch_size)]
+                results = [result for batch in self.executor.map(self._deliver, batches) for result in batch]
+                self._record(db, results)
+                processed += len(claimed)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+            if len(claimed) < capacity:
+                break
+
+        return processed
+
+    def close(self) -> None:
+        """Wait for in-flight sends, then stop the thread pool and the transport"""
+        self.executor.shutdown(wait=True)
+        self.transport.close()
+
+    def stats(self) -> dict:
+        return {
+            "transport": type(self.transport).__name__,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+def create_transport() -> EmailTransport:
+    """Build the transport selected by EMAIL_TRANSPORT"""
+    settings = get_settings()
+    if settings.email_transport == "local":
+        return LocalTransport()
+    return ResendTransport(settings.resend_api_key)
+
+
+@lru_cache()
+def get_outbox_worker() -> OutboxWorker:
+    """Get the process-wide outbox worker, configured from settings"""
+    settings = get_settings()
+    worker = OutboxWorker(
+        create_transport(),
+        concurrency=settings.email_worker_concurrency,
+        batch_size=settings.email_batch_size,
+        rate_per_second=settings.email_rate_limit_per_second,
+        max_attempts=settings.email_max_attempts
+    )
+    register_collector("email_outbox", worker.stats)
+    return worker
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+    worker = get_outbox_worker()
+    try:
+        while True:
+            try:
+                worker.run_once()
+            except Exception as e:
+                logger.error(f"Email outbox pass failed: {str(e)}")
+            time.sleep(settings.email_worker_interval_seconds)
+    finally:
+        worker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,45 @@
 """
-Email Service using Resend
+Email Service
+
+Builds notification emails and queues them in the email outbox; delivery
+through Resend happens in the outbox worker (app/services/email_outbox.py).
 """
 import os
-import resend
+from string import Template
+from sqlalchemy.orm import Session
 from typing import Optional
+from app.database import SessionLocal
+from app.services.email_outbox import enqueue_email
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Initialize Resend with API key from environment
-resend.api_key = os.getenv("RESEND_API_KEY")
 FROM_EMAIL = os.getenv("RESEND_FROM_EMAIL", "onboarding@resend.dev")
 
 
-def send_test_email(to_email: str) -> dict:
+def _enqueue(params: dict, db: Optional[Session] = None) -> str:
+    """
+    Queue an email built from Resend-style params; returns the outbox id.
+    Uses the caller's transaction when db is given, otherwise commits its own.
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        message = enqueue_email(db, params["from"], params["to"][0], params["subject"], params["html"])
+        if own_session:
+            db.commit()
+        return message.id
+    except Exception:
+        if own_session:
+            db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+
+def send_test_email(to_email: str, db: Optional[Session] = None) -> dict:
     """
     Send a test email to verify Resend integration
     """
@@ -39,16 +65,16 @@ def send_test_email(to_email: str) -> dict:
             """
         }
 
-        response = resend.Emails.send(params)
-        logger.info(f"Test email sent to {to_email}, ID: {response.get('id')}")
-        return {"success": True, "email_id": response.get('id')}
+        email_id = _enqueue(params, db)
+        logger.info(f"Test email queued for {to_email}, ID: {email_id}")
+        return {"success": True, "email_id": email_id}
 
     except Exception as e:
-        logger.error(f"Failed to send test email: {str(e)}")
-        raise Exception(f"Failed to send email: {str(e)}")
+        logger.error(f"Failed to queue test email: {str(e)}")
+        raise Exception(f"Failed to queue email: {str(e)}")
 
 
-def send_release_reminder(
+def build_release_reminder(
     to_email: str,
     product_name: str,
     store_name: str,
@@ -56,14 +82,13 @@ def send_release_reminder(
     days_until: int
 ) -> dict:
     """
-    Send a release reminder email
+    Build the params for a release reminder email
     """
-    try:
-        params = {
-            "from": FROM_EMAIL,
-            "to": [to_email],
-            "subject": f"Reminder: {product_name} releases in {days_until} day(s)",
-            "html": f"""
+    return {
+        "from": FROM_EMAIL,
+        "to": [to_email],
+        "subject": f"Reminder: {product_name} releases in {days_until} day(s)",
+        "html": f"""
                 <h1>Release Reminder</h1>
                 <p>Your order is releasing soon!</p>
 
@@ -82,31 +107,22 @@ def send_release_reminder(
                     <br>Manage your preferences in Settings.
                 </p>
             """
-        }
+    }
 
-        response = resend.Emails.send(params)
-        logger.info(f"Release reminder sent to {to_email}, ID: {response.get('id')}")
-        return {"success": True, "email_id": response.get('id')}
 
-    except Exception as e:
-        logger.error(f"Failed to send release reminder: {str(e)}")
-        raise Exception(f"Failed to send email: {str(e)}")
-
-
-def send_payment_reminder(
+def build_payment_reminder(
     to_email: str,
     total_owing: float,
     order_count: int
 ) -> dict:
     """
-    Send a payment reminder email for outstanding balances
+    Build the params for a payment reminder email
     """
-    try:
-        params = {
-            "from": FROM_EMAIL,
-            "to": [to_email],
-            "subject": f"Payment Reminder: ${total_owing:.2f} owing on {order_count} order(s)",
-            "html": f"""
+    return {
+        "from": FROM_EMAIL,
+        "to": [to_email],
+        "subject": f"Payment Reminder: ${total_owing:.2f} owing on {order_count} order(s)",
+        "html": f"""
                 <h1>Payment Reminder</h1>
                 <p>You have outstanding balances on your orders.</p>
 
@@ -126,42 +142,64 @@ def send_payment_reminder(
                     <br>Manage your preferences in Settings.
                 </p>
             """
-        }
+    }
+
+
+def send_release_reminder(
+    to_email: str,
+    product_name: str,
+    store_name: str,
+    release_date: str,
+    days_until: int,
+    db: Optional[Session] = None
+) -> dict:
+    """
+    Send a release reminder email
+    """
+    try:
+        params = build_release_reminder(to_email, product_name, store_name, release_date, days_until)
 
-        response = resend.Emails.send(params)
-        logger.info(f"Payment reminder sent to {to_email}, ID: {response.get('id')}")
-        return {"success": True, "email_id": response.get('id')}
+        email_id = _enqueue(params, db)
+        logger.info(f"Release reminder queued for {to_email}, ID: {email_id}")
+        return {"success": True, "email_id": email_id}
 
     except Exception as e:
-        logger.error(f"Failed to send payment reminder: {str(e)}")
-        raise Exception(f"Failed to send email: {str(e)}")
+        logger.error(f"Failed to queue release reminder: {str(e)}")
+        raise Exception(f"Failed to queue email: {str(e)}")
 
 
-def send_weekly_digest(
+def send_payment_reminder(
     to_email: str,
-    total_orders: int,
-    pending_count: int,
-    delivered_count: int,
-    total_owing: float
+    total_owing: float,
+    order_count: int,
+    db: Optional[Session] = None
 ) -> dict:
     """
-    Send a weekly digest email
+    Send a payment reminder email for outstanding balances
     """
     try:
-        params = {
-            "from": FROM_EMAIL,
-            "to": [to_email],
-            "subject": "TCG Order Tracker - Weekly Digest",
-            "html": f"""
+        params = build_payment_reminder(to_email, total_owing, order_count)
+
+        email_id = _enqueue(params, db)
+        logger.info(f"Payment reminder queued for {to_email}, ID: {email_id}")
+        return {"success": True, "email_id": email_id}
+
+    except Exception as e:
+        logger.error(f"Failed to queue payment reminder: {str(e)}")
+        raise Exception(f"Failed to queue email: {str(e)}")
+
+
+# Digest templates are compiled once at import; rendering only substitutes values
+WEEKLY_DIGEST_TEMPLATE = Template("""
                 <h1>Your Weekly Order Digest</h1>
                 <p>Here's a summary of your orders this week:</p>
 
                 <div style="background-color: #f3f4f6; padding: 20px; border-radius: 8px; margin: 20px 0;">
                     <h2 style="margin-top: 0;">Summary</h2>
-                    <p><strong>Total Orders:</strong> {total_orders}</p>
-                    <p><strong>Pending:</strong> {pending_count}</p>
-                    <p><strong>Delivered:</strong> {delivered_count}</p>
-                    <p><strong>Total Owing:</strong> ${total_owing:.2f}</p>
+                    <p><strong>Total Orders:</strong> $total_orders</p>
+                    <p><strong>Pending:</strong> $pending_count</p>
+                    <p><strong>Delivered:</strong> $delivered_count</p>
+                    <p><strong>Total Owing:</strong> $$$total_owing</p>
                 </div>
 
                 <p>Log in to TCG Order Tracker to see more details.</p>
@@ -171,19 +209,54 @@ def send_weekly_digest(
                     You received this email because you have weekly digests enabled in TCG Order Tracker.
                     <br>Manage your preferences in Settings.
                 </p>
-            """
-        }
+            """)
 
-        response = resend.Emails.send(params)
-        logger.info(f"Weekly digest sent to {to_email}, ID: {response.get('id')}")
-        return {"success": True, "email_id": response.get('id')}
+MONTHLY_DIGEST_TEMPLATE = Template("""
+                <h1>Your Monthly Order Report</h1>
+                <p>Here's a summary of your order activity this month:</p>
 
-    except Exception as e:
-        logger.error(f"Failed to send weekly digest: {str(e)}")
-        raise Exception(f"Failed to send email: {str(e)}")
+                <div style="background-color: #f3f4f6; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <h2 style="margin-top: 0;">Monthly Summary</h2>
+                    <p><strong>Total Orders:</strong> $total_orders</p>
+                    <p><strong>Total Spent:</strong> $$$total_spent</p>
+                    <p><strong>Items Sold:</strong> $sold_count</p>
+                    <p><strong>Total Profit:</strong> <span style="color: $profit_color;">$$$total_profit</span></p>
+                </div>
 
+                <p>Log in to TCG Order Tracker to see detailed analytics and charts.</p>
 
-def send_monthly_digest(
+                <hr>
+                <p style="color: gray; font-size: 12px;">
+                    You received this email because you have monthly reports enabled in TCG Order Tracker.
+                    <br>Manage your preferences in Settings.
+                </p>
+            """)
+
+
+def build_weekly_digest(
+    to_email: str,
+    total_orders: int,
+    pending_count: int,
+    delivered_count: int,
+    total_owing: float
+) -> dict:
+    """
+    Build the params for a weekly digest email
+    """
+    return {
+        "from": FROM_EMAIL,
+        "to": [to_email],
+        "subject": "TCG Order Tracker - Weekly Digest",
+        "html": WEEKLY_DIGEST_TEMPLATE.substitute(
+            total_orders=total_orders,
+            pending_count=pending_count,
+            delivered_count=delivered_count,
+            total_owing=f"{total_owing:.2f}"
+        )
+    }
+
+
+def build_monthly_digest(
     to_email: str,
     total_orders: int,
     total_spent: float,
@@ -191,39 +264,63 @@ def send_monthly_digest(
     sold_count: int
 ) -> dict:
     """
-    Send a monthly digest email
+    Build the params for a monthly digest email
+    """
+    return {
+        "from": FROM_EMAIL,
+        "to": [to_email],
+        "subject": "TCG Order Tracker - Monthly Report",
+        "html": MONTHLY_DIGEST_TEMPLATE.substitute(
+            total_orders=total_orders,
+            total_spent=f"{total_spent:.2f}",
+            sold_count=sold_count,
+            total_profit=f"{total_profit:.2f}",
+            profit_color="green" if total_profit >= 0 else "red"
+        )
+    }
+
+
+def send_weekly_digest(
+    to_email: str,
+    total_orders: int,
+    pending_count: int,
+    delivered_count: int,
+    total_owing: float,
+    db: Optional[Session] = None
+) -> dict:
+    """
+    Send a weekly digest email
     """
     try:
-        params = {
-            "from": FROM_EMAIL,
-            "to": [to_email],
-            "subject": "TCG Order Tracker - Monthly Report",
-            "html": f"""
-                <h1>Your Monthly Order Report</h1>
-                <p>Here's a summary of your order activity this month:</p>
+        params = build_weekly_digest(to_email, total_orders, pending_count, delivered_count, total_owing)
 
-                <div style="background-color: #f3f4f6; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                    <h2 style="margin-top: 0;">Monthly Summary</h2>
-                    <p><strong>Total Orders:</strong> {total_orders}</p>
-                    <p><strong>Total Spent:</strong> ${total_spent:.2f}</p>
-                    <p><strong>Items Sold:</strong> {sold_count}</p>
-                    <p><strong>Total Profit:</strong> <span style="color: {'green' if total_profit >= 0 else 'red'};">${total_profit:.2f}</span></p>
-                </div>
+        email_id = _enqueue(params, db)
+        logger.info(f"Weekly digest queued for {to_email}, ID: {email_id}")
+        return {"success": True, "email_id": email_id}
 
-                <p>Log in to TCG Order Tracker to see detailed analytics and charts.</p>
+    except Exception as e:
+        logger.error(f"Failed to queue weekly digest: {str(e)}")
+        raise Exception(f"Failed to queue email: {str(e)}")
 
-                <hr>
-                <p style="color: gray; font-size: 12px;">
-                    You received this email because you have monthly reports enabled in TCG Order Tracker.
-                    <br>Manage your preferences in Settings.
-                </p>
-            """
-        }
 
-        response = resend.Emails.send(params)
-        logger.info(f"Monthly digest sent to {to_email}, ID: {response.get('id')}")
-        return {"success": True, "email_id": response.get('id')}
+def send_monthly_digest(
+    to_email: str,
+    total_orders: int,
+    total_spent: float,
+    total_profit: float,
+    sold_count: int,
+    db: Optional[Session] = None
+) -> dict:
+    """
+    Send a monthly digest email
+    """
+    try:
+        params = build_monthly_digest(to_email, total_orders, total_spent, total_profit, sold_count)
+
+        email_id = _enqueue(params, db)
+        logger.info(f"Monthly digest queued for {to_email}, ID: {email_id}")
+        return {"success": True, "email_id": email_id}
 
     except Exception as e:
-        logger.error(f"Failed to send monthly digest: {str(e)}")
-        raise Exception(f"Failed to send email: {str(e)}")
+        logger.error(f"Failed to queue monthly digest: {str(e)}")
+        raise Exception(f"Failed to queue email: {str(e)}")
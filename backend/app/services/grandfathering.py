@@ -0,0 +1,133 @@
+"""
+Chunked, resumable grandfathering job
+
+When subscriptions are enabled, every user created up to grandfather_date is
+marked as grandfathered. Users who sign up after that are not, even if the
+job is still running (or resumes later) when they do.
+
+The update runs in keyed chunks (ORDER BY id), each in its own short
+transaction, with progress stored in
+system_settings.extra_settings["grandfather_job"] so the job can resume after
+a restart. Each chunk holds the job's transaction-level advisory lock and
+continues from the stored progress (see app/utils/jobs.py), so chunks never
+run concurrently, even across workers.
+"""
+from sqlalchemy import select, update, func
+from sqlalchemy.engine import Connection
+from datetime import datetime, timezone
+from app.database import get_engine
+from app.models import User, SystemSettings
+from app.utils.jobs import get_job_state, record_job_failure, save_job_state, try_job_lock
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = "grandfather_job"
+DEFAULT_BATCH_SIZE = 1000
+
+
+def initial_job_state() -> dict:
+    """State stored when the job is queued"""
+    return {
+        "status": "pending",
+        "last_user_id": None,
+        "processed": 0,
+        "total": None,
+        "started_at": None,
+        "finished_at": None,
+        "error": None,
+    }
+
+
+def _run_chunk(conn: Connection, batch_size: int) -> Optional[dict]:
+    """
+    Grandfather the next chunk of users in one transaction, under the job
+    lock. Returns the saved state, or None if another worker holds the lock
+    or there is nothing to do.
+    """
+    if not try_job_lock(conn, JOB_KEY):
+        conn.rollback()
+        return None
+
+    row = conn.execute(
+        select(SystemSettings.grandfather_date, SystemSettings.extra_settings)
+        .where(SystemSettings.id == "global")
+    ).first()
+
+    state = get_job_state(row.extra_settings, JOB_KEY) if row else None
+    if not row or not row.grandfather_date or not state or state["status"] == "completed":
+        conn.rollback()
+        return None
+
+    cutoff = row.grandfather_date
+
+    if state["status"] != "running":
+        if state["total"] is None:
+            state["total"] = conn.execute(
+                select(func.count(User.id)).where(User.created_at <= cutoff)
+            ).scalar() or 0
+        state["status"] = "running"
+        state["started_at"] = state["started_at"] or datetime.now(timezone.utc).isoformat()
+        state["error"] = None
+        logger.info(f"Grandfather job running from user {state['last_user_id']} ({state['processed']}/{state['total']})")
+
+    # Next chunk of user ids after the last processed key
+    query = select(User.id).where(User.created_at <= cutoff).order_by(User.id).limit(batch_size)
+    if state["last_user_id"] is not None:
+        query = query.where(User.id > state["last_user_id"])
+    user_ids = conn.execute(query).scalars().all()
+
+    if user_ids:
+        conn.execute(
+            update(User.__table__)
+            .where(User.id.in_(user_ids), User.is_grandfathered == False)
+            .values(is_grandfathered=True)
+        )
+        state["last_user_id"] = user_ids[-1]
+        state["processed"] += len(user_ids)
+    else:
+        state["status"] = "completed"
+        state["finished_at"] = datetime.now(timezone.utc).isoformat()
+        logger.info(f"Grandfather job completed: {state['processed']} users grandfathered")
+
+    save_job_state(conn, JOB_KEY, state)
+    conn.commit()
+    return state
+
+
+def run_grandfather_job(batch_size: int = DEFAULT_BATCH_SIZE) -> Optional[dict]:
+    """
+    Run (or resume) the grandfathering job until completion.
+
+    Returns the last state this worker saved, or None if it ran no chunk
+    (nothing to do, or another worker is running the job).
+    """
+    state = None
+    with get_engine().connect() as conn:
+        try:
+            while state is None or state["status"] != "completed":
+                chunk_state = _run_chunk(conn, batch_size)
+                if chunk_state is None:
+                    if state is None:
+                        logger.info("Grandfather job has nothing to do or is running on another worker")
+                    break
+                state = chunk_state
+            return state
+
+        except Exception as e:
+            logger.error(f"Grandfather job failed: {str(e)}")
+            record_job_failure(conn, JOB_KEY, e)
+            raise
+
+
+def resume_grandfather_job() -> None:
+    """Resume a pending, running or failed job left over from a previous process"""
+    with get_engine().connect() as conn:
+        extra = conn.execute(
+            select(SystemSettings.extra_settings).where(SystemSettings.id == "global")
+        ).scalar()
+
+    state = get_job_state(extra, JOB_KEY)
+    if state and state["status"] in ("pending", "running", "failed"):
+        run_grandfather_job()
@@ -0,0 +1,110 @@
+"""
+Cross-worker cache invalidation bus (PostgreSQL LISTEN/NOTIFY)
+
+In-process caches (tier settings, known users) live in each worker. A write
+handled by one worker publishes a topic with NOTIFY on the
+cache_invalidation channel inside its transaction, so it is delivered at
+commit. Every worker, the publisher included, runs the
+handlers registered for that topic kind through its LISTEN connection
+(app/utils/pg_listener.py).
+
+Topics:
+- settings: system settings changed
+- user:<id>: a user was changed or deleted
+
+Handlers take the topic key (None for settings). After a listener reconnect
+they are called with None, meaning "drop everything", because topics
+published while the listener was down are lost.
+
+Analytics and store-list responses need no topic: their cache keys include
+the user's data_version, which is read from the database on every request.
+
+Caches use invalidation_ttl(): a long TTL while the listener is connected,
+and the short fallback TTL while it is not (or the bus is disabled).
+"""
+from sqlalchemy import text
+from app.database import get_settings
+from app.utils.metrics import register_collector
+from typing import Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache_invalidation"
+KINDS = ("settings", "user")
+
+_handlers: Dict[str, List[Callable[[Optional[str]], None]]] = {kind: [] for kind in KINDS}
+_listener = None
+_stats = {"published": 0, "received": 0, "flushes": 0}
+
+
+def on_invalidation(kind: str, handler: Callable[[Optional[str]], None]) -> None:
+    """Register handler(key) for a topic kind; key None means drop everything"""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown invalidation topic kind: {kind}")
+    _handlers[kind].append(handler)
+
+
+def publish_invalidation(db, *topics: str) -> None:
+    """
+    Publish topics in the caller's transaction (Session or Connection), in one
+    statement; they are delivered to every worker when the transaction commits
+    """
+    if not topics:
+        return
+    db.execute(
+        text("SELECT pg_notify(:channel, topic) FROM unnest(CAST(:topics AS text[])) AS topic"),
+        {"channel": CHANNEL, "topics": list(topics)}
+    )
+    _stats["published"] += len(topics)
+
+
+def dispatch_invalidation(topic: str) -> None:
+    """Run this worker's handlers for a topic"""
+    kind, _, key = topic.partition(":")
+    for handler in _handlers.get(kind, []):
+        try:
+            handler(key or None)
+        except Exception as e:
+            logger.error(f"Invalidation handler for {topic} failed: {str(e)}")
+
+
+def _on_notification(payload: str) -> None:
+    _stats["received"] += 1
+    dispatch_invalidation(payload)
+
+
+def _on_reconnect() -> None:
+    _stats["flushes"] += 1
+    for kind in KINDS:
+        dispatch_invalidation(kind)
+
+
+def attach_invalidation_bus(listener) -> None:
+    """Subscribe the bus to a PgListener (called once from the lifespan)"""
+    global _listener
+    _listener = listener
+    listener.subscribe(CHANNEL, _on_notification)
+    listener.on_reconnect(_on_reconnect)
+
+
+def bus_connected() -> bool:
+    return _listener is not None and _listener.connected
+
+
+def invalidation_ttl(fallback_seconds: float) -> float:
+    """TTL for an invalidated cache: long while the bus is connected, else the fallback"""
+    if bus_connected():
+        return get_settings().invalidation_cache_ttl_seconds
+    return fallback_seconds
+
+
+def invalidation_stats() -> dict:
+    return {
+        **_stats,
+        "connected": bus_connected(),
+        "handlers": {kind: len(handlers) for kind, handlers in _handlers.items()},
+    }
+
+
+register_collector("invalidation_bus", invalidation_stats)
@@ -0,0 +1,111 @@
+"""
+Order change feed for incremental client sync
+
+Every order insert and update takes the next value of order_change_seq
+(orders.change_seq) and every delete writes an order tombstone with the next
+value, both from triggers (see init_db.py), so bulk writes, restores and
+cascades are covered without application code. A client keeps the highest
+cursor it has seen and asks for everything after it.
+
+The triggers lock the user's row before taking a value, so one user's values
+are assigned in commit order and a change can never appear behind a cursor
+the client already holds.
+
+Tombstones are pruned after ORDER_TOMBSTONE_RETENTION_DAYS. The highest
+pruned value is kept in system_settings.extra_settings["order_changes"]; a
+cursor below it may have missed deletes, and the client must resync from 0.
+"""
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+from app.database import get_engine, get_settings
+from app.models import Order, OrderTombstone
+from app.utils.jobs import load_job_state, save_job_state, try_job_lock
+from typing import List, NamedTuple, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "order_changes"
+DEFAULT_LIMIT = 500
+
+
+class OrderChanges(NamedTuple):
+    orders: List[Order]
+    deleted: List[OrderTombstone]
+    cursor: int
+    has_more: bool
+    reset_required: bool
+
+
+def get_pruned_through(db: Session) -> int:
+    """Highest change_seq whose tombstone may have been pruned (0 if none)"""
+    return (load_job_state(db, STATE_KEY) or {}).get("pruned_through", 0)
+
+
+def changes_since(db: Session, user_id: str, since: int, limit: int = DEFAULT_LIMIT) -> OrderChanges:
+    """
+    The user's order upserts and deletions with change_seq > since, oldest
+    first, at most `limit` of them in total.
+    """
+    if since > 0 and since < get_pruned_through(db):
+        return OrderChanges([], [], since, False, True)
+
+    # Fetch one extra from each side: the merged first `limit` can't need more
+    orders = db.execute(
+        select(Order)
+        .where(Order.user_id == user_id, Order.change_seq > since)
+        .order_by(Order.change_seq)
+        .limit(limit + 1)
+    ).scalars().all()
+    tombstones = db.execute(
+        select(OrderTombstone)
+        .where(OrderTombstone.user_id == user_id, OrderTombstone.change_seq > since)
+        .order_by(OrderTombstone.change_seq)
+        .limit(limit + 1)
+    ).scalars().all()
+
+    merged = sorted([*orders, *tombstones], key=lambda change: change.change_seq)
+    page = merged[:limit]
+
+    return OrderChanges(
+        orders=[change for change in page if isinstance(change, Order)],
+        deleted=[change for change in page if isinstance(change, OrderTombstone)],
+        cursor=page[-1].change_seq if page else since,
+        has_more=len(merged) > limit,
+        reset_required=False
+    )
+
+
+def prune_tombstones(retention_days: Optional[int] = None) -> int:
+    """
+    Delete tombstones older than the retention window and advance the pruned
+    cursor. Returns the number deleted (0 if another worker is pruning).
+    """
+    if retention_days is None:
+        retention_days = get_settings().order_tombstone_retention_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+
+    with get_engine().connect() as conn:
+        if not try_job_lock(conn, STATE_KEY):
+            conn.rollback()
+            return 0
+
+        pruned = delete(OrderTombstone.__table__).where(
+            OrderTombstone.deleted_at < cutoff
+        ).returning(OrderTombstone.change_seq).cte("pruned")
+        count, pruned_through = conn.execute(
+            select(func.count(), func.max(pruned.c.change_seq))
+        ).one()
+
+        if count:
+            state = load_job_state(conn, STATE_KEY) or {}
+            save_job_state(conn, STATE_KEY, {
+                "pruned_through": max(state.get("pruned_through", 0), pruned_through),
+                "pruned_at": datetime.now(timezone.utc).isoformat(),
+            })
+        conn.commit()
+
+        if count:
+            logger.info(f"Pruned {count} order tombstones older than {retention_days} days")
+        return count
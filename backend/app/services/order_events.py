@@ -0,0 +1,126 @@
+"""
+Per-user push of order changes (server-sent events)
+
+Statement-level triggers on orders send NOTIFY order_changes with one compact
+payload per user and statement: {"user_id", "op": "upsert"|"delete", "count",
+"ids"} (ids omitted above 50), see init_db.py. NOTIFY is sent at commit, so
+every write path is covered (API routes, imports, restores, jobs, cascades)
+and rolled-back writes are never announced. Every worker receives every
+notification through its LISTEN connection (app/utils/pg_listener.py) and
+forwards it to the SSE streams its own clients hold for that user.
+
+Events sent to the client:
+- orders.changed: the notification payload; fetch /orders/changes to apply it
+- analytics.invalidated: analytics and statistics responses are stale
+- resync: events may have been missed (listener reconnected or the client
+  fell behind); refetch from the last cursor
+
+Comment lines are sent as heartbeats so proxies keep the stream open.
+"""
+from fastapi import Request
+from functools import lru_cache
+from app.database import get_settings
+from app.utils.metrics import register_collector
+from app.utils.pg_listener import get_pg_listener
+from typing import AsyncIterator, Dict, Set
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "order_changes"
+QUEUE_SIZE = 100
+
+RESYNC = {"event": "resync", "data": {}}
+
+
+class OrderEventHub:
+    """Fan-out of order notifications to this worker's SSE subscribers, by user"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._stats = {"notifications": 0, "delivered": 0, "overflows": 0}
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def _put(self, queue: asyncio.Queue, event: dict) -> None:
+        try:
+            queue.put_nowait(event)
+            self._stats["delivered"] += 1
+        except asyncio.QueueFull:
+            # Slow client: drop what it hasn't read and tell it to resync
+            self._stats["overflows"] += 1
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
+
+    def handle_notification(self, payload: str) -> None:
+        """pg_listener handler for the order_changes channel"""
+        self._stats["notifications"] += 1
+        change = json.loads(payload)
+        for queue in list(self._subscribers.get(change.get("user_id"), ())):
+            self._put(queue, {"event": "orders.changed", "data": change})
+
+    def handle_reconnect(self) -> None:
+        for queues in list(self._subscribers.values()):
+            for queue in list(queues):
+                self._put(queue, RESYNC)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "users": len(self._subscribers),
+            "streams": sum(len(queues) for queues in self._subscribers.values()),
+        }
+
+
+@lru_cache()
+def get_order_event_hub() -> OrderEventHub:
+    """Get the process-wide hub, subscribed to the order_changes channel"""
+    hub = OrderEventHub()
+    listener = get_pg_listener()
+    listener.subscribe(CHANNEL, hub.handle_notification)
+    listener.on_reconnect(hub.handle_reconnect)
+    register_collector("order_events", hub.stats)
+    return hub
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def stream_order_events(request: Request, user_id: str) -> AsyncIterator[str]:
+    """SSE body for one client: change events as they arrive, heartbeats in between"""
+    hub = get_order_event_hub()
+    heartbeat_seconds = get_settings().sse_heartbeat_seconds
+    queue = hub.subscribe(user_id)
+    try:
+        yield "retry: 5000\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+
+            # Send everything already queued, then one analytics invalidation for the lot
+            events = [event]
+            while not queue.empty():
+                events.append(queue.get_nowait())
+            for item in events:
+                yield format_sse(item["event"], item["data"])
+            if any(item["event"] == "orders.changed" for item in events):
+                yield format_sse("analytics.invalidated", {})
+    finally:
+        hub.unsubscribe(user_id, queue)
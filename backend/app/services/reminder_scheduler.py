@@ -0,0 +1,249 @@
+"""
+Release and payment reminder scheduler
+
+Finds due reminders for all users with set-based queries (orders joined to
+notification preferences), paged by key so memory stays bounded. Each page is
+claimed in sent_reminders with INSERT ... ON CONFLICT DO NOTHING RETURNING, so
+reminders already sent are skipped, and the claimed reminders are queued in
+the email outbox as one batch in the same transaction.
+
+Run as a separate process:
+    python -m app.services.reminder_scheduler            # loop forever
+    python -m app.services.reminder_scheduler --once     # single pass (cron)
+"""
+from sqlalchemy import select, func, literal, cast, Integer, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+from app.database import SessionLocal
+from app.models import User, Order, NotificationPreferences, SentReminder
+from app.services.email_outbox import enqueue_emails
+from app.services.email_service import build_release_reminder, build_payment_reminder
+from typing import Callable, List, NamedTuple, Optional
+import argparse
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+MAX_RELEASE_REMINDER_DAYS = 30  # Upper bound of NotificationPreferences.release_reminder_days
+
+
+class ReleaseReminder(NamedTuple):
+    order_id: str
+    user_id: str
+    email: str
+    product_name: str
+    store_name: str
+    release_date: date
+    days_until: int
+
+    @property
+    def dedupe_key(self) -> str:
+        return f"{self.order_id}:{self.release_date.isoformat()}"
+
+
+class PaymentReminder(NamedTuple):
+    user_id: str
+    email: str
+    total_owing: float
+    order_count: int
+    dedupe_key: str  # ISO week, so at most one payment reminder per week
+
+
+def claim_reminders(db: Session, kind: str, reminders: list) -> list:
+    """Record reminders as sent; returns only those not sent before (needs user_id and dedupe_key)"""
+    if not reminders:
+        return []
+
+    claimed = db.execute(
+        insert(SentReminder)
+        .values([
+            {"id": str(uuid.uuid4()), "user_id": r.user_id, "kind": kind, "dedupe_key": r.dedupe_key}
+            for r in reminders
+        ])
+        .on_conflict_do_nothing(constraint="uq_sent_reminders_user_kind_key")
+        .returning(SentReminder.user_id, SentReminder.dedupe_key)
+    ).all()
+
+    claimed_keys = {(row.user_id, row.dedupe_key) for row in claimed}
+    return [r for r in reminders if (r.user_id, r.dedupe_key) in claimed_keys]
+
+
+def find_release_reminders(
+    db: Session,
+    today: date,
+    after_order_id: Optional[str] = None,
+    limit: int = DEFAULT_BATCH_SIZE
+) -> List[ReleaseReminder]:
+    """
+    Pending orders releasing within each user's release_reminder_days window.
+
+    The global release_date range is served by ix_orders_release_date_pending;
+    users without a preferences row get the model defaults.
+    """
+    reminder_days = func.coalesce(NotificationPreferences.release_reminder_days, 7)
+    days_until = cast(Order.release_date - literal(today), Integer)
+
+    query = (
+        select(
+            Order.id,
+            Order.user_id,
+            User.email,
+            Order.product_name,
+            Order.store_name,
+            Order.release_date,
+            days_until.label("days_until")
+        )
+        .join(User, User.id == Order.user_id)
+        .outerjoin(NotificationPreferences, NotificationPreferences.user_id == Order.user_id)
+        .where(
+            Order.status == "Pending",
+            Order.release_date >= today,
+            Order.release_date <= today + timedelta(days=MAX_RELEASE_REMINDER_DAYS),
+            Order.release_date <= literal(today) + reminder_days,
+            func.coalesce(NotificationPreferences.release_reminders_enabled, true()),
+            ~select(SentReminder.id).where(
+                SentReminder.user_id == Order.user_id,
+                SentReminder.kind == "release",
+                SentReminder.dedupe_key == Order.id + ":" + func.to_char(Order.release_date, "YYYY-MM-DD")
+            ).exists()
+        )
+        .order_by(Order.id)
+        .limit(limit)
+    )
+    if after_order_id is not None:
+        query = query.where(Order.id > after_order_id)
+
+    return [ReleaseReminder(*row) for row in db.execute(query)]
+
+
+def find_payment_reminders(
+    db: Session,
+    today: date,
+    after_user_id: Optional[str] = None,
+    limit: int = DEFAULT_BATCH_SIZE
+) -> List[PaymentReminder]:
+    """Users whose SUM(amount_owing) meets their payment_threshold"""
+    iso_year, iso_week, _ = today.isocalendar()
+    week_key = f"{iso_year}-W{iso_week:02d}"
+    threshold = func.coalesce(NotificationPreferences.payment_threshold, 100)
+
+    query = (
+        select(
+            Order.user_id,
+            User.email,
+            func.sum(Order.amount_owing).label("total_owing"),
+            func.count(Order.id).label("order_count")
+        )
+        .join(User, User.id == Order.user_id)
+        .outerjoin(NotificationPreferences, NotificationPreferences.user_id == Order.user_id)
+        .where(
+            Order.amount_owing > 0,  # Served by the partial index ix_orders_user_owing
+            func.coalesce(NotificationPreferences.payment_reminders_enabled, true()),
+            ~select(SentReminder.id).where(
+                SentReminder.user_id == Order.user_id,
+                SentReminder.kind == "payment",
+                SentReminder.dedupe_key == week_key
+            ).exists()
+        )
+        .group_by(Order.user_id, User.email, threshold)
+        .having(func.sum(Order.amount_owing) >= threshold)
+        .order_by(Order.user_id)
+        .limit(limit)
+    )
+    if after_user_id is not None:
+        query = query.where(Order.user_id > after_user_id)
+
+    return [
+        PaymentReminder(row.user_id, row.email, float(row.total_owing), row.order_count, week_key)
+        for row in db.execute(query)
+    ]
+
+
+def deliver_release_reminders(db: Session, reminders: List[ReleaseReminder]) -> None:
+    """Default hand-off: queue the page in the email outbox with one INSERT (same transaction as the claims)"""
+    enqueue_emails(db, [
+        build_release_reminder(r.email, r.product_name, r.store_name, r.release_date.isoformat(), r.days_until)
+        for r in reminders
+    ])
+
+
+def deliver_payment_reminders(db: Session, reminders: List[PaymentReminder]) -> None:
+    """Default hand-off: queue the page in the email outbox with one INSERT (same transaction as the claims)"""
+    enqueue_emails(db, [build_payment_reminder(r.email, r.total_owing, r.order_count) for r in reminders])
+
+
+def run_reminders(
+    today: Optional[date] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    deliver_release: Callable[[Session, List[ReleaseReminder]], None] = deliver_release_reminders,
+    deliver_payment: Callable[[Session, List[PaymentReminder]], None] = deliver_payment_reminders
+) -> dict:
+    """
+    One pass over all users. Each page is claimed and handed off in its own
+    transaction; a failed hand-off rolls back its claims so the page is retried
+    on the next pass.
+    """
+    today = today or date.today()
+    counts = {"release": 0, "payment": 0}
+
+    db = SessionLocal()
+    try:
+        last_order_id = None
+        while True:
+            page = find_release_reminders(db, today, last_order_id, batch_size)
+            if not page:
+                break
+            last_order_id = page[-1].order_id
+
+            claimed = claim_reminders(db, "release", page)
+            deliver_release(db, claimed)
+            db.commit()
+            counts["release"] += len(claimed)
+
+        last_user_id = None
+        while True:
+            page = find_payment_reminders(db, today, last_user_id, batch_size)
+            if not page:
+                break
+            last_user_id = page[-1].user_id
+
+            claimed = claim_reminders(db, "payment", page)
+            deliver_payment(db, claimed)
+            db.commit()
+            counts["payment"] += len(claimed)
+
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    logger.info(f"Reminder pass for {today.isoformat()}: {counts['release']} release, {counts['payment']} payment")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send due release and payment reminders")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--interval", type=int, default=3600, help="Seconds between passes")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    while True:
+        try:
+            run_reminders(batch_size=args.batch_size)
+        except Exception as e:
+            logger.error(f"Reminder pass failed: {str(e)}")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
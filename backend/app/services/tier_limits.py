@@ -0,0 +1,129 @@
+"""
+Subscription tier order limits
+
+Limits come from SystemSettings and are cached in-process. Changes are
+pushed to every worker over the invalidation bus ("settings" topic), so the
+TTL is long while the bus is connected and short otherwise.
+Enforcement reads the user's maintained orders_count (see init_db.py) under a
+row lock, so the check is O(1) and concurrent creates for the same user are
+serialized until commit.
+
+Users created on or before grandfather_date are exempt. The grandfathering job
+(app/services/grandfathering.py) also sets users.is_grandfathered in the
+background, so the date is checked here as well: those users are exempt while
+the job is pending, running or failed.
+"""
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import User, SystemSettings
+from app.services.invalidation import invalidation_ttl, on_invalidation
+from datetime import datetime
+from typing import NamedTuple, Optional
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_TTL_SECONDS = 30  # Fallback while the invalidation bus is down
+
+
+class TierSettings(NamedTuple):
+    subscriptions_enabled: bool
+    free_tier_limit: Optional[int]
+    basic_tier_limit: Optional[int]
+    grandfather_date: Optional[datetime]
+
+
+_lock = threading.Lock()
+_cached: Optional[TierSettings] = None
+_expires_at = 0.0
+_generation = 0  # Bumped by every invalidation
+
+
+def get_tier_settings() -> TierSettings:
+    """Get tier limits from a short-lived in-process cache"""
+    global _cached, _expires_at
+
+    with _lock:
+        if _cached is not None and time.monotonic() < _expires_at:
+            return _cached
+        generation = _generation
+
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(
+                SystemSettings.subscriptions_enabled,
+                SystemSettings.free_tier_limit,
+                SystemSettings.basic_tier_limit,
+                SystemSettings.grandfather_date
+            ).where(SystemSettings.id == "global")
+        ).first()
+    finally:
+        db.close()
+
+    settings = TierSettings(*row) if row else TierSettings(False, None, None, None)
+
+    with _lock:
+        # An invalidation during the read means the row may predate the change
+        if generation == _generation:
+            _cached = settings
+            _expires_at = time.monotonic() + invalidation_ttl(SETTINGS_TTL_SECONDS)
+
+    return settings
+
+
+def invalidate_tier_settings() -> None:
+    """Drop the cached limits (call after updating system settings)"""
+    global _cached, _generation
+    with _lock:
+        _cached = None
+        _generation += 1
+
+
+on_invalidation("settings", lambda key: invalidate_tier_settings())
+
+
+def enforce_order_quota(db: Session, user_id: str, new_orders: int) -> None:
+    """
+    Raise 403 if creating new_orders would exceed the user's tier limit.
+
+    Must be called inside the transaction that creates the orders, before they
+    are flushed. Locks the user's row until commit.
+    """
+    tier_settings = get_tier_settings()
+    if not tier_settings.subscriptions_enabled or new_orders <= 0:
+        return
+
+    user = db.execute(
+        select(User.tier, User.is_grandfathered, User.created_at, User.orders_count)
+        .where(User.id == user_id)
+        .with_for_update()
+    ).first()
+
+    if not user or user.is_grandfathered:
+        return
+    if tier_settings.grandfather_date is not None and user.created_at <= tier_settings.grandfather_date:
+        return  # Not yet marked by the grandfathering job
+
+    if user.tier == "free":
+        limit = tier_settings.free_tier_limit
+    elif user.tier == "basic":
+        limit = tier_settings.basic_tier_limit
+    else:
+        limit = None  # Pro tier is always unlimited
+
+    if limit is None:
+        return
+
+    remaining = max(limit - user.orders_count, 0)
+    if new_orders > remaining:
+        logger.info(f"User {user_id} hit {user.tier} tier limit ({user.orders_count}/{limit}, requested {new_orders})")
+        raise HTTPException(
+            status_code=403,
+            detail=f"Order limit reached for the {user.tier} tier ({limit} orders). "
+                   f"You can add {remaining} more order(s); upgrade your plan to add more."
+        )
@@ -0,0 +1,119 @@
+"""
+Startup warmup
+
+Runs in the lifespan before the app starts serving, so the first requests on
+a fresh worker do not pay for:
+- opening pool connections (N connections are checked out at once, then returned)
+- fetching Clerk's signing keys (cached by the shared JWKS client)
+- compiling SQLAlchemy statements and building pydantic validators (the main
+  read endpoints are called in-process for a sentinel user with no data)
+
+Failures are logged and never block startup. /ready reports readiness once
+warmup has finished (and stops reporting it when shutdown begins).
+"""
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+from app.database import get_engine, get_settings
+from app.utils.auth import get_current_user_id, prefetch_signing_keys
+from sqlalchemy import text
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+WARMUP_USER_ID = "__warmup__"  # Never a Clerk id; has no rows
+
+# Representative read requests (list, filters, analytics)
+WARMUP_PATHS = [
+    "/api/v1/orders",
+    "/api/v1/orders?status=Pending&sort_by=release_date&sort_order=asc",
+    "/api/v1/orders?search=warmup&page=2",
+    "/api/v1/analytics/statistics",
+    "/api/v1/analytics/dashboard",
+    "/api/v1/analytics/spending-by-store",
+    "/api/v1/analytics/monthly-spending",
+    "/api/v1/analytics/timeseries?granularity=month",
+]
+
+warmup_state = {
+    "ready": False,
+    "steps": {},
+}
+
+
+def warm_pool(connections: int) -> int:
+    """Open up to `connections` pooled connections concurrently, then return them to the pool"""
+    engine = get_engine()
+    connections = min(connections, engine.pool.size())
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+async def warm_routes(app: FastAPI) -> int:
+    """
+    Call the read endpoints in-process as the sentinel user. Runs before the
+    server accepts traffic, so the temporary auth override is never visible
+    to real requests.
+    """
+    import httpx
+
+    previous = app.dependency_overrides.get(get_current_user_id)
+    app.dependency_overrides[get_current_user_id] = lambda: WARMUP_USER_ID
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://warmup") as client:
+            for path in WARMUP_PATHS:
+                response = await client.get(path)
+                if response.status_code >= 500:
+                    logger.warning(f"Warmup request {path} returned {response.status_code}")
+    finally:
+        if previous is None:
+            app.dependency_overrides.pop(get_current_user_id, None)
+        else:
+            app.dependency_overrides[get_current_user_id] = previous
+    return len(WARMUP_PATHS)
+
+
+async def _step(name: str, coro) -> None:
+    started = time.perf_counter()
+    try:
+        result = await coro
+        warmup_state["steps"][name] = {"ms": round((time.perf_counter() - started) * 1000, 1), "result": result}
+    except Exception as e:
+        logger.warning(f"Warmup step {name} failed: {str(e)}")
+        warmup_state["steps"][name] = {"error": str(e)}
+
+
+async def run_warmup(app: FastAPI) -> None:
+    """Run all warmup steps (bounded by WARMUP_TIMEOUT_SECONDS), then mark the app ready"""
+    settings = get_settings()
+
+    if settings.warmup_enabled:
+        started = time.perf_counter()
+
+        async def steps():
+            await _step("pool", run_in_threadpool(warm_pool, settings.warmup_pool_connections))
+            if settings.clerk_publishable_key:
+                await _step("jwks", run_in_threadpool(prefetch_signing_keys))
+            await _step("routes", warm_routes(app))
+
+        try:
+            await asyncio.wait_for(steps(), timeout=settings.warmup_timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.warning(f"Warmup timed out after {settings.warmup_timeout_seconds}s")
+        logger.info(f"Warmup finished in {(time.perf_counter() - started) * 1000:.0f} ms: {warmup_state['steps']}")
+
+    warmup_state["ready"] = True
+
+
+def mark_not_ready() -> None:
+    """Stop reporting readiness (called when shutdown begins)"""
+    warmup_state["ready"] = False
@@ -0,0 +1,245 @@
+"""
+Webhook event ingestion and worker
+
+The webhook route only records the raw event (keyed by the provider's
+delivery id, so retried deliveries are dropped) and acknowledges. This worker
+applies pending events in arrival order. Consecutive events of the same kind
+are applied together: a run of user.created/user.updated events becomes one
+INSERT ... ON CONFLICT DO UPDATE (last event per user wins), and a run of
+user.deleted events becomes one chunked delete.
+
+Deleting a user cascades to all of their orders, so orders are deleted first
+in chunks, each in its own short transaction, before the user rows.
+
+Every transaction of the worker holds its transaction-level advisory lock
+(see app/utils/jobs.py). A run that spans several transactions re-checks
+that its events are still pending after each commit, so events are applied
+in order even with workers in several processes. When a run fails, its
+events are applied one at a time and only the failing event is charged an
+attempt; it is retried on later passes and marked failed after MAX_ATTEMPTS
+so the queue keeps moving.
+"""
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from itertools import groupby
+from app.database import get_engine
+from app.models import User, Order, WebhookEvent
+from app.services.clerk_client import primary_email
+from app.services.invalidation import publish_invalidation
+from app.utils.auth import forget_known_user
+from app.utils.jobs import try_job_lock
+from typing import Callable, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "webhook_events"
+DEFAULT_BATCH_SIZE = 200
+ORDER_DELETE_CHUNK_SIZE = 1000
+MAX_ATTEMPTS = 5
+
+UPSERT_EVENTS = {"user.created", "user.updated"}
+DELETE_EVENTS = {"user.deleted"}
+
+events = WebhookEvent.__table__
+users = User.__table__
+orders = Order.__table__
+
+
+def record_event(db: Session, source: str, delivery_id: str, event_type: str, payload: dict) -> bool:
+    """Persist a delivery in the caller's transaction; returns False for a duplicate"""
+    inserted = db.execute(
+        insert(WebhookEvent)
+        .values(source=source, delivery_id=delivery_id, event_type=event_type, payload=payload)
+        .on_conflict_do_nothing(index_elements=[WebhookEvent.delivery_id])
+        .returning(WebhookEvent.id)
+    ).first()
+    return inserted is not None
+
+
+def _kind(event_type: str) -> str:
+    if event_type in UPSERT_EVENTS:
+        return "upsert"
+    if event_type in DELETE_EVENTS:
+        return "delete"
+    return "ignore"
+
+
+def apply_user_upserts(conn: Connection, payloads: List[dict]) -> None:
+    """Create or update users from a run of user.created/user.updated payloads"""
+    latest = {}
+    for data in payloads:
+        if data.get("id") and primary_email(data):
+            latest[data["id"]] = {
+                "id": data["id"],
+                "email": primary_email(data),
+                "first_name": data.get("first_name"),
+                "last_name": data.get("last_name"),
+            }
+    if not latest:
+        return
+
+    statement = insert(users).values([
+        {**profile, "tier": "free", "is_grandfathered": False, "is_admin": False}
+        for profile in latest.values()
+    ])
+    conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[users.c.id],
+            set_={
+                "email": statement.excluded.email,
+                "first_name": statement.excluded.first_name,
+                "last_name": statement.excluded.last_name,
+                "updated_at": func.now(),
+            }
+        )
+    )
+
+
+class RunTakenOver(Exception):
+    """Another worker applied (or is applying) the run; stop without touching it"""
+
+
+def delete_users_chunked(
+    conn: Connection,
+    user_ids: List[str],
+    chunk_size: int = ORDER_DELETE_CHUNK_SIZE,
+    begin: Callable[[], None] = lambda: None
+) -> None:
+    """
+    Delete users and their orders. Orders go first in chunks, each committed on
+    its own, so no single transaction holds locks on a large cascade. `begin`
+    is called at the start of every transaction after a commit; it may raise
+    to stop. The caller commits the final transaction.
+    """
+    while True:
+        chunk = select(orders.c.id).where(orders.c.user_id.in_(user_ids)).limit(chunk_size)
+        deleted = conn.execute(delete(orders).where(orders.c.id.in_(chunk.scalar_subquery()))).rowcount
+        conn.commit()
+        begin()
+        if deleted < chunk_size:
+            break
+
+    conn.execute(delete(users).where(users.c.id.in_(user_ids)))
+    # Other workers forget the ids when this transaction commits
+    publish_invalidation(conn, *(f"user:{user_id}" for user_id in user_ids))
+    for user_id in user_ids:
+        forget_known_user(user_id)
+
+
+def _begin_run(conn: Connection, event_ids: List[int]) -> None:
+    """
+    Start another transaction of a run: take the worker lock and check that
+    the run's events are all still pending
+    """
+    if try_job_lock(conn, JOB_NAME):
+        pending = conn.execute(
+            select(func.count()).where(events.c.id.in_(event_ids), events.c.status == "pending")
+        ).scalar()
+        if pending == len(event_ids):
+            return
+    conn.rollback()
+    raise RunTakenOver()
+
+
+def _apply_run(conn: Connection, kind: str, run: list) -> None:
+    if kind == "upsert":
+        apply_user_upserts(conn, [event.payload.get("data") or {} for event in run])
+    elif kind == "delete":
+        user_ids = list({(event.payload.get("data") or {}).get("id") for event in run} - {None})
+        if user_ids:
+            event_ids = [event.id for event in run]
+            delete_users_chunked(conn, user_ids, begin=lambda: _begin_run(conn, event_ids))
+
+
+def _mark(conn: Connection, event_ids: List[int], **values) -> None:
+    conn.execute(update(events).where(events.c.id.in_(event_ids)).values(**values))
+    conn.commit()
+
+
+def _record_failure(conn: Connection, event, error: Exception) -> None:
+    """Charge a failed event one attempt; it is marked failed after MAX_ATTEMPTS"""
+    attempts = event.attempts + 1
+    logger.error(f"Applying webhook event {event.id} failed (attempt {attempts}): {str(error)}")
+    if try_job_lock(conn, JOB_NAME):
+        _mark(
+            conn, [event.id],
+            attempts=attempts,
+            last_error=str(error)[:1000],
+            status="failed" if attempts >= MAX_ATTEMPTS else "pending"
+        )
+    else:
+        conn.rollback()
+
+
+def _apply_one_at_a_time(conn: Connection, kind: str, run: list) -> int:
+    """
+    Apply a failed run's events in order, each in its own transaction, and
+    charge the first one that fails. Returns the number applied; fewer than
+    len(run) means the worker must stop so later events wait for the failed one.
+    """
+    for applied, event in enumerate(run):
+        try:
+            _begin_run(conn, [event.id])
+            _apply_run(conn, kind, [event])
+            _mark(conn, [event.id], status="processed", processed_at=datetime.now(timezone.utc))
+        except RunTakenOver:
+            return applied
+        except Exception as e:
+            conn.rollback()
+            _record_failure(conn, event, e)
+            return applied
+    return len(run)
+
+
+def process_pending_events(batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Apply pending events in order until the queue is empty or an event fails.
+    Returns the number of events processed.
+
+    Each run of same-kind events is read and applied under the worker's
+    transaction-level lock and marked processed in the same transaction.
+    """
+    processed = 0
+
+    with get_engine().connect() as conn:
+        while True:
+            if not try_job_lock(conn, JOB_NAME):
+                conn.rollback()
+                return processed
+
+            pending = conn.execute(
+                select(events.c.id, events.c.event_type, events.c.payload, events.c.attempts)
+                .where(events.c.status == "pending")
+                .order_by(events.c.id)
+                .limit(batch_size)
+            ).all()
+            if not pending:
+                conn.rollback()
+                return processed
+
+            # The first run of consecutive same-kind events
+            kind, group = next(groupby(pending, key=lambda event: _kind(event.event_type)))
+            run = list(group)
+            event_ids = [event.id for event in run]
+            try:
+                _apply_run(conn, kind, run)
+                _mark(conn, event_ids, status="processed", processed_at=datetime.now(timezone.utc))
+            except RunTakenOver:
+                return processed
+            except Exception as e:
+                conn.rollback()
+                if len(run) == 1:
+                    _record_failure(conn, run[0], e)
+                    return processed
+                # One bad event must not use up the attempts of the whole run
+                logger.warning(f"Applying {len(run)} webhook events together failed, applying one at a time: {str(e)}")
+                applied = _apply_one_at_a_time(conn, kind, run)
+                processed += applied
+                if applied < len(run):
+                    return processed
+                continue
+            processed += len(run)
@@ -3,17 +3,71 @@ Authentication utilities - Clerk JWT verification
 """
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-import jwt
-from jwt import PyJWKClient
 from app.database import get_settings, get_db
 from app.models.user import User
-import requests
+from app.services.cache import MemoryCacheBackend
+from app.services.clerk_client import ClerkError, ClerkUnavailableError, get_clerk_client, primary_email
+from app.services.invalidation import invalidation_ttl, on_invalidation
+from app.utils.metrics import register_collector
+from app.utils.singleflight import SingleFlight
+from functools import lru_cache
+from typing import Optional
+import base64
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
-settings = get_settings()
+
+# Coalesces concurrent Clerk syncs for the same user id
+_user_sync_flights = SingleFlight()
+
+# User ids recently confirmed to exist in the database
+_known_users = MemoryCacheBackend(max_entries=100000)
+_known_user_hits = 0
+_known_user_misses = 0
+_known_user_generation = 0  # Bumped by every invalidation
+_known_user_lock = threading.Lock()
+
+
+def _known_user_stats() -> dict:
+    return {
+        "size": _known_users.size(),
+        "hits": _known_user_hits,
+        "misses": _known_user_misses,
+        "user_sync": _user_sync_flights.stats(),
+    }
+
+
+register_collector("known_users", _known_user_stats)
+
+
+def _jwks_url() -> str:
+    """Clerk's JWKS (JSON Web Key Set) URL, derived from the publishable key"""
+    # Format: pk_test_<base64_encoded_domain>
+    encoded_domain = get_settings().clerk_publishable_key.split("_")[2]
+    clerk_domain = base64.b64decode(encoded_domain + "==").decode("utf-8").rstrip("$")
+    return f"https://{clerk_domain}/.well-known/jwks.json"
+
+
+@lru_cache()
+def get_jwks_client():
+    """
+    Get the process-wide JWKS client. It caches the fetched key set, so signing
+    keys are only re-downloaded when they expire or an unknown kid appears.
+    """
+    from jwt import PyJWKClient
+
+    jwks_url = _jwks_url()
+    logger.info(f"Using JWKS URL: {jwks_url}")
+    return PyJWKClient(jwks_url, cache_keys=True)
+
+
+def prefetch_signing_keys() -> int:
+    """Fetch and cache Clerk's signing keys ahead of the first request; returns the key count"""
+    return len(get_jwks_client().get_signing_keys())
 
 
 def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
@@ -23,21 +77,13 @@ def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(sec
     Usage in route:
         user_id: str = Depends(get_current_user_id)
     """
+    import jwt  # Deferred: loads cryptography; only needed once a request arrives
+
     try:
         token = credentials.credentials
 
-        # Get Clerk's JWKS (JSON Web Key Set) URL
-        # Extract domain from base64-encoded publishable key
-        import base64
-        # Format: pk_test_<base64_encoded_domain>
-        encoded_domain = settings.clerk_publishable_key.split("_")[2]
-        clerk_domain = base64.b64decode(encoded_domain + "==").decode("utf-8").rstrip("$")
-        jwks_url = f"https://{clerk_domain}/.well-known/jwks.json"
-
-        logger.info(f"Using JWKS URL: {jwks_url}")
-
         # Verify and decode the JWT
-        jwks_client = PyJWKClient(jwks_url)
+        jwks_client = get_jwks_client()
         signing_key = jwks_client.get_signing_key_from_jwt(token)
 
         decoded = jwt.decode(
@@ -68,9 +114,71 @@ def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(sec
         raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
 
 
-def get_current_user(
+def forget_known_user(user_id: Optional[str]) -> None:
+    """
+    Drop a user id from the known-user cache (call when the user is deleted);
+    None drops every id
+    """
+    global _known_user_generation
+    with _known_user_lock:
+        # Checks already in flight may have read the deleted row; they must not cache it
+        _known_user_generation += 1
+    if user_id is None:
+        _known_users.clear()
+    else:
+        _known_users.delete(user_id)
+
+
+# Deletions on any worker publish user:<id>; None (after a bus reconnect) drops every id
+on_invalidation("user", forget_known_user)
+
+
+def ensure_user(user_id: str, db: Session) -> None:
+    """
+    Make sure the user has a row in the database, syncing it from Clerk on
+    first login. Recently seen ids are served from the known-user cache
+    without a query.
+    """
+    global _known_user_hits, _known_user_misses
+
+    if _known_users.get(user_id) is True:
+        _known_user_hits += 1
+        return
+    _known_user_misses += 1
+    generation = _known_user_generation
+
+    if db.query(User.id).filter(User.id == user_id).first() is None:
+        # End the read transaction so the pooled connection is not held
+        # during the Clerk call
+        db.rollback()
+
+        logger.info(f"User {user_id} not in database - syncing from Clerk...")
+        # Concurrent first-login requests share one Clerk call
+        clerk_user = _user_sync_flights.do(user_id, lambda: _fetch_clerk_user(user_id))
+        _create_user(db, user_id, clerk_user)
+
+    with _known_user_lock:
+        if generation == _known_user_generation:
+            _known_users.set(user_id, True, invalidation_ttl(get_settings().known_user_ttl_seconds))
+
+
+def get_synced_user_id(
     user_id: str = Depends(get_current_user_id),
     db: Session = Depends(get_db)
+) -> str:
+    """
+    Get the current user ID, creating the user from Clerk if they don't exist yet.
+
+    Usage in route:
+        user_id: str = Depends(get_synced_user_id)
+    """
+    ensure_user(user_id, db)
+    return user_id
+
+
+def get_current_user(
+    user_id: str = Depends(get_synced_user_id),
+    db: Session = Depends(get_db)
 ) -> User:
     """
     Get current user and auto-create if they don't exist in database yet.
@@ -80,59 +188,46 @@ def get_current_user(
     Usage in route:
         current_user: User = Depends(get_current_user)
     """
-    # Check if user exists in database
-    user = db.query(User).filter(User.id == user_id).first()
+    return db.query(User).filter(User.id == user_id).first()
 
-    if user:
-        logger.info(f"Found existing user: {user.email}")
-        return user
-
-    # User doesn't exist - fetch from Clerk and create
-    logger.info(f"User {user_id} not in database - syncing from Clerk...")
 
+def _fetch_clerk_user(user_id: str) -> dict:
+    """Fetch a user from the Clerk API"""
     try:
-        # Fetch user data from Clerk API
-        clerk_api_url = f"https://api.clerk.com/v1/users/{user_id}"
-        headers = {
-            "Authorization": f"Bearer {settings.clerk_secret_key}",
-            "Content-Type": "application/json"
-        }
-
-        response = requests.get(clerk_api_url, headers=headers)
-        response.raise_for_status()
-        clerk_user = response.json()
-
-        # Extract user data
-        email_addresses = clerk_user.get("email_addresses", [])
-        primary_email = next(
-            (e["email_address"] for e in email_addresses if e.get("id") == clerk_user.get("primary_email_address_id")),
-            email_addresses[0]["email_address"] if email_addresses else None
-        )
-
-        # Create user in database
-        new_user = User(
-            id=user_id,
-            email=primary_email,
-            first_name=clerk_user.get("first_name"),
-            last_name=clerk_user.get("last_name"),
-            tier="free",
-            is_grandfathered=False,
-            is_admin=False
+        return get_clerk_client().get_user(user_id)
+    except ClerkUnavailableError as e:
+        logger.error(f"Clerk API unavailable: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="User sync is temporarily unavailable. Please try again shortly."
         )
-
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-
-        logger.info(f"✅ Auto-created user from Clerk: {new_user.email}")
-        return new_user
-
-    except requests.RequestException as e:
+    except ClerkError as e:
         logger.error(f"Failed to fetch user from Clerk API: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail="Failed to sync user from Clerk. Please try again."
         )
+
+
+def _create_user(db: Session, user_id: str, clerk_user: dict) -> None:
+    """Insert the user (a no-op if a concurrent request created it first)"""
+    try:
+        db.execute(
+            insert(User)
+            .values(
+                id=user_id,
+                email=primary_email(clerk_user),
+                first_name=clerk_user.get("first_name"),
+                last_name=clerk_user.get("last_name"),
+                tier="free",
+                is_grandfathered=False,
+                is_admin=False
+            )
+            .on_conflict_do_nothing(index_elements=[User.id])
+        )
+        db.commit()
+        logger.info(f"✅ Auto-created user from Clerk: {user_id}")
+
     except Exception as e:
         logger.error(f"Failed to create user: {str(e)}")
         db.rollback()
@@ -0,0 +1,68 @@
+"""
+Background task helpers for work started from the FastAPI lifespan
+
+Sync job functions run in the threadpool so they never block the event loop.
+Long-running async work (e.g. the LISTEN connection) runs on the loop itself.
+"""
+from starlette.concurrency import run_in_threadpool
+from typing import Awaitable, Callable, List
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_tasks: List[asyncio.Task] = []
+
+
+async def _run_periodically(name: str, interval_seconds: float, fn: Callable[[], None]):
+    while True:
+        try:
+            await run_in_threadpool(fn)
+        except Exception as e:
+            logger.error(f"Background task {name} failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+
+def start_periodic_task(name: str, interval_seconds: float, fn: Callable[[], None]) -> asyncio.Task:
+    """Run fn now and then every interval_seconds until shutdown"""
+    task = asyncio.create_task(_run_periodically(name, interval_seconds, fn), name=name)
+    _tasks.append(task)
+    logger.info(f"Started background task {name} (every {interval_seconds}s)")
+    return task
+
+
+def start_background_task(name: str, fn: Callable[[], None]) -> asyncio.Task:
+    """Run fn once in the threadpool without blocking startup"""
+    async def _run():
+        try:
+            await run_in_threadpool(fn)
+        except Exception as e:
+            logger.error(f"Background task {name} failed: {str(e)}")
+
+    task = asyncio.create_task(_run(), name=name)
+    _tasks.append(task)
+    return task
+
+
+def start_async_task(name: str, fn: Callable[[], Awaitable[None]]) -> asyncio.Task:
+    """Run the coroutine function fn on the event loop until it returns or shutdown"""
+    async def _run():
+        try:
+            await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Background task {name} failed: {str(e)}")
+
+    task = asyncio.create_task(_run(), name=name)
+    _tasks.append(task)
+    logger.info(f"Started background task {name}")
+    return task
+
+
+async def stop_background_tasks():
+    """Cancel every task started through this module (called on shutdown)"""
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
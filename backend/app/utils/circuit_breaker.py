@@ -0,0 +1,81 @@
+"""
+Circuit breaker for calls to external services
+
+After failure_threshold consecutive failures the circuit opens and calls fail
+fast with CircuitOpenError for reset_timeout seconds. Then a single trial call
+is let through (half-open): success closes the circuit, failure reopens it.
+"""
+from typing import Any, Callable, Tuple, Type
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the service while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Thread-safe consecutive-failure circuit breaker"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        failure_exceptions: Tuple[Type[BaseException], ...] = (Exception,)
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_exceptions = failure_exceptions
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def _before_call(self) -> None:
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._trial_in_flight):
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            if state == "half_open":
+                self._trial_in_flight = True
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        self._before_call()
+        try:
+            result = fn()
+        except self.failure_exceptions:
+            with self._lock:
+                self._trial_in_flight = False
+                self.failures += 1
+                if self.failures >= self.failure_threshold or self.opened_at is not None:
+                    self.opened_at = time.monotonic()
+            raise
+        except BaseException:
+            with self._lock:
+                self._trial_in_flight = False
+            raise
+
+        with self._lock:
+            self._trial_in_flight = False
+            self.failures = 0
+            self.opened_at = None
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,103 @@
+"""
+Per-user data versioning and conditional GET (ETag / 304) support
+
+Every write to a user's orders bumps users.data_version inside the same
+transaction. Read endpoints derive their ETag from that version plus the
+request path and query parameters, so an unchanged response can be answered
+with 304 Not Modified after a single primary-key lookup.
+"""
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import select, update, text
+from sqlalchemy.sql import Executable
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models.user import User
+from app.utils.auth import get_current_user_id
+from app.utils.replica import mark_user_write
+from typing import Optional
+import hashlib
+
+
+def bump_data_version(db: Session, user_id: str) -> None:
+    """
+    Increment the user's data version in the current transaction.
+
+    Must be called by every code path that writes to the user's orders.
+    Raw SQL is used so users.updated_at (onupdate) is left untouched.
+    """
+    db.execute(
+        text("UPDATE users SET data_version = data_version + 1 WHERE id = :user_id"),
+        {"user_id": user_id}
+    )
+    mark_user_write(user_id)
+
+
+def with_data_version_bump(statement: Executable, user_id: str) -> Executable:
+    """
+    Attach the data version bump to a write statement as a data-modifying CTE
+    (WITH ... UPDATE users ...), so the write and the bump are one round-trip.
+    The bump is part of the statement: roll back if the write matched nothing.
+    """
+    users = User.__table__
+    bump = update(users).where(users.c.id == user_id).values(
+        data_version=users.c.data_version + 1,
+        updated_at=users.c.updated_at  # Leave updated_at untouched (skips onupdate)
+    ).cte("data_version_bump")
+    mark_user_write(user_id)
+    return statement.add_cte(bump)
+
+
+def get_data_version(db: Session, user_id: str) -> int:
+    """Get the current data version for a user (0 if the user row doesn't exist yet)"""
+    version = db.execute(select(User.data_version).where(User.id == user_id)).scalar()
+    return version or 0
+
+
+def compute_etag(user_id: str, version: int, request: Request) -> str:
+    """Build an ETag from the user's data version, the route and its normalized query parameters"""
+    # Sort by key only: repeated keys (e.g. ?dimensions=a&dimensions=b) keep their order
+    params = sorted(request.query_params.multi_items(), key=lambda item: item[0])
+    raw = f"{user_id}|{version}|{request.url.path}|{params}"
+    return f'W/"{hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+
+    def _opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    candidates = [_opaque(tag) for tag in if_none_match.split(",")]
+    return "*" in candidates or _opaque(etag) in candidates
+
+
+def conditional_get(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+) -> int:
+    """
+    Dependency for idempotent GET endpoints.
+
+    Raises a 304 Not Modified if the client's If-None-Match matches the current
+    ETag, otherwise sets the ETag header on the response and returns the
+    user's data version.
+
+    Usage in route:
+        data_version: int = Depends(conditional_get)
+    """
+    version = get_data_version(db, user_id)
+    # End the read so the primary connection isn't held while a replica session serves the route
+    db.rollback()
+    etag = compute_etag(user_id, version, request)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return version
@@ -0,0 +1,83 @@
+"""
+Background job coordination: advisory locks and persisted job state
+
+Jobs run as a series of short transactions (chunks). Each chunk starts by
+taking the job's transaction-level advisory lock (pg_try_advisory_xact_lock),
+which PostgreSQL releases at commit or rollback. Session-level locks are not
+safe behind a transaction-mode pooler (Supabase port 6543): the lock stays on
+a server connection that is handed to other clients, and the unlock may run
+on a different one.
+
+The lock only covers one transaction, so another worker may run a chunk
+between two of ours. A chunk must therefore load the job's state after taking
+the lock instead of carrying it over in memory.
+
+Job state lives in system_settings.extra_settings[<job key>].
+"""
+from sqlalchemy import select, update, func, cast
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Connection
+from app.models import SystemSettings
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary, unique per job
+ADVISORY_LOCK_IDS = {
+    "grandfather_job": 7_301_001,
+    "clerk_reconcile_job": 7_301_002,
+    "webhook_events": 7_301_003,
+    "order_changes": 7_301_004,
+}
+
+system_settings = SystemSettings.__table__
+
+
+def try_job_lock(conn: Connection, job: str) -> bool:
+    """Take the job's lock for the current transaction; False if another worker holds it"""
+    return bool(conn.execute(select(func.pg_try_advisory_xact_lock(ADVISORY_LOCK_IDS[job]))).scalar())
+
+
+def get_job_state(extra_settings: Optional[dict], key: str) -> Optional[dict]:
+    """Extract a job's state from SystemSettings.extra_settings"""
+    return (extra_settings or {}).get(key)
+
+
+def load_job_state(conn, key: str) -> Optional[dict]:
+    """Read a job's state in the current transaction (Session or Connection)"""
+    extra = conn.execute(
+        select(system_settings.c.extra_settings).where(system_settings.c.id == "global")
+    ).scalar()
+    return get_job_state(extra, key)
+
+
+def save_job_state(conn, key: str, state: dict) -> None:
+    """
+    Store a job's state in the current transaction (the caller commits).
+    Only this key is replaced, so jobs saving concurrently don't overwrite
+    each other.
+    """
+    conn.execute(
+        update(system_settings)
+        .where(system_settings.c.id == "global")
+        .values(extra_settings=func.coalesce(system_settings.c.extra_settings, cast({}, JSONB)).op("||")(
+            cast({key: state}, JSONB)
+        ))
+    )
+
+
+def record_job_failure(conn: Connection, key: str, error: Exception) -> None:
+    """Roll back the failed chunk and mark the job failed (best effort)"""
+    conn.rollback()
+    try:
+        if try_job_lock(conn, key):
+            state = load_job_state(conn, key)
+            if state:
+                state["status"] = "failed"
+                state["error"] = str(error)
+                save_job_state(conn, key, state)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Failed to record failure of job {key}: {str(e)}")
@@ -0,0 +1,29 @@
+"""
+In-process metrics registry
+
+Components register a collector callable returning a dict of numbers; the
+admin metrics endpoint calls every collector and returns the combined result.
+"""
+from typing import Callable, Dict
+import logging
+
+logger = logging.getLogger(__name__)
+
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register_collector(name: str, collector: Callable[[], dict]) -> None:
+    """Register (or replace) a named metrics collector"""
+    _collectors[name] = collector
+
+
+def collect_metrics() -> dict:
+    """Run every registered collector and return their results keyed by name"""
+    results = {}
+    for name, collector in _collectors.items():
+        try:
+            results[name] = collector()
+        except Exception as e:
+            logger.error(f"Metrics collector {name} failed: {str(e)}")
+            results[name] = {"error": str(e)}
+    return results
@@ -0,0 +1,127 @@
+"""
+Hot order read queries, built as lambda statements
+
+The order list and statistics endpoints accept up to eight optional filters.
+Building a fresh Query per request costs a statement construction and a
+cache-key computation every time, and literal values baked into the
+statement keep SQLAlchemy's compiled cache from hitting.
+
+Here every filter is a fixed lambda appended to a lambda_stmt. SQLAlchemy
+analyses each lambda once (per code location), turns its closure variables
+into bound parameters, and keys the compiled cache on which lambdas were
+appended. Each filter combination compiles once per process; after that only
+the bound values change. The hit rate is reported by the "statement_cache"
+metric (app/utils/statement_cache.py).
+"""
+from sqlalchemy import select, func, lambda_stmt
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+from app.models import Order
+from typing import Optional
+
+SORT_FIELDS = {
+    "created_at": Order.created_at,
+    "order_date": Order.order_date,
+    "release_date": Order.release_date,
+    "product_name": Order.product_name,
+    "store_name": Order.store_name,
+    "quantity": Order.quantity,
+    "cost_per_item": Order.cost_per_item,
+    "total_cost": Order.total_cost,
+    "amount_paid": Order.amount_paid,
+    "amount_owing": Order.amount_owing,
+    "status": Order.status,
+}
+
+
+def with_order_filters(
+    stmt: StatementLambdaElement,
+    user_id: str,
+    status: Optional[str] = None,
+    store: Optional[str] = None,
+    search: Optional[str] = None,
+    order_date_from: Optional[str] = None,
+    order_date_to: Optional[str] = None,
+    release_date_from: Optional[str] = None,
+    release_date_to: Optional[str] = None,
+    amount_owing_only: Optional[bool] = None,
+    store_exact: bool = False
+) -> StatementLambdaElement:
+    """
+    Append the order filters that are set. The list endpoint matches store as
+    a substring; statistics matches it exactly (store_exact=True).
+    """
+    # CRITICAL: Filter by user_id for row-level security
+    stmt += lambda s: s.where(Order.user_id == user_id)
+
+    if status:
+        stmt += lambda s: s.where(Order.status == status)
+
+    if store and store_exact:
+        stmt += lambda s: s.where(Order.store_name == store)
+    elif store:
+        store_pattern = f"%{store}%"
+        stmt += lambda s: s.where(Order.store_name.ilike(store_pattern))
+
+    if search:
+        search_pattern = f"%{search}%"
+        stmt += lambda s: s.where(
+            (Order.product_name.ilike(search_pattern)) |
+            (Order.store_name.ilike(search_pattern)) |
+            (Order.notes.ilike(search_pattern))
+        )
+
+    if order_date_from:
+        stmt += lambda s: s.where(Order.order_date >= order_date_from)
+    if order_date_to:
+        stmt += lambda s: s.where(Order.order_date <= order_date_to)
+    if release_date_from:
+        stmt += lambda s: s.where(Order.release_date >= release_date_from)
+    if release_date_to:
+        stmt += lambda s: s.where(Order.release_date <= release_date_to)
+
+    if amount_owing_only:
+        stmt += lambda s: s.where(Order.amount_owing > 0)
+
+    return stmt
+
+
+def order_count_statement(user_id: str, **filters) -> StatementLambdaElement:
+    """COUNT(*) of the user's orders matching the list filters"""
+    stmt = lambda_stmt(lambda: select(func.count()).select_from(Order))
+    return with_order_filters(stmt, user_id, **filters)
+
+
+def order_page_statement(
+    user_id: str,
+    sort_by: Optional[str],
+    sort_order: Optional[str],
+    offset: int,
+    limit: int,
+    **filters
+) -> StatementLambdaElement:
+    """One sorted page of the user's orders matching the list filters"""
+    stmt = with_order_filters(lambda_stmt(lambda: select(Order)), user_id, **filters)
+
+    sort_field = SORT_FIELDS.get(sort_by, Order.created_at)
+    if sort_order == "asc":
+        stmt += lambda s: s.order_by(sort_field.asc())
+    else:
+        stmt += lambda s: s.order_by(sort_field.desc())
+
+    stmt += lambda s: s.offset(offset).limit(limit)
+    return stmt
+
+
+def order_statistics_statement(user_id: str, **filters) -> StatementLambdaElement:
+    """Counts and totals for /statistics in one aggregate row"""
+    stmt = lambda_stmt(lambda: select(
+        func.count().label('total_orders'),
+        func.count().filter(Order.status == "Pending").label('pending_count'),
+        func.count().filter(Order.status == "Delivered").label('delivered_count'),
+        func.count().filter(Order.status == "Sold").label('sold_count'),
+        func.sum(Order.total_cost).label('total_cost'),
+        func.sum(Order.amount_owing).label('amount_owing'),
+        func.sum(Order.profit).filter(Order.status == "Sold").label('total_profit'),
+        func.avg(Order.profit_margin).filter(Order.status == "Sold").label('average_profit_margin')
+    ))
+    return with_order_filters(stmt, user_id, store_exact=True, **filters)
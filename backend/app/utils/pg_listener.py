@@ -0,0 +1,193 @@
+"""
+PostgreSQL LISTEN/NOTIFY listener for the event loop
+
+One dedicated connection per process LISTENs on every subscribed channel.
+Its socket is watched with loop.add_reader, so no thread is blocked waiting.
+Connecting and LISTEN run in worker threads; handlers run on the event loop
+and must not block.
+
+NOTIFY is delivered only when the sending transaction commits, and only to
+listeners connected at that moment. When the connection drops the listener
+reconnects with backoff and calls the reconnect handlers, because anything
+sent while it was down is lost and subscribers must resync.
+
+LISTEN needs a session: it does not work through a transaction-mode pooler
+(Supabase port 6543). DATABASE_LISTEN_URL should point at the direct or
+session-mode connection; it defaults to DATABASE_URL. Requires psycopg2.
+"""
+from app.database import get_settings
+from app.utils.metrics import register_collector
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_RECONNECT_SECONDS = 60
+
+# TCP keepalives make a dead peer surface as a socket error (and a reconnect)
+# within about a minute instead of the listener waiting silently forever
+KEEPALIVE_OPTIONS = {"keepalives": 1, "keepalives_idle": 30, "keepalives_interval": 10, "keepalives_count": 3}
+
+
+class PgListener:
+    """Reconnecting LISTEN connection dispatching notifications to handlers by channel"""
+
+    def __init__(self, dsn: str, reconnect_seconds: float = 1.0):
+        self.dsn = dsn
+        self.reconnect_seconds = reconnect_seconds
+        self._handlers: Dict[str, List[Callable[[str], None]]] = {}
+        self._reconnect_handlers: List[Callable[[], None]] = []
+        self._conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connected_at: Optional[float] = None
+        self._stats = {"connects": 0, "failures": 0, "received": 0, "handler_errors": 0}
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None and self._connected_at is not None
+
+    def subscribe(self, channel: str, handler: Callable[[str], None]) -> None:
+        """Call handler(payload) for every notification on channel"""
+        new_channel = channel not in self._handlers
+        self._handlers.setdefault(channel, []).append(handler)
+        if new_channel and self._conn is not None:
+            self._listen_later(self._conn, [channel])
+
+    def on_reconnect(self, handler: Callable[[], None]) -> None:
+        """Call handler() after a reconnect (notifications may have been missed)"""
+        self._reconnect_handlers.append(handler)
+
+    @staticmethod
+    def _listen(conn, channels: List[str]) -> None:
+        with conn.cursor() as cursor:
+            for channel in channels:
+                cursor.execute(f'LISTEN "{channel}"')
+
+    def _listen_later(self, conn, channels: List[str]) -> None:
+        """
+        LISTEN on an already open connection from a worker thread, so the
+        round trip never blocks the loop. Callable from any thread. If it
+        fails the connection is broken; the reader sees that and reconnects,
+        which LISTENs on every channel again.
+        """
+        def log_failure(future):
+            if not future.cancelled() and future.exception() is not None:
+                logger.warning(f"LISTEN {', '.join(channels)} failed: {str(future.exception())}")
+
+        future = asyncio.run_coroutine_threadsafe(asyncio.to_thread(self._listen, conn, channels), self._loop)
+        future.add_done_callback(log_failure)
+
+    def _connect(self, channels: List[str]):
+        """Open the connection and LISTEN on channels (blocking; run in a thread)"""
+        import psycopg2
+        from sqlalchemy.engine import make_url
+
+        url = make_url(self.dsn).set(drivername="postgresql")
+        conn = psycopg2.connect(url.render_as_string(hide_password=False), **KEEPALIVE_OPTIONS)
+        try:
+            conn.autocommit = True
+            self._listen(conn, channels)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _dispatch(self) -> None:
+        self._conn.poll()
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            self._stats["received"] += 1
+            for handler in self._handlers.get(notify.channel, []):
+                try:
+                    handler(notify.payload)
+                except Exception as e:
+                    self._stats["handler_errors"] += 1
+                    logger.error(f"Handler for {notify.channel} failed: {str(e)}")
+
+    async def _listen_until_closed(self) -> None:
+        loop = asyncio.get_running_loop()
+        closed = loop.create_future()
+
+        def on_readable():
+            try:
+                self._dispatch()
+            except Exception as e:
+                if not closed.done():
+                    closed.set_exception(e)
+
+        loop.add_reader(self._conn.fileno(), on_readable)
+        try:
+            await closed
+        finally:
+            loop.remove_reader(self._conn.fileno())
+
+    async def run(self) -> None:
+        """Listen until cancelled, reconnecting with exponential backoff"""
+        self._loop = asyncio.get_running_loop()
+        delay = self.reconnect_seconds
+        first = True
+        while True:
+            try:
+                channels = list(self._handlers)
+                self._conn = await asyncio.to_thread(self._connect, channels)
+                # Channels subscribed while the connection was being opened
+                added = [channel for channel in self._handlers if channel not in channels]
+                if added:
+                    self._listen_later(self._conn, added)
+                self._stats["connects"] += 1
+                self._connected_at = time.monotonic()
+                delay = self.reconnect_seconds
+                logger.info(f"Listening on {', '.join(self._handlers) or 'no channels'}")
+
+                if not first:
+                    for handler in self._reconnect_handlers:
+                        try:
+                            handler()
+                        except Exception as e:
+                            logger.error(f"Reconnect handler failed: {str(e)}")
+                first = False
+
+                await self._listen_until_closed()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["failures"] += 1
+                logger.warning(f"LISTEN connection lost: {str(e)}; reconnecting in {delay:.0f}s")
+            finally:
+                self._close()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_SECONDS)
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+        self._connected_at = None
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "connected": self.connected,
+            "connected_seconds": round(time.monotonic() - self._connected_at, 1) if self._connected_at else None,
+            "channels": sorted(self._handlers),
+        }
+
+
+@lru_cache()
+def get_pg_listener() -> PgListener:
+    """Get the process-wide listener (run it with start_async_task in the lifespan)"""
+    settings = get_settings()
+    listener = PgListener(
+        settings.database_listen_url or settings.database_url,
+        reconnect_seconds=settings.listener_reconnect_seconds
+    )
+    register_collector("pg_listener", listener.stats)
+    return listener
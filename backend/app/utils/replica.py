@@ -0,0 +1,140 @@
+"""
+Read-replica routing for read-only endpoints
+
+Read routes take their session from get_read_db, which returns a replica
+session when DATABASE_REPLICA_URL is configured and the replica is usable.
+Otherwise it returns the request's primary session.
+
+Read-your-writes: every order write marks the user (see bump_data_version).
+For READ_YOUR_WRITES_SECONDS after that, the user's reads stay on the
+primary. Marks are kept in Redis under their own key prefix (apart from the
+result cache, so clearing it keeps them) and must be visible to
+every worker before the write commits, otherwise another worker could read
+the lagging replica and cache (or 304-pin) stale rows under the new
+data_version. The replica is therefore only used with CACHE_BACKEND=redis;
+with the in-process memory backend every read goes to the primary.
+
+Replica lag is sampled periodically and exposed as the "replica" metric.
+While lag is unknown or exceeds the read-your-writes window, all reads go to
+the primary.
+"""
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from functools import lru_cache
+from app.database import get_db, get_replica_engine, get_replica_sessionmaker, get_settings
+from app.services.cache import RedisCacheBackend
+from app.utils.auth import get_current_user_id
+from app.utils.metrics import register_collector
+from typing import Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+_lag_seconds: Optional[float] = None
+_lag_checked_at: Optional[float] = None
+_reads = {"replica": 0, "primary": 0, "primary_after_write": 0}
+
+
+@lru_cache()
+def get_write_marks() -> RedisCacheBackend:
+    """Get the shared store for read-your-writes marks (CACHE_BACKEND=redis only)"""
+    return RedisCacheBackend(get_settings().cache_redis_url, prefix="recent_write:")
+
+
+def mark_user_write(user_id: str) -> None:
+    """Keep the user's reads on the primary for the read-your-writes window"""
+    if get_replica_engine() is None or not marks_shared():
+        return
+    try:
+        get_write_marks().set(user_id, 1, get_settings().read_your_writes_seconds)
+    except Exception as e:
+        logger.error(f"Failed to record write for {user_id}: {str(e)}")
+
+
+def _wrote_recently(user_id: str) -> bool:
+    try:
+        return get_write_marks().get(user_id) == 1
+    except Exception:
+        return True  # Unknown: stay on the primary
+
+
+def measure_replica_lag() -> Optional[float]:
+    """Sample replication lag in seconds (0 when the replica has replayed everything it received)"""
+    global _lag_seconds, _lag_checked_at
+
+    replica = get_replica_engine()
+    if replica is None:
+        return None
+
+    try:
+        with replica.connect() as conn:
+            lag = conn.execute(text("""
+                SELECT CASE
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END
+            """)).scalar()
+        _lag_seconds = float(lag)
+    except Exception as e:
+        logger.error(f"Replica lag check failed: {str(e)}")
+        _lag_seconds = None
+    _lag_checked_at = time.monotonic()
+    return _lag_seconds
+
+
+def marks_shared() -> bool:
+    """True if read-your-writes marks are visible to every worker"""
+    return get_settings().cache_backend == "redis"
+
+
+def replica_usable() -> bool:
+    """True if reads can be served by the replica at all"""
+    return (
+        get_replica_engine() is not None
+        and marks_shared()
+        and _lag_seconds is not None
+        and _lag_seconds <= get_settings().read_your_writes_seconds
+    )
+
+
+def get_read_db(
+    user_id: str = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Dependency to get a session for read-only endpoints
+
+    Usage in FastAPI routes: db: Session = Depends(get_read_db)
+    """
+    if not replica_usable():
+        _reads["primary"] += 1
+        yield db
+        return
+
+    if _wrote_recently(user_id):
+        _reads["primary_after_write"] += 1
+        yield db
+        return
+
+    _reads["replica"] += 1
+    replica_db = get_replica_sessionmaker()()
+    try:
+        yield replica_db
+    finally:
+        replica_db.close()
+
+
+def replica_stats() -> dict:
+    return {
+        "configured": get_replica_engine() is not None,
+        "marks_shared": marks_shared(),
+        "usable": replica_usable(),
+        "lag_seconds": _lag_seconds,
+        "lag_checked_seconds_ago": round(time.monotonic() - _lag_checked_at, 1) if _lag_checked_at else None,
+        "reads": dict(_reads),
+    }
+
+
+register_collector("replica", replica_stats)
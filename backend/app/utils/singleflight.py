@@ -0,0 +1,98 @@
+"""
+Single-flight request coalescing
+
+Concurrent callers asking for the same key share one in-flight computation:
+the first caller (the leader) runs it, the others block until it finishes and
+receive the same result or exception. Nothing is retained after completion,
+so this only deduplicates work that overlaps in time.
+"""
+from functools import wraps
+from app.utils.metrics import register_collector
+from typing import Any, Callable, Dict, Hashable
+import hashlib
+import json
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls by key (thread-safe; routes run in the threadpool)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            with self._lock:
+                self.shared += 1
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                self.executed += 1
+            call.done.set()
+
+    def stats(self) -> dict:
+        total = self.executed + self.shared
+        return {
+            "executed": self.executed,
+            "shared": self.shared,
+            "in_flight": len(self._calls),
+            "shared_rate": round(self.shared / total, 4) if total else 0.0,
+        }
+
+
+# Shared by idempotent GET endpoints
+request_flights = SingleFlight()
+register_collector("request_coalescing", request_flights.stats)
+
+
+def request_key(route: str, user_id: str, params: dict) -> str:
+    """Build a coalescing key from (user, route, normalized params)"""
+    normalized = json.dumps(params, sort_keys=True, default=str)
+    return f"{user_id}:{route}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]}"
+
+
+def coalesced(route: str):
+    """
+    Decorator for idempotent GET endpoints: concurrent identical requests
+    from the same user share one execution.
+
+    The decorated route must take a `user_id` keyword argument; `db` is
+    excluded from the key. The return value is shared between callers, so it
+    must not be tied to the leader's session (return pydantic models).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            params = {k: v for k, v in kwargs.items() if k not in ("user_id", "db")}
+            key = request_key(route, kwargs["user_id"], params)
+            return request_flights.do(key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
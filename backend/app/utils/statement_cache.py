@@ -0,0 +1,53 @@
+"""
+SQLAlchemy compiled-statement cache metrics
+
+SQLAlchemy caches the compiled form of each statement per engine, keyed by
+the statement's structure (bound values are not part of the key). Every
+execution reports whether it hit that cache; this module counts the outcomes
+per engine and exposes them as the "statement_cache" metric.
+
+A low hit rate means statements are being built with literal values or with
+a shape that changes per request, or that the cache is too small for the
+number of distinct statements (DATABASE_QUERY_CACHE_SIZE).
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
+from app.utils.metrics import register_collector
+from typing import Dict
+
+_engines: Dict[str, Engine] = {}
+_counts: Dict[str, Dict[str, int]] = {}
+
+
+def track_statement_cache(engine: Engine, name: str) -> None:
+    """Count compiled-cache hits and misses for every statement executed on `engine`"""
+    counts = _counts.setdefault(name, {"hit": 0, "miss": 0, "uncached": 0})
+    _engines[name] = engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        cache_hit = getattr(context, "cache_hit", None)
+        if cache_hit is CacheStats.CACHE_HIT:
+            counts["hit"] += 1
+        elif cache_hit is CacheStats.CACHE_MISS:
+            counts["miss"] += 1
+        else:
+            counts["uncached"] += 1  # Raw SQL, DDL, caching disabled
+
+
+def statement_cache_stats() -> dict:
+    stats = {}
+    for name, counts in _counts.items():
+        cacheable = counts["hit"] + counts["miss"]
+        compiled_cache = _engines[name]._compiled_cache
+        stats[name] = {
+            **counts,
+            "hit_rate": round(counts["hit"] / cacheable, 4) if cacheable else None,
+            "entries": len(compiled_cache) if compiled_cache is not None else 0,
+            "capacity": compiled_cache.capacity if compiled_cache is not None else 0,
+        }
+    return stats
+
+
+register_collector("statement_cache", statement_cache_stats)
@@ -1,18 +1,24 @@
 """
 Initialize database with schema including PostgreSQL GENERATED columns
 """
-from app.database import engine, Base
+from app.database import get_engine, Base
 from app.models import User, Order
 from sqlalchemy import text
 
 
 def init_db():
     """Create all tables and add computed columns"""
+    engine = get_engine()
     print("Creating database tables...")
 
     # Drop all tables (careful in production!)
     Base.metadata.drop_all(bind=engine)
 
+    # Extensions required by indexes declared on the models
+    with engine.connect() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+        conn.commit()
+
     # Create all tables
     Base.metadata.create_all(bind=engine)
 
@@ -72,9 +78,131 @@ def init_db():
         conn.execute(text("""
             CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at DESC);
         """))
+        # Reminder scheduler: users with balances owing
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_orders_user_owing ON orders(user_id) WHERE amount_owing > 0;
+        """))
         conn.commit()
 
     print("✅ Indexes created")
+
+    # Maintain denormalized per-user order counters and the order change feed.
+    # The tables were just recreated empty, so the counters start out correct.
+    print("Creating triggers...")
+    with engine.connect() as conn:
+        conn.execute(text("""
+            CREATE OR REPLACE FUNCTION orders_maintain_user_counters() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    UPDATE users
+                    SET orders_count = orders_count - 1,
+                        orders_total_value = orders_total_value - COALESCE(OLD.total_cost, 0)
+                    WHERE id = OLD.user_id;
+                END IF;
+                IF TG_OP IN ('UPDATE', 'INSERT') THEN
+                    UPDATE users
+                    SET orders_count = orders_count + 1,
+                        orders_total_value = orders_total_value + COALESCE(NEW.total_cost, 0)
+                    WHERE id = NEW.user_id;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+
+        conn.execute(text("DROP TRIGGER IF EXISTS orders_user_counters ON orders;"))
+        conn.execute(text("DROP TRIGGER IF EXISTS orders_user_counters_update ON orders;"))
+
+        # Updates only touch the counters when the owner or total changes
+        conn.execute(text("""
+            CREATE TRIGGER orders_user_counters
+            AFTER INSERT OR DELETE ON orders
+            FOR EACH ROW EXECUTE FUNCTION orders_maintain_user_counters();
+        """))
+        conn.execute(text("""
+            CREATE TRIGGER orders_user_counters_update
+            AFTER UPDATE ON orders
+            FOR EACH ROW
+            WHEN (OLD.user_id IS DISTINCT FROM NEW.user_id OR OLD.total_cost IS DISTINCT FROM NEW.total_cost)
+            EXECUTE FUNCTION orders_maintain_user_counters();
+        """))
+
+        # Order change feed: every insert/update takes the next change_seq and every
+        # delete leaves a tombstone. The user's row is locked first so a user's
+        # change_seq values are assigned in commit order, and a client holding a
+        # cursor never misses a change that commits late.
+        conn.execute(text("""
+            CREATE OR REPLACE FUNCTION orders_assign_change_seq() RETURNS trigger AS $$
+            BEGIN
+                PERFORM 1 FROM users WHERE id = NEW.user_id FOR NO KEY UPDATE;
+                NEW.change_seq := nextval('order_change_seq');
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+        conn.execute(text("""
+            CREATE OR REPLACE FUNCTION orders_record_tombstone() RETURNS trigger AS $$
+            BEGIN
+                PERFORM 1 FROM users WHERE id = OLD.user_id FOR NO KEY UPDATE;
+                INSERT INTO order_tombstones (change_seq, order_id, user_id)
+                VALUES (nextval('order_change_seq'), OLD.id, OLD.user_id);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+
+        conn.execute(text("DROP TRIGGER IF EXISTS orders_change_seq ON orders;"))
+        conn.execute(text("DROP TRIGGER IF EXISTS orders_tombstone ON orders;"))
+
+        conn.execute(text("""
+            CREATE TRIGGER orders_change_seq
+            BEFORE INSERT OR UPDATE ON orders
+            FOR EACH ROW EXECUTE FUNCTION orders_assign_change_seq();
+        """))
+        # Row triggers also fire for ON DELETE CASCADE from users
+        conn.execute(text("""
+            CREATE TRIGGER orders_tombstone
+            AFTER DELETE ON orders
+            FOR EACH ROW EXECUTE FUNCTION orders_record_tombstone();
+        """))
+
+        # Push: one NOTIFY order_changes per user and statement, delivered at commit
+        # (see app/services/order_events.py). Transition tables are only allowed on
+        # single-event triggers, so each event gets its own trigger.
+        conn.execute(text("""
+            CREATE OR REPLACE FUNCTION orders_notify_changes() RETURNS trigger AS $$
+            DECLARE
+                changed record;
+            BEGIN
+                FOR changed IN
+                    SELECT user_id, COUNT(*) AS count, array_agg(id) AS ids
+                    FROM changed_rows
+                    GROUP BY user_id
+                LOOP
+                    PERFORM pg_notify('order_changes', json_build_object(
+                        'user_id', changed.user_id,
+                        'op', CASE WHEN TG_OP = 'DELETE' THEN 'delete' ELSE 'upsert' END,
+                        'count', changed.count,
+                        'ids', CASE WHEN changed.count <= 50 THEN to_json(changed.ids) END
+                    )::text);
+                END LOOP;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+
+        for event, transition in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS orders_notify_{event.lower()} ON orders;"))
+            conn.execute(text(f"""
+                CREATE TRIGGER orders_notify_{event.lower()}
+                AFTER {event} ON orders
+                REFERENCING {transition} TABLE AS changed_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION orders_notify_changes();
+            """))
+
+        conn.commit()
+
+    print("✅ Triggers created")
     print("\n🎉 Database initialization complete!")
     print(f"Database: {engine.url}")
 
@@ -0,0 +1,156 @@
+"""
+Local stand-ins for external services, injected in place of real clients
+"""
+from fnmatch import fnmatch
+from app.services.email_outbox import LocalTransport
+
+
+class FakeClock:
+    """Replacement for time.monotonic that only moves when told to"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    sleep = advance  # Stands in for time.sleep, so waiting moves the clock
+
+
+class FakeRedis:
+    """The subset of the redis-py client used by RedisCacheBackend, with server-side TTL"""
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self._data = {}
+
+    def _live(self) -> dict:
+        self._data = {k: v for k, v in self._data.items() if v[0] > self.clock()}
+        return self._data
+
+    def get(self, key):
+        entry = self._live().get(key)
+        return entry[1].encode("utf-8") if entry else None
+
+    def setex(self, key, ttl, value):
+        self._data[key] = (self.clock() + ttl, value)
+
+    def scan_iter(self, match="*"):
+        return iter([key for key in self._live() if fnmatch(key, match)])
+
+    def delete(self, *keys):
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def dbsize(self):
+        return len(self._live())
+
+
+class FakeClerk:
+    """
+    Local Clerk Backend API stand-in, served through httpx.MockTransport.
+    Set `status` to make every request fail with that status code.
+    """
+
+    def __init__(self, users=(), delay: float = 0.0):
+        self.users = {user["id"]: user for user in users}
+        self.delay = delay
+        self.status = None
+        self.requests = []
+
+    def handler(self, request):
+        import httpx
+        import time
+
+        self.requests.append(request)
+        if self.delay:
+            time.sleep(self.delay)
+        if self.status is not None:
+            return httpx.Response(self.status, json={"errors": []})
+
+        path = request.url.path
+        if path.startswith("/v1/users/"):
+            user = self.users.get(path.rsplit("/", 1)[1])
+            return httpx.Response(200, json=user) if user else httpx.Response(404, json={"errors": []})
+        if path == "/v1/users":
+            params = request.url.params
+            ordered = sorted(self.users.values(), key=lambda u: u["created_at"])
+            if "user_id" in params:
+                wanted = set(params.get_list("user_id"))
+                ordered = [u for u in ordered if u["id"] in wanted]
+            offset, limit = int(params.get("offset", 0)), int(params.get("limit", 10))
+            return httpx.Response(200, json=ordered[offset:offset + limit])
+        return httpx.Response(404, json={"errors": []})
+
+    def client(self, **kwargs):
+        """A ClerkClient wired to this stand-in"""
+        import httpx
+        from app.services.clerk_client import ClerkClient
+
+        return ClerkClient(
+            "sk_test", base_url="https://clerk.test/v1", transport=httpx.MockTransport(self.handler), **kwargs
+        )
+
+
+def clerk_user(user_id: str, email: str, created_at: int = 0, first_name=None, last_name=None) -> dict:
+    """A user object shaped like Clerk's"""
+    return {
+        "id": user_id,
+        "created_at": created_at,
+        "first_name": first_name,
+        "last_name": last_name,
+        "primary_email_address_id": f"idn_{user_id}",
+        "email_addresses": [{"id": f"idn_{user_id}", "email_address": email}],
+    }
+
+
+class FakeSession:
+    """
+    The slice of a SQLAlchemy Session used by ensure_user: looks user ids up
+    in `existing` and records inserted ones there
+    """
+
+    def __init__(self, existing: set):
+        self.existing = existing
+        self.queries = 0
+        self.commits = 0
+
+    def query(self, *entities):
+        return self
+
+    def filter(self, criterion):
+        self._user_id = criterion.right.value
+        return self
+
+    def first(self):
+        self.queries += 1
+        return (self._user_id,) if self._user_id in self.existing else None
+
+    def execute(self, statement):
+        from sqlalchemy.dialects import postgresql
+
+        self.existing.add(statement.compile(dialect=postgresql.dialect()).params["id"])
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+class FlakyTransport(LocalTransport):
+    """LocalTransport that fails every request containing a message to one of the `failing` addresses"""
+
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.batches = []
+
+    def send_batch(self, messages):
+        self.batches.append([m.to_email for m in messages])
+        bad = [m.to_email for m in messages if m.to_email in self.failing]
+        if bad:
+            raise RuntimeError(f"Rejected {', '.join(bad)}")
+        return super().send_batch(messages)
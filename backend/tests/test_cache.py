@@ -0,0 +1,134 @@
+"""
+Result cache backends: TTL, LRU eviction and prefix deletion
+"""
+from app.services import cache
+from app.services.cache import MemoryCacheBackend, RedisCacheBackend, ResultCache, _MISSING
+from tests.fakes import FakeClock, FakeRedis
+import pytest
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request, clock):
+    if request.param == "memory":
+        return MemoryCacheBackend(max_entries=100)
+    return RedisCacheBackend(client=FakeRedis(clock))
+
+
+def test_backend_must_implement_interface():
+    with pytest.raises(TypeError):
+        cache.CacheBackend()
+
+
+def test_get_returns_stored_value(backend):
+    backend.set("u1:v1:stats:abc", {"total": 3}, ttl=60)
+
+    assert backend.get("u1:v1:stats:abc") == {"total": 3}
+    assert backend.get("u1:v1:stats:other") is _MISSING
+
+
+def test_entries_expire_after_ttl(backend, clock):
+    backend.set("key", [1, 2], ttl=60)
+
+    clock.advance(59)
+    assert backend.get("key") == [1, 2]
+
+    clock.advance(2)
+    assert backend.get("key") is _MISSING
+    assert backend.size() == 0
+
+
+def test_delete_prefix_only_drops_matching_keys(backend):
+    backend.set("u1:v1:a", 1, ttl=60)
+    backend.set("u1:v2:b", 2, ttl=60)
+    backend.set("u10:v1:a", 3, ttl=60)
+    backend.set("u2:v1:a", 4, ttl=60)
+
+    backend.delete_prefix("u1:")
+
+    assert backend.get("u1:v1:a") is _MISSING
+    assert backend.get("u1:v2:b") is _MISSING
+    assert backend.get("u10:v1:a") == 3
+    assert backend.get("u2:v1:a") == 4
+
+
+def test_delete_drops_exactly_one_key(backend):
+    backend.set("u1", True, ttl=60)
+    backend.set("u10", True, ttl=60)
+
+    backend.delete("u1")
+    backend.delete("missing")
+
+    assert backend.get("u1") is _MISSING
+    assert backend.get("u10") is True
+
+
+def test_clear_drops_everything(backend):
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+
+    backend.clear()
+
+    assert backend.size() == 0
+
+
+def test_redis_backend_only_touches_its_own_keys(clock):
+    client = FakeRedis(clock)
+    client.setex("replica:mark:u1", 60, "1")
+    ours = RedisCacheBackend(client=client, prefix="result_cache:")
+    other = RedisCacheBackend(client=client, prefix="known_users:")
+    ours.set("u1", 1, ttl=60)
+    other.set("u1", 2, ttl=60)
+
+    ours.clear()
+
+    assert ours.get("u1") is _MISSING
+    assert other.get("u1") == 2
+    assert client.get("replica:mark:u1") is not None
+    assert (ours.size(), other.size()) == (0, 1)
+
+
+def test_memory_backend_evicts_least_recently_used(clock):
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    backend.get("a")  # a is now more recent than b
+
+    backend.set("c", 3, ttl=60)
+
+    assert backend.get("b") is _MISSING
+    assert backend.get("a") == 1
+    assert backend.get("c") == 3
+    assert backend.evictions == 1
+    assert backend.size() == 2
+
+
+def test_result_cache_computes_once_per_key(backend):
+    result_cache = ResultCache(backend, ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert result_cache.get_or_compute("k", compute) == {"value": 1}
+    assert result_cache.get_or_compute("k", compute) == {"value": 1}
+    assert len(calls) == 1
+    assert (result_cache.hits, result_cache.misses) == (1, 1)
+
+
+def test_result_cache_survives_backend_errors(clock):
+    class BrokenBackend(MemoryCacheBackend):
+        def get(self, key):
+            raise ConnectionError("down")
+
+    result_cache = ResultCache(BrokenBackend(), ttl=60)
+
+    assert result_cache.get_or_compute("k", lambda: 42) == 42
+    assert result_cache.errors == 1
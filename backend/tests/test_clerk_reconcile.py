@@ -0,0 +1,215 @@
+"""
+Clerk reconciliation: paging, the page diff and the deletion guard, against a
+local Clerk stand-in and an in-memory SQLite users table.
+
+Job locks and state (PostgreSQL advisory locks and JSONB in system_settings)
+are kept in memory. Changed profiles are applied with UPDATE ... FROM
+(VALUES ...), which SQLite can't run, so they are only covered through
+diff_page; the run tests use Clerk profiles that match the stored rows.
+"""
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.pool import StaticPool
+from collections import namedtuple
+from copy import deepcopy
+from datetime import datetime, timezone
+from app.models import User
+from app.services import clerk_reconcile
+from tests.fakes import FakeClerk, clerk_user
+import pytest
+
+Row = namedtuple("Row", "email first_name last_name")
+
+LONG_AGO = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+class JobStore:
+    """Stand-in for the job's advisory lock and its state in system_settings"""
+
+    def __init__(self):
+        self.state = None
+        self.locked = False
+        self.published = []
+
+    def try_lock(self, conn, job):
+        return not self.locked
+
+    def load(self, conn, key):
+        return deepcopy(self.state)
+
+    def save(self, conn, key, state):
+        self.state = deepcopy(state)
+
+    def record_failure(self, conn, key, error):
+        conn.rollback()
+        self.state.update(status="failed", error=str(error))
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    User.__table__.create(engine)
+    monkeypatch.setattr(clerk_reconcile, "get_engine", lambda: engine)
+    return engine
+
+
+@pytest.fixture
+def job(monkeypatch):
+    store = JobStore()
+    monkeypatch.setattr(clerk_reconcile, "try_job_lock", store.try_lock)
+    monkeypatch.setattr(clerk_reconcile, "load_job_state", store.load)
+    monkeypatch.setattr(clerk_reconcile, "save_job_state", store.save)
+    monkeypatch.setattr(clerk_reconcile, "record_job_failure", store.record_failure)
+    monkeypatch.setattr(clerk_reconcile, "publish_invalidation", lambda conn, *topics: store.published.extend(topics))
+    monkeypatch.setattr(clerk_reconcile, "PAGE_SIZE", 2)
+    return store
+
+
+def clerk_users(count: int) -> list:
+    return [clerk_user(f"user_{i}", f"{i}@example.com", created_at=i) for i in range(count)]
+
+
+def add_users(engine, clerk_users: list) -> None:
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"id": u["id"], "email": u["email_addresses"][0]["email_address"], "created_at": LONG_AGO}
+            for u in clerk_users
+        ])
+
+
+def stored_ids(engine) -> list:
+    with engine.connect() as conn:
+        return conn.execute(select(User.id).order_by(User.id)).scalars().all()
+
+
+def listing_offsets(clerk: FakeClerk) -> list:
+    return [int(r.url.params["offset"]) for r in clerk.requests if "user_id" not in r.url.params]
+
+
+def test_diff_page_splits_new_changed_and_unchanged():
+    page = [
+        clerk_user("new", "new@example.com"),
+        clerk_user("renamed", "renamed@example.com", first_name="Ann"),
+        clerk_user("same", "same@example.com"),
+        {**clerk_user("no_email", "x@example.com"), "email_addresses": []},
+        {**clerk_user("lost_email", "x@example.com"), "email_addresses": []},
+    ]
+    existing = {
+        "renamed": Row("renamed@example.com", None, None),
+        "same": Row("same@example.com", None, None),
+        "lost_email": Row("kept@example.com", None, None),
+    }
+
+    new, changed, unchanged_ids = clerk_reconcile.diff_page(page, existing)
+
+    assert [p["id"] for p in new] == ["new"]
+    assert changed == [{"id": "renamed", "email": "renamed@example.com", "first_name": "Ann", "last_name": None}]
+    # A user without a Clerk email keeps the stored one instead of counting as changed
+    assert unchanged_ids == ["same", "lost_email"]
+
+
+@pytest.mark.parametrize("stale, total, refused", [
+    (10, 10, False),    # Small tables may always lose up to 10 users
+    (11, 50, True),
+    (20, 200, False),   # 10% of the table
+    (21, 200, True),
+])
+def test_deletion_guard_threshold(stale, total, refused):
+    if refused:
+        with pytest.raises(RuntimeError, match=f"Refusing to delete {stale} of {total} users"):
+            clerk_reconcile.check_deletion_guard(stale, total)
+    else:
+        clerk_reconcile.check_deletion_guard(stale, total)
+
+
+def test_run_pages_through_clerk_and_inserts_new_users(engine, job):
+    clerk = FakeClerk(users=clerk_users(5))
+
+    state = clerk_reconcile.run_reconcile_job(client=clerk.client())
+
+    assert listing_offsets(clerk) == [0, 2, 4]
+    assert stored_ids(engine) == [f"user_{i}" for i in range(5)]
+    assert state == job.state
+    assert (state["status"], state["phase"]) == ("completed", "deleting")
+    assert (state["offset"], state["seen"], state["inserted"], state["deleted"]) == (5, 5, 5, 0)
+
+
+def test_run_stops_after_an_empty_page(engine, job):
+    clerk = FakeClerk(users=clerk_users(4))
+
+    state = clerk_reconcile.run_reconcile_job(client=clerk.client())
+
+    assert listing_offsets(clerk) == [0, 2, 4]
+    assert (state["status"], state["seen"]) == ("completed", 4)
+
+
+def test_users_missing_from_clerk_are_deleted(engine, job):
+    present = clerk_users(3)
+    add_users(engine, present + [clerk_user("gone", "gone@example.com")])
+    clerk = FakeClerk(users=present)
+
+    state = clerk_reconcile.run_reconcile_job(client=clerk.client())
+
+    assert stored_ids(engine) == ["user_0", "user_1", "user_2"]
+    assert (state["inserted"], state["updated"], state["deleted"]) == (0, 0, 1)
+    assert job.published == ["user:gone"]
+    # Only the unseen user is re-checked by id before it is deleted
+    assert [r.url.params.get_list("user_id") for r in clerk.requests if "user_id" in r.url.params] == [["gone"]]
+
+
+def test_deletion_guard_fails_the_run_without_deleting(engine, job):
+    add_users(engine, clerk_users(20))
+    clerk = FakeClerk(users=[])
+
+    with pytest.raises(RuntimeError, match="Refusing to delete 20 of 20 users"):
+        clerk_reconcile.run_reconcile_job(client=clerk.client())
+
+    assert len(stored_ids(engine)) == 20
+    assert job.state["status"] == "failed"
+    assert "Refusing to delete" in job.state["error"]
+
+
+def test_run_resumes_from_the_saved_offset(engine, job):
+    clerk = FakeClerk(users=clerk_users(5))
+    job.state = {**clerk_reconcile.initial_job_state(), "status": "failed", "offset": 2, "seen": 2}
+
+    state = clerk_reconcile.run_reconcile_job(client=clerk.client())
+
+    assert listing_offsets(clerk) == [2, 4]
+    assert (state["status"], state["seen"], state["inserted"]) == ("completed", 5, 3)
+
+
+def test_restart_discards_saved_progress(engine, job):
+    clerk = FakeClerk(users=clerk_users(3))
+    job.state = {**clerk_reconcile.initial_job_state(), "offset": 2, "seen": 2}
+
+    state = clerk_reconcile.run_reconcile_job(client=clerk.client(), restart=True)
+
+    assert listing_offsets(clerk) == [0, 2]
+    assert state["seen"] == 3
+
+
+def test_run_is_skipped_while_another_worker_holds_the_lock(engine, job):
+    clerk = FakeClerk(users=clerk_users(3))
+    job.locked = True
+
+    assert clerk_reconcile.run_reconcile_job(client=clerk.client()) is None
+    assert clerk.requests == []
+
+
+def test_run_stops_when_another_worker_takes_it_over(engine, job, monkeypatch):
+    clerk = FakeClerk(users=clerk_users(5))
+
+    def save_then_restart_elsewhere(conn, key, state):
+        job.save(conn, key, state)
+        if state["offset"] == 2:
+            job.state = clerk_reconcile.initial_job_state()  # Another worker's run, committed after ours
+
+    monkeypatch.setattr(clerk_reconcile, "save_job_state", save_then_restart_elsewhere)
+
+    clerk_reconcile.run_reconcile_job(client=clerk.client())
+
+    # This worker reads one more page, sees that the run has moved on and
+    # stops without applying it
+    assert listing_offsets(clerk) == [0, 2]
+    assert job.state["offset"] == 0
+    assert stored_ids(engine) == ["user_0", "user_1"]
@@ -0,0 +1,154 @@
+"""
+First-login user sync: known-user cache, coalesced Clerk calls, circuit
+breaker and error mapping, against a local Clerk stand-in
+"""
+from fastapi import HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from app.services.clerk_client import ClerkError, ClerkUnavailableError
+from app.utils import auth, circuit_breaker
+from app.utils.singleflight import SingleFlight
+from tests.fakes import FakeClerk, FakeClock, FakeSession, clerk_user
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    auth.forget_known_user(None)
+    monkeypatch.setattr(auth, "_user_sync_flights", SingleFlight())
+
+
+@pytest.fixture
+def clerk(monkeypatch):
+    clerk = FakeClerk(users=[clerk_user("user_1", "one@example.com")])
+    client = clerk.client()
+    monkeypatch.setattr(auth, "get_clerk_client", lambda: client)
+    return clerk
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def test_known_user_is_served_from_cache(clerk):
+    db = FakeSession(existing={"user_1"})
+
+    auth.ensure_user("user_1", db)
+    auth.ensure_user("user_1", db)
+
+    assert db.queries == 1
+    assert clerk.requests == []
+
+
+def test_missing_user_is_synced_from_clerk_once(clerk):
+    db = FakeSession(existing=set())
+
+    auth.ensure_user("user_1", db)
+    auth.ensure_user("user_1", db)
+
+    assert db.existing == {"user_1"}
+    assert db.queries == 1
+    assert len(clerk.requests) == 1
+
+
+def test_forgotten_user_is_checked_again(clerk):
+    db = FakeSession(existing={"user_1"})
+    auth.ensure_user("user_1", db)
+
+    auth.forget_known_user("user_1")
+    auth.ensure_user("user_1", db)
+
+    assert db.queries == 2
+
+
+def test_concurrent_first_logins_share_one_clerk_call(clerk):
+    clerk.delay = 0.2
+    existing = set()
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        for future in [pool.submit(auth.ensure_user, "user_1", FakeSession(existing)) for _ in range(5)]:
+            future.result()
+
+    assert len(clerk.requests) == 1
+    assert auth._user_sync_flights.shared == 4
+    assert existing == {"user_1"}
+
+
+def test_clerk_outage_maps_to_503(clerk):
+    clerk.status = 503
+
+    with pytest.raises(HTTPException) as exc_info:
+        auth.ensure_user("user_1", FakeSession(existing=set()))
+
+    assert exc_info.value.status_code == 503
+
+
+def test_clerk_error_response_maps_to_500(clerk):
+    with pytest.raises(HTTPException) as exc_info:
+        auth.ensure_user("user_unknown", FakeSession(existing=set()))
+
+    assert exc_info.value.status_code == 500
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    clerk = FakeClerk(users=[clerk_user("user_1", "one@example.com")])
+    client = clerk.client(failure_threshold=2, reset_timeout=30)
+    clerk.status = 503
+
+    for _ in range(2):
+        with pytest.raises(ClerkUnavailableError):
+            client.get_user("user_1")
+    assert client.breaker.state == "open"
+
+    # Open: fails fast without reaching Clerk
+    with pytest.raises(ClerkUnavailableError):
+        client.get_user("user_1")
+    assert len(clerk.requests) == 2
+    assert client.breaker.rejected == 1
+
+
+def test_half_open_trial_success_closes_circuit(clock):
+    clerk = FakeClerk(users=[clerk_user("user_1", "one@example.com")])
+    client = clerk.client(failure_threshold=1, reset_timeout=30)
+    clerk.status = 500
+    with pytest.raises(ClerkUnavailableError):
+        client.get_user("user_1")
+
+    clock.advance(30)
+    assert client.breaker.state == "half_open"
+
+    clerk.status = None
+    assert client.get_user("user_1")["id"] == "user_1"
+    assert client.breaker.state == "closed"
+    assert client.breaker.failures == 0
+
+
+def test_half_open_trial_failure_reopens_circuit(clock):
+    clerk = FakeClerk()
+    client = clerk.client(failure_threshold=1, reset_timeout=30)
+    clerk.status = 429
+    with pytest.raises(ClerkUnavailableError):
+        client.list_users()
+
+    clock.advance(30)
+    with pytest.raises(ClerkUnavailableError):
+        client.list_users()
+
+    assert client.breaker.state == "open"
+    clock.advance(29)
+    assert client.breaker.state == "open"
+
+
+def test_client_errors_do_not_trip_the_circuit(clock):
+    clerk = FakeClerk()
+    client = clerk.client(failure_threshold=1)
+
+    for _ in range(3):
+        with pytest.raises(ClerkError) as exc_info:
+            client.get_user("user_missing")
+        assert not isinstance(exc_info.value, ClerkUnavailableError)
+        assert exc_info.value.status_code == 404
+
+    assert client.breaker.state == "closed"
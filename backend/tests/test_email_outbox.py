@@ -0,0 +1,195 @@
+"""
+Email outbox worker: leases, retries with backoff, max attempts, per-message
+fallback and rate limiting, against an in-memory SQLite outbox and a local
+transport. The worker's clock is frozen and moved by the tests.
+"""
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime, timedelta, timezone
+from app.models import EmailOutbox
+from app.services import email_outbox
+from app.services.email_outbox import LEASE_SECONDS, OutboxWorker, RateLimiter
+from tests.fakes import FakeClock, FlakyTransport
+import pytest
+
+T0 = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class FrozenDatetime(datetime):
+    """datetime whose now() is set by the test"""
+
+    current = T0
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+def advance(seconds: float) -> None:
+    FrozenDatetime.current += timedelta(seconds=seconds)
+
+
+@pytest.fixture(autouse=True)
+def frozen_now(monkeypatch):
+    FrozenDatetime.current = T0
+    monkeypatch.setattr(email_outbox, "datetime", FrozenDatetime)
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    EmailOutbox.__table__.create(engine)
+    sessions = sessionmaker(bind=engine)
+    monkeypatch.setattr(email_outbox, "SessionLocal", sessions)
+    return sessions
+
+
+def make_worker(transport, **kwargs) -> OutboxWorker:
+    # One delivery thread keeps the order of transport requests deterministic
+    return OutboxWorker(transport, concurrency=1, rate_per_second=1000, **kwargs)
+
+
+@pytest.fixture
+def transport():
+    return FlakyTransport()
+
+
+@pytest.fixture
+def worker(transport):
+    worker = make_worker(transport, batch_size=10, max_attempts=3)
+    yield worker
+    worker.close()
+
+
+def queue(sessions, *addresses: str) -> None:
+    with sessions() as db:
+        db.add_all([
+            EmailOutbox(from_email="from@example.com", to_email=address, subject="Hi", html="<p>Hi</p>",
+                        next_attempt_at=T0)
+            for address in addresses
+        ])
+        db.commit()
+
+
+def rows(sessions) -> dict:
+    """to_email -> (status, attempts, next_attempt_at); SQLite returns naive datetimes"""
+    with sessions() as db:
+        return {
+            m.to_email: (m.status, m.attempts, m.next_attempt_at.replace(tzinfo=timezone.utc))
+            for m in db.execute(select(EmailOutbox)).scalars()
+        }
+
+
+def claim(worker, sessions) -> list:
+    with sessions() as db:
+        return [m.to_email for m in worker._claim(db, 10)]
+
+
+def test_due_messages_are_sent_in_batches(sessions, transport):
+    worker = make_worker(transport, batch_size=2)
+    queue(sessions, "a@example.com", "b@example.com", "c@example.com")
+
+    assert worker.run_once() == 3
+    worker.close()
+
+    assert len(transport.batches) == 2
+    assert {status for status, _, _ in rows(sessions).values()} == {"sent"}
+    assert worker.stats()["sent"] == 3
+
+
+def test_claimed_messages_are_leased_until_the_lease_expires(sessions, worker):
+    queue(sessions, "a@example.com")
+
+    assert claim(worker, sessions) == ["a@example.com"]
+    assert rows(sessions)["a@example.com"] == ("sending", 1, T0 + timedelta(seconds=LEASE_SECONDS))
+    assert claim(worker, sessions) == []
+
+    # The worker holding the lease died; the message becomes due again
+    advance(LEASE_SECONDS)
+    assert claim(worker, sessions) == ["a@example.com"]
+    assert rows(sessions)["a@example.com"][:2] == ("sending", 2)
+
+
+def test_lease_expiring_on_the_last_attempt_fails_the_message(sessions, worker):
+    queue(sessions, "a@example.com")
+    for _ in range(worker.max_attempts):
+        assert claim(worker, sessions) == ["a@example.com"]
+        advance(LEASE_SECONDS)
+
+    assert claim(worker, sessions) == []
+    assert rows(sessions)["a@example.com"][:2] == ("failed", worker.max_attempts)
+    assert worker.stats()["failed"] == 1
+
+
+def test_failed_message_is_retried_with_exponential_backoff(sessions, transport, worker):
+    transport.failing.add("a@example.com")
+    queue(sessions, "a@example.com")
+
+    worker.run_once()
+    assert rows(sessions)["a@example.com"] == ("pending", 1, T0 + timedelta(seconds=30))
+
+    # Not due before the backoff has passed
+    assert worker.run_once() == 0
+
+    advance(30)
+    worker.run_once()
+    assert rows(sessions)["a@example.com"] == ("pending", 2, T0 + timedelta(seconds=30 + 60))
+
+
+def test_message_stops_at_max_attempts(sessions, transport, worker):
+    transport.failing.add("a@example.com")
+    queue(sessions, "a@example.com")
+
+    for _ in range(worker.max_attempts):
+        assert worker.run_once() == 1
+        advance(email_outbox.MAX_BACKOFF_SECONDS)
+
+    assert rows(sessions)["a@example.com"][:2] == ("failed", worker.max_attempts)
+    assert worker.run_once() == 0
+    assert len(transport.batches) == worker.max_attempts
+    assert (worker.stats()["retried"], worker.stats()["failed"]) == (worker.max_attempts - 1, 1)
+
+
+def test_failed_batch_is_retried_one_message_at_a_time(sessions, transport, worker):
+    transport.failing.add("bad@example.com")
+    queue(sessions, "a@example.com", "bad@example.com", "c@example.com")
+
+    worker.run_once()
+
+    assert len(transport.batches[0]) == 3
+    assert sorted(transport.batches[1:]) == [["a@example.com"], ["bad@example.com"], ["c@example.com"]]
+    state = rows(sessions)
+    assert state["a@example.com"][0] == state["c@example.com"][0] == "sent"
+    # Only the bad message is charged an attempt for the failure
+    assert state["bad@example.com"][:2] == ("pending", 1)
+
+
+def test_rate_limiter_spaces_out_requests(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(email_outbox.time, "monotonic", clock)
+    monkeypatch.setattr(email_outbox.time, "sleep", clock.sleep)
+    limiter = RateLimiter(rate_per_second=2)
+
+    start = clock.now
+    for _ in range(5):
+        limiter.acquire()
+
+    # One token up front, then one every half second
+    assert clock.now - start == pytest.approx(2.0)
+
+
+def test_rate_limiter_burst_is_capped_after_idling(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(email_outbox.time, "monotonic", clock)
+    monkeypatch.setattr(email_outbox.time, "sleep", clock.sleep)
+    limiter = RateLimiter(rate_per_second=2)
+
+    clock.advance(60)
+    start = clock.now
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.now == start  # Up to one second's worth of tokens is saved
+
+    limiter.acquire()
+    assert clock.now - start == pytest.approx(0.5)
@@ -0,0 +1,62 @@
+"""
+Order quota enforcement against an in-memory SQLite users table
+"""
+from fastapi import HTTPException
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from datetime import datetime
+from app.models import User
+from app.services import tier_limits
+from app.services.tier_limits import TierSettings
+import pytest
+
+# SQLite returns naive datetimes, so the test uses naive ones throughout
+CUTOFF = datetime(2026, 6, 1)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def add_user(db, user_id: str, created_at: datetime, orders_count: int, is_grandfathered: bool = False) -> None:
+    db.execute(insert(User.__table__).values(
+        id=user_id, email=f"{user_id}@example.com", tier="free", is_grandfathered=is_grandfathered,
+        is_admin=False, orders_count=orders_count, created_at=created_at
+    ))
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    settings = TierSettings(True, 10, 100, CUTOFF)
+    monkeypatch.setattr(tier_limits, "get_tier_settings", lambda: settings)
+
+
+def test_user_over_the_limit_is_refused(db):
+    add_user(db, "new", created_at=datetime(2026, 7, 1), orders_count=10)
+
+    with pytest.raises(HTTPException) as exc:
+        tier_limits.enforce_order_quota(db, "new", 1)
+
+    assert exc.value.status_code == 403
+
+
+def test_user_under_the_limit_is_allowed(db):
+    add_user(db, "new", created_at=datetime(2026, 7, 1), orders_count=5)
+
+    tier_limits.enforce_order_quota(db, "new", 5)
+
+
+def test_user_created_before_the_cutoff_is_exempt_while_the_job_is_pending(db):
+    add_user(db, "early", created_at=datetime(2026, 5, 1), orders_count=10)
+
+    tier_limits.enforce_order_quota(db, "early", 1)
+
+
+def test_grandfathered_user_is_exempt(db):
+    add_user(db, "marked", created_at=datetime(2026, 7, 1), orders_count=10, is_grandfathered=True)
+
+    tier_limits.enforce_order_quota(db, "marked", 1)